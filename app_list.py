@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import sys
+from array import array
+
+
+APP_LIST_URL = 'https://api.steampowered.com/ISteamApps/GetAppList/v2?format=json'
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+class AppListParser:
+    # Инкрементальный разбор списка приложений: и ответа GetAppList ({"applist":{"apps":[...]}}),
+    # и json файла со списком [{...}, ...]. Объекты отдаются по мере прихода данных,
+    # весь ответ целиком в памяти не держится.
+    def __init__(self):
+        self.buffer = ''
+        self.started = False
+        self.finished = False
+
+    def feed(self, chunk: str):
+        self.buffer += chunk
+        apps = []
+        position = 0
+
+        if not self.started:
+            position = self.buffer.find('[')
+            if position < 0:
+                self.buffer = ''
+                return apps
+            self.started = True
+            position += 1
+
+        length = len(self.buffer)
+        while not self.finished:
+            while position < length and self.buffer[position] in ' \t\r\n,':
+                position += 1
+
+            if position >= length:
+                break
+
+            if self.buffer[position] == ']':
+                self.finished = True
+                break
+
+            try:
+                app, end = _decoder.raw_decode(self.buffer, position)
+            except json.JSONDecodeError:
+                # объект пришёл не полностью, ждём следующий кусок
+                break
+
+            apps.append(app)
+            position = end
+
+        self.buffer = self.buffer[position:]
+        return apps
+
+
+class AppCatalogue:
+    # appid хранятся в array('I'), имена интернируются: на 150k приложений это в разы меньше списка словарей
+    def __init__(self):
+        self.appids = array('I')
+        self.names = []
+
+    def add(self, appid: int, name: str):
+        self.appids.append(appid)
+        self.names.append(sys.intern(name))
+
+    def __len__(self):
+        return len(self.appids)
+
+    def __iter__(self):
+        return zip(self.appids, self.names)
+
+    def memory_bytes(self):
+        names = sum(sys.getsizeof(name) for name in set(self.names))
+        return self.appids.buffer_info()[1] * self.appids.itemsize + sys.getsizeof(self.names) + names
+
+
+class AppListWriter:
+    # пишет список приложений в json файл по одной записи, без отступов и без списка в памяти
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.file = open(path + '.tmp', 'w', encoding='utf-8')
+        self.file.write('[')
+
+    def write(self, appid: int, name: str):
+        prefix = ',\n' if self.count > 0 else '\n'
+        self.file.write(prefix + json.dumps({'appid': appid, 'name': name}, ensure_ascii=False))
+        self.count += 1
+
+    def close(self):
+        self.file.write('\n]\n')
+        self.file.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def abort(self):
+        # недокачанный список не должен подменить предыдущий
+        self.file.close()
+        os.remove(self.path + '.tmp')
+
+
+async def stream_apps_from_url(client, url: str = APP_LIST_URL):
+    parser = AppListParser()
+    async for chunk in client.stream(url):
+        for app in parser.feed(chunk):
+            yield app['appid'], app['name']
+
+
+async def stream_apps_from_file(path: str):
+    parser = AppListParser()
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if chunk == '':
+                break
+
+            for app in parser.feed(chunk):
+                yield app['appid'], app['name']
+            # чтение файла не должно надолго занимать event loop
+            await asyncio.sleep(0)
+
+
+def _run_step(coroutine):
+    # stream_apps_from_file отдаёт управление только через asyncio.sleep(0), такой шаг проходится send(None)
+    # без event loop, в том числе из кода, который сам работает внутри него
+    while True:
+        try:
+            awaited = coroutine.send(None)
+        except StopIteration as stop:
+            return stop.value
+        if awaited is not None:
+            coroutine.close()
+            raise RuntimeError('read_apps_from_file cannot wait for a future without an event loop')
+
+
+def read_apps_from_file(path: str):
+    # то же без event loop, для инструментов вне обхода; разбор один - в stream_apps_from_file
+    apps = stream_apps_from_file(path)
+    try:
+        while True:
+            try:
+                yield _run_step(apps.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        _run_step(apps.aclose())
@@ -0,0 +1,136 @@
+import logging
+import sqlite3
+import time
+from array import array
+
+
+KIND_GAME = 'game'
+KIND_NOT_GAME = 'not game'
+KIND_NOT_RELEASED = 'not released'
+# Steam ответил success: false - приложение снято с продажи, закрыто по региону или это служебная запись
+KIND_NO_DATA = 'no data'
+
+# порядок очереди: сначала appid, которых ещё не видели, потом давно проверенные игры,
+# в конце не-игры с истёкшим сроком
+PRIORITY_NEW = 0
+PRIORITY_STALE = 1
+PRIORITY_NEGATIVE = 2
+PRIORITY_SKIP = None
+
+DAY = 24 * 3600
+
+
+def kind_from_result(game):
+    # None - результат ничего не говорит о приложении (ошибка сети, 429, разбор): такой не кэшируется
+    if not isinstance(game, dict):
+        return KIND_GAME
+    if 'error' in game:
+        return None
+
+    # причины из format_game_data, 'unknown' - ответ success: false без причины или null
+    reason = game.get('reason')
+    if reason == 'is not game':
+        return KIND_NOT_GAME
+    if reason == 'not released':
+        return KIND_NOT_RELEASED
+    if reason == 'unknown':
+        return KIND_NO_DATA
+    return None
+
+
+class AppStatusCache:
+    # Что было по каждому appid в прошлых запусках и когда, в SQLite. Свежие отрицательные ответы
+    # (не игра, не вышла, нет данных) не запрашиваются повторно: срок у каждого свой, у «не вышла» - короткий.
+    # Остальные appid очередь отдаёт по приоритету, см. PriorityScheduler.
+    def __init__(self, path: str, ttl_days: dict, batch_size: int = 500):
+        self.ttl = {kind: days * DAY for kind, days in ttl_days.items()}
+        self.batch_size = batch_size
+        self.pending = []
+        self.now = time.time()
+        self.counts = {'new': 0, 'stale': 0, 'expired': 0, 'skipped': 0}
+        self.skipped = {}
+
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS apps ('
+                                'appid INTEGER PRIMARY KEY, kind TEXT NOT NULL, checked_at REAL NOT NULL)')
+
+    def lookup(self, appid):
+        return self.connection.execute('SELECT kind, checked_at FROM apps WHERE appid = ?', (int(appid),)).fetchone()
+
+    def priority(self, appid):
+        # (приоритет, время прошлой проверки); срок считается от текущих настроек, а не от записанных
+        row = self.lookup(appid)
+        if row is None:
+            self.counts['new'] += 1
+            return PRIORITY_NEW, 0.0
+
+        kind, checked_at = row
+        if kind == KIND_GAME:
+            self.counts['stale'] += 1
+            return PRIORITY_STALE, checked_at
+        if self.now - checked_at < self.ttl.get(kind, 0):
+            self.counts['skipped'] += 1
+            self.skipped[kind] = self.skipped.get(kind, 0) + 1
+            return PRIORITY_SKIP, checked_at
+
+        self.counts['expired'] += 1
+        return PRIORITY_NEGATIVE, checked_at
+
+    def record(self, appid, game):
+        kind = kind_from_result(game)
+        if kind is None:
+            return
+
+        self.pending.append((int(appid), kind, time.time()))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.executemany('INSERT OR REPLACE INTO apps VALUES (?, ?, ?)', self.pending)
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.pending.clear()
+
+    def summary(self):
+        skipped = ', '.join(f'{kind}: {count}' for kind, count in self.skipped.items()) or 'none'
+        return (f"app status: new: {self.counts['new']}, stale games: {self.counts['stale']}, "
+                f"expired negatives: {self.counts['expired']}, skipped: {self.counts['skipped']} ({skipped})")
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+        logging.info(self.summary())
+
+
+class PriorityScheduler:
+    # Новые appid отдаются сразу, по мере загрузки списка. Уже виденные откладываются и после
+    # загрузки списка отдаются по приоритету, внутри приоритета - от давно проверенных к недавним.
+    # Отложенные хранятся в array, а не в списке кортежей: их может быть почти весь GetAppList.
+    def __init__(self):
+        self.appids = {PRIORITY_STALE: array('I'), PRIORITY_NEGATIVE: array('I')}
+        self.checked_at = {PRIORITY_STALE: array('d'), PRIORITY_NEGATIVE: array('d')}
+
+    def defer(self, appid, priority: int, checked_at: float):
+        self.appids[priority].append(int(appid))
+        self.checked_at[priority].append(checked_at)
+
+    def __len__(self):
+        return sum(len(appids) for appids in self.appids.values())
+
+    def drain(self):
+        for priority in (PRIORITY_STALE, PRIORITY_NEGATIVE):
+            appids = self.appids[priority]
+            order = sorted(range(len(appids)), key=self.checked_at[priority].__getitem__)
+            for position in order:
+                yield appids[position]
+            self.appids[priority] = array('I')
+            self.checked_at[priority] = array('d')
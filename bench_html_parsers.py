@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import time
+
+from byrutor_scraper import scrape_game_info, scrape_game_links
+from steam_scraper import format_game_data, scrape_genres
+from html_parser import available_backends, set_backend
+from records import Record
+
+
+# Проверяет, что разбор сохранённых страниц даёт одинаковый результат на всех парсерах
+# (и полным, и частичным разбором), и меряет скорость каждого варианта.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def read_fixture(*path):
+    with open(os.path.join(FIXTURES_DIR, *path), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def load_cases():
+    game_pages = ['game_page.html', 'game_page_minimal.html']
+    cases = {}
+
+    for name in game_pages:
+        html = read_fixture('byrutor', name)
+        uri = f'https://thebyrut.org/{name}'
+        cases[f'byrutor/{name} partial'] = lambda backend, html=html, uri=uri: \
+            scrape_game_info(html, uri, backend=backend, partial=True)
+        cases[f'byrutor/{name} full'] = lambda backend, html=html, uri=uri: \
+            scrape_game_info(html, uri, backend=backend, partial=False)
+
+    listing = read_fixture('byrutor', 'listing_page.html')
+    cases['byrutor/listing_page.html'] = lambda backend: scrape_game_links(listing, backend=backend)
+
+    store = read_fixture('steam', 'store_page.html')
+    cases['steam/store_page.html'] = lambda backend: scrape_genres(store)
+
+    appdetails = json.loads(read_fixture('steam', 'appdetails_620.json'))
+    cases['steam/appdetails_620.json'] = lambda backend: format_game_data('620', appdetails)
+
+    return cases
+
+
+def comparable(result):
+    # у записей нет __eq__, сравниваются их поля
+    return result.to_dict() if isinstance(result, Record) else result
+
+
+def run(iterations: int):
+    backends = available_backends()
+    cases = load_cases()
+    mismatches = 0
+
+    print(f'{"case":45} {"backend":12} {"pages/sec":>10}')
+    for case_name, case in cases.items():
+        reference = None
+
+        for backend in backends:
+            # steam функции берут парсер из окружения
+            set_backend(backend)
+            result = comparable(case(backend))
+
+            if reference is None:
+                reference = result
+            elif result != reference:
+                mismatches += 1
+                print(f'MISMATCH: {case_name} on {backend}')
+
+            started_at = time.perf_counter()
+            for _ in range(iterations):
+                case(backend)
+            elapsed = time.perf_counter() - started_at
+
+            print(f'{case_name:45} {backend:12} {iterations / elapsed:10.1f}')
+
+    # частичный и полный разбор страниц игры тоже должны совпадать
+    for name in ('game_page.html', 'game_page_minimal.html'):
+        for backend in backends:
+            partial = comparable(cases[f'byrutor/{name} partial'](backend))
+            if partial != comparable(cases[f'byrutor/{name} full'](backend)):
+                mismatches += 1
+                print(f'MISMATCH: byrutor/{name} partial vs full on {backend}')
+
+    print('all outputs are identical' if mismatches == 0 else f'mismatches: {mismatches}')
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='HTML parser backends benchmark',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-n', '--iterations', type=int, default=50, help='Parses of every page per backend')
+    args = parser.parse_args()
+
+    raise SystemExit(1 if run(args.iterations) else 0)
@@ -0,0 +1,381 @@
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime
+
+from byrutor_scraper import scrape_game_info, scrape_game_links
+from steam_scraper import format_game_data
+from output_writer import JsonLinesWriter, read_records
+from blob_store import BlobStore
+from app_list import read_apps_from_file
+from name_index import NameIndex
+from records import ByrutorGame, SteamGame
+
+
+# Офлайн бенчмарк: разбор записанных страниц из fixtures и полный обход обоими скрейперами
+# локального mock_server.py. Результаты сохраняются в outputs/bench и сравниваются с прошлым запуском.
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(ROOT_DIR, 'fixtures')
+BENCH_DIR = os.path.join(os.getcwd(), 'outputs', 'bench')
+LATENCY_PATTERN = re.compile(r'latency p50: ([\d.]+)ms, p99: ([\d.]+)ms')
+
+
+def read_fixture(*path):
+    with open(os.path.join(FIXTURES_DIR, *path), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def percentile(values: list, q: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(fn, iterations: int):
+    durations = []
+    started_at = time.perf_counter()
+
+    for _ in range(iterations):
+        call_started_at = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - call_started_at)
+
+    elapsed = time.perf_counter() - started_at
+    return {'records_per_sec': iterations / elapsed,
+            'p50_ms': percentile(durations, 0.5) * 1000,
+            'p99_ms': percentile(durations, 0.99) * 1000}
+
+
+def parse_benchmarks(iterations: int):
+    game_page = read_fixture('byrutor', 'game_page.html')
+    listing = read_fixture('byrutor', 'listing_page.html')
+    appdetails = json.loads(read_fixture('steam', 'appdetails_620.json'))
+
+    cases = {
+        'format_game_data': lambda: format_game_data('620', appdetails),
+        'scrape_game_info': lambda: scrape_game_info(game_page, 'https://thebyrut.org/game_page.html'),
+        'scrape_game_links': lambda: scrape_game_links(listing),
+    }
+    return {name: measure(case, iterations) for name, case in cases.items()}
+
+
+def retained_bytes(build, count: int):
+    # сколько памяти занимают count записей, пока они все живы: так держит их очередь записи и батч хранилища
+    tracemalloc.start()
+    records = [build() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return size / count
+
+
+def record_benchmarks(iterations: int, count: int):
+    # записи в виде словарей (как раньше) против классов со слотами: память на запись и скорость записи в JSON
+    game_page = read_fixture('byrutor', 'game_page.html')
+    appdetails = json.loads(read_fixture('steam', 'appdetails_620.json'))
+    lines = {'steam': format_game_data('620', appdetails).to_json(),
+             'byrutor': scrape_game_info(game_page, 'https://thebyrut.org/game_page.html').to_json()}
+    classes = {'steam': SteamGame, 'byrutor': ByrutorGame}
+
+    results = {}
+    for source, line in lines.items():
+        game = classes[source].from_json(line)
+        record = game.to_dict()
+        dict_bytes = retained_bytes(lambda: json.loads(line), count)
+        record_bytes = retained_bytes(lambda: classes[source].from_json(line), count)
+        print(f'{source} record: dict {dict_bytes / 1024:.1f}KB, {classes[source].__name__} '
+              f'{record_bytes / 1024:.1f}KB ({record_bytes / dict_bytes:.0%})')
+
+        # словарь пишется так же, как JsonLinesWriter пишет записи без to_json
+        results[f'{source}_json_dict'] = measure(lambda: json.dumps(record, ensure_ascii=False, separators=(',', ':')),
+                                                 iterations)
+        results[f'{source}_json_record'] = measure(game.to_json, iterations)
+        # выигрыш записей со слотами - память; to_json собирает вложенные записи в словари и разжимает
+        # длинные литералы, поэтому пишет не быстрее json.dumps готового словаря
+        change = results[f'{source}_json_record']['records_per_sec'] / results[f'{source}_json_dict']['records_per_sec']
+        print(f'{source} record: to_json {change - 1:+.0%} records/sec against json.dumps of the dict')
+    return results
+
+
+def blob_benchmarks(count: int):
+    # два обхода одних и тех же игр с описаниями обычной для Steam длины (в fixtures описание короткое):
+    # размер шардов и скорость записи с описаниями в записи и с хранилищем блобов
+    appdetails = json.loads(read_fixture('steam', 'appdetails_620.json'))
+    words = re.findall(r'\w+', read_fixture('byrutor', 'game_page.html'))
+    randomizer = random.Random(3)
+    games = []
+    for number in range(count):
+        appdetails['620']['data']['about_the_game'] = ''.join(
+            f"<p>{' '.join(randomizer.choices(words, k=60))}</p>" for _ in range(12))
+        games.append(format_game_data('620', appdetails))
+
+    results = {}
+    for name in ('inline', 'blobs'):
+        with tempfile.TemporaryDirectory() as work_dir:
+            blobs = BlobStore(os.path.join(work_dir, 'blobs.sqlite')) if name == 'blobs' else None
+            writer = JsonLinesWriter(work_dir, prefix='games', fsync_every=None, blobs=blobs)
+            queue = iter(games * 2)
+            results[f'shard_write_{name}'] = measure(lambda: writer.write(next(queue)), count * 2)
+            writer.close()
+            blob_bytes = 0
+            if blobs is not None:
+                blobs.close()
+                blob_bytes = sum(os.path.getsize(path) for path in glob.glob(os.path.join(work_dir, 'blobs.sqlite*')))
+            print(f'{name}: shards {writer.bytes_written / 1024 ** 2:.1f}MB, blob store {blob_bytes / 1024 ** 2:.1f}MB '
+                  f'for {count} games crawled twice')
+    return results
+
+
+def synthetic_catalogue(size: int):
+    # без записанного списка игр: слова из слогов и частые слова настоящих названий, с продолжениями,
+    # DLC и саундтреками, как в GetAppList
+    randomizer = random.Random(1)
+    syllables = [consonant + vowel + ending for consonant in 'bcdfghjklmnprstvwz' for vowel in 'aeiouy'
+                 for ending in ('', 'n', 'r', 'x', 'th')]
+    common = ['the', 'of', 'simulator', 'legend', 'war', 'space', 'dark', 'quest', 'tales', 'city', 'hunter']
+    vocabulary = [''.join(randomizer.choices(syllables, k=randomizer.randint(2, 3))) for _ in range(20000)] + common
+    suffixes = ['', '', '', ' 2', ' III', ': Remastered', ' - Soundtrack', ' - Season Pass', ' Demo', '™']
+    return [(appid, ' '.join(word.capitalize() for word in randomizer.sample(vocabulary, randomizer.randint(1, 4)))
+             + randomizer.choice(suffixes)) for appid in range(10, 10 * size, 10)]
+
+
+def perturb(name: str, randomizer: random.Random):
+    # так имя обычно выглядит на byrutor: другой регистр, без символов, с опечаткой
+    name = name.lower().replace('™', '').replace(':', '')
+    if len(name) > 6 and randomizer.random() < 0.5:
+        position = randomizer.randrange(1, len(name) - 1)
+        name = name[:position] + name[position + 1:]
+    return name
+
+
+def name_index_benchmarks(args):
+    if args.app_list is not None and os.path.exists(args.app_list):
+        apps = list(read_apps_from_file(args.app_list))
+    else:
+        apps = synthetic_catalogue(args.catalogue_size)
+
+    started_at = time.perf_counter()
+    index = NameIndex.build(apps)
+    build_seconds = time.perf_counter() - started_at
+
+    randomizer = random.Random(2)
+    named = [(appid, name) for appid, name in apps if name != '']
+    queries = [(appid, perturb(name, randomizer)) for appid, name in randomizer.sample(named, args.queries)]
+    queries = iter(queries * (args.iterations // len(queries) + 1))
+    hits = {'top1': 0, 'top5': 0, 'total': 0}
+
+    def lookup():
+        appid, name = next(queries)
+        found = [candidate[0] for candidate in index.lookup(name, 5)]
+        hits['total'] += 1
+        hits['top1'] += len(found) > 0 and found[0] == appid
+        hits['top5'] += appid in found
+
+    result = measure(lookup, args.iterations)
+    # одинаковые имена в списке (игра и её демо) делают top1 неоднозначным, поэтому смотреть стоит и top5
+    print(f'name index: {len(index)} names, {len(index.postings)} trigrams, built in {build_seconds:.2f}s, '
+          f"recall@1: {hits['top1'] / hits['total']:.3f}, recall@5: {hits['top5'] / hits['total']:.3f}")
+    # цель - заметно меньше миллисекунды на имя при размере настоящего GetAppList
+    print(f"name index lookup at {len(index)} names: mean {1000 / result['records_per_sec']:.3f}ms, "
+          f"p50 {result['p50_ms']:.3f}ms, p99 {result['p99_ms']:.3f}ms")
+    return {'name_index_lookup': result}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(args):
+    port = free_port()
+    command = [sys.executable, os.path.join(ROOT_DIR, 'mock_server.py'), '--port', str(port), '--rate', '0',
+               '--latency', str(args.latency), '--error-rate', str(args.error_rate), '--pages', str(args.pages),
+               '--apps', str(args.apps), '--seed', '1']
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://localhost:{port}'
+
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f'{base_url}/stats').close()
+            return server, base_url
+        except OSError:
+            time.sleep(0.1)
+
+    server.kill()
+    raise Exception('Mock server did not start')
+
+
+def count_records(directory: str):
+    return sum(1 for path in glob.glob(os.path.join(directory, '*.jsonl*')) for _ in read_records(path))
+
+
+def run_crawl(command: list, work_dir: str):
+    # os.wait4 отдаёт потребление ресурсов именно этого процесса, пиковый RSS берётся оттуда
+    started_at = time.perf_counter()
+    process = subprocess.Popen(command, cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    peak_rss_mb = None
+
+    if hasattr(os, 'wait4'):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss в килобайтах на Linux и в байтах на macOS
+        peak_rss_mb = usage.ru_maxrss / 1024 ** 2 if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+    else:
+        process.wait()
+    elapsed = time.perf_counter() - started_at
+
+    if process.returncode != 0:
+        raise Exception(f'Crawl failed with code {process.returncode}: {" ".join(command)}')
+
+    return elapsed, peak_rss_mb
+
+
+def crawl_result(elapsed: float, peak_rss_mb: float, records: int, run_dir: str):
+    result = {'records': records, 'seconds': elapsed, 'records_per_sec': records / elapsed,
+              'peak_rss_mb': peak_rss_mb, 'p50_ms': None, 'p99_ms': None}
+
+    # задержки запросов скрейпер пишет в лог вместе со статистикой пула соединений
+    for path in glob.glob(os.path.join(run_dir, '**', '*.log'), recursive=True):
+        with open(path, 'r', encoding='utf-8') as f:
+            match = LATENCY_PATTERN.search(f.read())
+        if match is not None:
+            result['p50_ms'], result['p99_ms'] = float(match.group(1)), float(match.group(2))
+
+    return result
+
+
+def steam_crawl(base_url: str, args, work_dir: str):
+    list_path = os.path.join(work_dir, 'apps.json')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        json.dump([{'appid': appid, 'name': f'Game {appid}'} for appid in range(1, args.apps + 1)], f)
+
+    command = [sys.executable, os.path.join(ROOT_DIR, 'steam_scraper.py'), '--store-url', base_url, '-f', list_path,
+               '-c', str(args.concurrency), '--rate', '100', '--max-rate', '1000', '--retry-delay', '0.1',
+               '--parse-executor', args.parse_executor]
+    elapsed, peak_rss_mb = run_crawl(command, work_dir)
+
+    run_dir = glob.glob(os.path.join(work_dir, 'outputs', 'steam', '*', ''))[0]
+    records = count_records(os.path.join(run_dir, 'successful')) + count_records(os.path.join(run_dir, 'failed'))
+    return crawl_result(elapsed, peak_rss_mb, records, run_dir)
+
+
+def byrutor_crawl(base_url: str, args, work_dir: str):
+    command = [sys.executable, os.path.join(ROOT_DIR, 'byrutor_scraper.py'), '--site-url', f'{base_url}/byrutor',
+               '--retry-delay', '0.1', '--parse-executor', args.parse_executor]
+    elapsed, peak_rss_mb = run_crawl(command, work_dir)
+
+    run_dir = glob.glob(os.path.join(work_dir, 'outputs', 'byrutor', '*', ''))[0]
+    records = count_records(os.path.join(run_dir, 'success')) + count_records(os.path.join(run_dir, 'failure'))
+    return crawl_result(elapsed, peak_rss_mb, records, run_dir)
+
+
+def crawl_benchmarks(args):
+    server, base_url = start_mock_server(args)
+    results = {}
+
+    try:
+        for name, crawl in (('steam_crawl', steam_crawl), ('byrutor_crawl', byrutor_crawl)):
+            with tempfile.TemporaryDirectory() as work_dir:
+                results[name] = crawl(base_url, args, work_dir)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return results
+
+
+def latest_result():
+    paths = sorted(glob.glob(os.path.join(BENCH_DIR, '*.json')))
+    if len(paths) == 0:
+        return None, None
+
+    with open(paths[-1], 'r', encoding='utf-8') as f:
+        return paths[-1], json.load(f)
+
+
+def compare(results: dict, previous: dict, threshold: float):
+    # регрессия - падение records/sec больше чем на threshold относительно прошлого запуска
+    regressions = []
+
+    for name, result in results.items():
+        if name not in previous.get('results', {}):
+            continue
+
+        before = previous['results'][name]['records_per_sec']
+        change = result['records_per_sec'] / before - 1 if before else 0.0
+        print(f'{name:20} {before:10.1f} -> {result["records_per_sec"]:10.1f} records/sec ({change:+.1%})')
+
+        if change < -threshold:
+            regressions.append(name)
+
+    return regressions
+
+
+def print_results(results: dict):
+    print(f'{"benchmark":20} {"records/sec":>12} {"p50 ms":>10} {"p99 ms":>10} {"peak RSS MB":>12}')
+    for name, result in results.items():
+        p50 = f'{result["p50_ms"]:.2f}' if result.get('p50_ms') is not None else '-'
+        p99 = f'{result["p99_ms"]:.2f}' if result.get('p99_ms') is not None else '-'
+        rss = f'{result["peak_rss_mb"]:.1f}' if result.get('peak_rss_mb') is not None else '-'
+        print(f'{name:20} {result["records_per_sec"]:12.1f} {p50:>10} {p99:>10} {rss:>12}')
+
+
+def run(args):
+    results = parse_benchmarks(args.iterations)
+    results.update(record_benchmarks(args.iterations, args.records))
+    results.update(blob_benchmarks(args.records))
+    results.update(name_index_benchmarks(args))
+    if not args.parse_only:
+        results.update(crawl_benchmarks(args))
+
+    print_results(results)
+
+    previous_path, previous = latest_result()
+    regressions = []
+    if previous is not None:
+        print(f'\ncompared with {previous_path}')
+        regressions = compare(results, previous, args.threshold)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f'{datetime.now().strftime("%Y%m%d-%H%M%S")}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'params': vars(args), 'results': results}, f, ensure_ascii=False, indent=4)
+    print(f'results saved to {path}')
+
+    if len(regressions) > 0:
+        print(f'regressions: {", ".join(regressions)}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline scrapers benchmark',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-n', '--iterations', type=int, default=200, help='Calls of every parse function')
+    parser.add_argument('--parse-only', action='store_true', help='Skip the crawls against the mock server')
+    parser.add_argument('--apps', type=int, default=500, help='Amount of appids in the steam crawl')
+    parser.add_argument('--pages', type=int, default=10, help='Amount of byrutor listing pages')
+    parser.add_argument('--latency', type=float, default=0.02, help='Mean delay of the mock server in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.01, help='Share of 500 responses of the mock server')
+    parser.add_argument('-c', '--concurrency', type=int, default=20, help='Concurrency of the steam crawl')
+    parser.add_argument('--parse-executor', type=str, default='thread', help='Parse executor of the crawls')
+    parser.add_argument('--records', type=int, default=2000, help='Records kept alive in the memory benchmark')
+    parser.add_argument('--app-list', type=str, default=os.path.join('outputs', 'steam', 'games.json'),
+                        help='Recorded Steam app list for the name index benchmark, a synthetic one when it is missing')
+    parser.add_argument('--catalogue-size', type=int, default=150000, help='Names in the synthetic app list')
+    parser.add_argument('--queries', type=int, default=500, help='Distinct names looked up in the name index')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Drop of records/sec against the previous run counted as a regression')
+    args = parser.parse_args()
+
+    raise SystemExit(1 if run(args) else 0)
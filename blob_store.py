@@ -0,0 +1,145 @@
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import zlib
+
+from html_parser import make_soup
+from output_writer import read_records
+
+
+# ссылка на описание в записи шарда: {"$blob": "<sha1 JSON литерала описания>"}, см. records.LazyText
+BLOB_KEY = '$blob'
+
+
+def is_blob_ref(value):
+    return isinstance(value, dict) and len(value) == 1 and BLOB_KEY in value
+
+
+def plain_text(html: str):
+    # текст без разметки нужен редко, поэтому HTML разбирается только по запросу, а не при каждом скрейпе
+    soup = make_soup(html)
+    return soup.text if soup is not None else None
+
+
+class BlobStore:
+    # Большие текстовые поля (HTML описания) по адресу содержимого: ключ - sha1 JSON литерала,
+    # значение - литерал в zlib. Одинаковые описания разных запусков и источников хранятся один раз.
+    # Записи пачками в одной транзакции, ссылки на блоб попадают в шард только после его коммита
+    # (JsonLinesWriter.sync сначала сбрасывает хранилище блобов).
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        # sha1 в байтах, уже лежащие в файле или в очереди на запись, чтобы не ходить в SQLite повторно
+        self.known = set()
+        self.stats = {'inline': 0, 'puts': 0, 'stored': 0, 'deduplicated': 0, 'stored_bytes': 0}
+
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS blobs ('
+                                'hash BLOB PRIMARY KEY, size INTEGER NOT NULL, data BLOB NOT NULL)')
+
+    def put_lazy(self, lazy):
+        # у LazyText из records.py длинный литерал уже сжат и посчитаны его sha1 и размер, он не разжимается
+        digest = lazy.digest
+        self.stats['puts'] += 1
+
+        if digest in self.known or self.connection.execute('SELECT 1 FROM blobs WHERE hash = ?',
+                                                           (digest,)).fetchone() is not None:
+            self.known.add(digest)
+            self.stats['deduplicated'] += 1
+            return digest.hex()
+
+        data = lazy.compressed()
+        self.known.add(digest)
+        self.pending.append((digest, lazy.size, data))
+        self.stats['stored'] += 1
+        self.stats['stored_bytes'] += len(data)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return digest.hex()
+
+    def reference(self, lazy):
+        # JSON литерал, который records.Record.to_json пишет вместо описания. Короткие описания
+        # (без sha1, меньше records.LAZY_MIN_BYTES) остаются в записи: ссылка на них почти такой же длины
+        if lazy.digest is None:
+            self.stats['inline'] += 1
+            return lazy.literal()
+        return f'{{"{BLOB_KEY}":"{self.put_lazy(lazy)}"}}'
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            # другой воркер мог успеть записать тот же блоб
+            self.connection.executemany('INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)', self.pending)
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.pending.clear()
+
+    def get_literal(self, digest: str):
+        row = self.connection.execute('SELECT data FROM blobs WHERE hash = ?', (bytes.fromhex(digest),)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def get(self, digest: str):
+        literal = self.get_literal(digest)
+        return json.loads(literal) if literal is not None else None
+
+    def get_text(self, digest: str):
+        html = self.get(digest)
+        return plain_text(html) if html is not None else None
+
+    def resolve(self, record: dict):
+        # подставляет описания вместо ссылок, запись меняется на месте
+        for field, value in record.items():
+            if is_blob_ref(value):
+                record[field] = self.get(value[BLOB_KEY])
+        return record
+
+    def summary(self):
+        return (f"blobs: {self.stats['puts']} descriptions, new: {self.stats['stored']} "
+                f"({self.stats['stored_bytes'] / 1024 ** 2:.1f}MB), deduplicated: {self.stats['deduplicated']}, "
+                f"short kept in records: {self.stats['inline']}")
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+        logging.info(self.summary())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read descriptions from the blob store of the scrapers',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('path', type=str, help='Path to the blob store SQLite file')
+    parser.add_argument('--get', type=str, help='Print the description with this hash')
+    parser.add_argument('--text', action='store_true', help='Print descriptions as plain text without HTML')
+    parser.add_argument('--resolve', type=str, nargs='+',
+                        help='Print records of these shards with descriptions in place of blob references')
+    args = parser.parse_args()
+
+    store = BlobStore(args.path)
+    if args.get is not None:
+        print(store.get_text(args.get) if args.text else store.get(args.get))
+    elif args.resolve is not None:
+        for shard in args.resolve:
+            for line_record in read_records(shard):
+                store.resolve(line_record)
+                if args.text:
+                    for key, value in line_record.items():
+                        if key in ('long_description', 'description') and isinstance(value, str):
+                            line_record[key] = plain_text(value)
+                sys.stdout.write(json.dumps(line_record, ensure_ascii=False) + '\n')
+    else:
+        count, size, stored = store.connection.execute(
+            'SELECT count(*), coalesce(sum(size), 0), coalesce(sum(length(data)), 0) FROM blobs').fetchone()
+        print(f'blobs: {count}, descriptions: {size / 1024 ** 2:.1f}MB, stored: {stored / 1024 ** 2:.1f}MB')
+    store.connection.close()
@@ -1,64 +1,82 @@
+import argparse
 import asyncio
-import json
 import os
-import uuid
 from datetime import datetime
-import aiohttp
 import re
-from bs4 import BeautifulSoup
+import time
 from tqdm import tqdm
 import logging
+from http_client import get_client, close_client
+from worker_pool import run_pool
+from response_cache import open_cache
+from output_writer import JsonLinesWriter, COMPRESSIONS
+from parse_executor import EXECUTOR_KINDS, get_executor, open_executor, close_executor
+from html_parser import BACKEND_CHOICES, make_soup, class_strainer, tag_strainer, find_source_tags, set_backend
+from taxonomy import Taxonomy
+from game_store import GameStore
+from records import ByrutorGame
+from change_tracker import ChangeTracker
+from blob_store import BlobStore
+from egress_pool import EgressPool
+from metrics import get_metrics, start_metrics_server, write_metrics_periodically
+from rate_limiter import parse_retry_after
+from retry import (ERROR_PARSE, ERROR_PERMANENT, DeadLetterQueue, RetryPolicy, classify_error, error_from_status,
+                   read_dead_letters)
+
+
+RESULTS = get_metrics().counter('scraper_results_total', 'Scraped records by source, journal state and error class')
+
+# элементы страницы игры, которые читает scrape_game_info, остальная страница не разбирается
+GAME_PAGE_CLASSES = ('hname', 'game_desc', 'fresco', 'dateym', 'link-year', 'tech_details', 'apptag', 'info_type',
+                     'persize_bottom')
 
 
 async def get_request(uri: str):
-    session_timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
     try:
-        async with aiohttp.ClientSession(timeout=session_timeout, trust_env=True) as session:
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
-                                     'Chrome/121.0.0.0 Safari/537.36'}
-            async with session.get(uri, headers=headers, allow_redirects=True, timeout=10) as response:
-                if response.status == 200 or response.status == 301:
-                    return await response.text()
-    except asyncio.TimeoutError:
-        logging.warning(f'Timeout error: {uri}')
-        return None
-    except aiohttp.ClientConnectorError:
-        logging.warning(f'Connection failed: {uri}')
+        return await fetch_page(uri)
+    except Exception as e:
+        logging.warning(f'Page does not opened: {uri}, {classify_error(e)}: {e!r}')
         return None
 
 
-async def get_game_data(uri: str):
-    try_count = 0
+async def fetch_page(uri: str):
+    response = await get_client().fetch(uri, allow_redirects=True, egress=egress)
+    if response.status == 200 or response.status == 301:
+        return response.text
 
-    while try_count < 5:
-        html_text = await get_request(uri)
-        if html_text is not None:
-            logging.info(f'The game page has been opened: {uri}')
-            return scrape_game_info(html_text, uri)
-        try_count += 1
-        await asyncio.sleep(1)
+    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+    raise error_from_status(response.status, f'Status code: {response.status}, uri: {uri}', retry_after)
 
-    logging.warning(f'The game page does not opened: {uri}')
-    return {'success': False, 'uri': uri, 'message': 'The game page does not opened'}
 
+async def get_game_data(uri: str):
+    try:
+        html_text = await retry_policy.call(fetch_page, uri)
+    except Exception as e:
+        logging.warning(f'The game page does not opened: {uri}, {e!r}')
+        return {'success': False, 'uri': uri, 'message': f'The game page does not opened: {e}',
+                'error': classify_error(e)}
 
-async def get_game_links_from_page(uri: str):
-    try_count = 0
+    logging.info(f'The game page has been opened: {uri}')
+    try:
+        return await get_executor().run(scrape_game_info, html_text, uri)
+    except Exception as e:
+        logging.error(f'The game page is not parsed: {uri}, {e!r}')
+        return {'success': False, 'uri': uri, 'message': repr(e), 'error': ERROR_PARSE}
 
-    while try_count < 5:
-        html_text = await get_request(uri)
-        if html_text is not None:
-            return scrape_game_links(html_text)
-        try_count += 1
-        await asyncio.sleep(1)
 
-    logging.warning(f'The page does not open: {uri}')
-    return list()
+async def get_game_links_from_page(uri: str):
+    try:
+        html_text = await retry_policy.call(fetch_page, uri)
+    except Exception as e:
+        logging.warning(f'The page does not open: {uri}, {e!r}')
+        return list()
+
+    return await get_executor().run(scrape_game_links, html_text)
 
 
-def scrape_game_links(html_text: str):
+def scrape_game_links(html_text: str, backend: str = None):
     list_games_uri = []
-    soup = BeautifulSoup(html_text, 'html.parser')
+    soup = make_soup(html_text, tag_strainer('main'), backend)
     main_class = soup.find('main', class_='main')
     game_divs = main_class.find_all('div', class_='short_title')
 
@@ -69,13 +87,24 @@ def scrape_game_links(html_text: str):
     return list_games_uri
 
 
-def scrape_game_info(html_text: str, uri: str):
+def scrape_game_info(html_text: str, uri: str, backend: str = None, partial: bool = True):
     if html_text is None:
         logging.warning(f'Game does not opened: {uri}')
         return
 
+    if partial:
+        try:
+            soup = make_soup(html_text, class_strainer(*GAME_PAGE_CLASSES), backend)
+            return extract_game_info(uri, soup, find_source_tags(html_text, backend))
+        except (AttributeError, IndexError, TypeError):
+            logging.warning(f'Partial parsing failed, parse the whole page: {uri}')
+
+    soup = make_soup(html_text, backend=backend)
+    return extract_game_info(uri, soup, soup)
+
+
+def extract_game_info(uri: str, soup, video_soup):
     game_info = {'uri': uri}
-    soup = BeautifulSoup(html_text, 'html.parser')
 
     # getting game name
     div_game_name = soup.find('div', class_='hname')
@@ -93,14 +122,14 @@ def scrape_game_info(html_text: str, uri: str):
         screenshots.append(a['href'])
 
     # getting video
-    soup_video_webm = soup.find('source', attrs={'type': 'video/webm'})
+    soup_video_webm = video_soup.find('source', attrs={'type': 'video/webm'})
     if soup_video_webm is not None:
         video_webm = soup_video_webm.attrs.get('src', 'Not found')
         game_info['video_webm'] = str(video_webm)
     else:
         game_info['video_webm'] = 'Not found'
 
-    soup_video_mp4 = soup.find('source', attrs={'type': 'video/mp4'})
+    soup_video_mp4 = video_soup.find('source', attrs={'type': 'video/mp4'})
     if soup_video_mp4 is not None:
         video_mp4 = soup_video_webm.attrs.get('src', 'Not found')
         game_info['video_mp4'] = str(video_mp4)
@@ -193,86 +222,186 @@ def scrape_game_info(html_text: str, uri: str):
 
     game_info['success'] = True
     logging.info(f'Game has been scraped: {game_info['name']}')
-    return game_info
+    return ByrutorGame.from_dict(game_info)
 
 
-def write_json_file(games_list, path_file: str):
-    with open(path_file, 'w', encoding='utf-8') as f:
-        json.dump(games_list, f, ensure_ascii=False, indent=4)
-        f.close()
+async def discover_game_links(last_page: int, concurrency: int, stats: dict):
+    # страницы списка обходятся параллельно, и ссылки сразу уходят в очередь разбора игр,
+    # повторы отсеиваются по мере нахождения
+    seen_links = set()
+    pages = (f"{config['site_url']}/page/{page_count}/" for page_count in range(1, last_page + 1))
 
+    async for uri, links in run_pool(pages, get_game_links_from_page, concurrency):
+        stats['pages'] += 1
 
-async def main():
-    # getting max count page
-    uri = 'https://thebyrut.org/'
-    html_text = await get_request(uri)
-    soup = BeautifulSoup(html_text, 'html.parser')
-    soup_div_pages = soup.find('div', class_='pages')
-    soup_a_pages = soup_div_pages.find_all('a')
-    last_page = int(soup_a_pages[-1].text)
-
-    games_links = []
-
-    for page_count in tqdm(range(1, last_page + 1), desc='get game links',
-                           bar_format='{l_bar}{bar:30}{r_bar}{bar:-10b}', position=0):
-        uri = f'https://thebyrut.org/page/{page_count}/'
-        links = await get_game_links_from_page(uri)
-
-        if len(links) > 0:
-            games_links.extend(links)
-        else:
-            logging.error(f'Page: {page_count}, uri: {uri} does not opened')
-
-    logging.info(f'Получилось взять {len(games_links)} игр')
-    games_links = list(dict.fromkeys(games_links))
-    logging.info(f'С отсеиванием одинаковых ссылок осталось игр: {len(games_links)}')
+        if isinstance(links, Exception) or len(links) == 0:
+            stats['failed_pages'] += 1
+            logging.error(f'Page uri: {uri} does not opened')
+            continue
 
-    written_count_games = 0
+        for link in links:
+            stats['found'] += 1
+            if link in seen_links:
+                continue
 
-    count_game_for_write = 1200
-    count_game_for_scrape = 24
-    index_for_write = 0
-    index_for_scrape = 0
+            seen_links.add(link)
+            yield link
 
-    games_for_json_write = []
-    failure_games_for_write = []
-    get_games_tasks = []
 
-    for index in tqdm(range(0, len(games_links)), desc='format games',
-                      bar_format='{l_bar}{bar:30}{r_bar}{bar:-10b}', position=0):
-        get_games_tasks.append(get_game_data(games_links[index]))
+def removals_known(stats: dict):
+    # пропавшие игры видны только по полному обходу сайта: игры с неоткрывшейся страницы списка не пропали
+    return config['replay'] is None and stats['failed_pages'] == 0
 
-        if index_for_scrape >= count_game_for_scrape or index + 1 >= len(games_links):
-            games = await asyncio.gather(*get_games_tasks, return_exceptions=True)
 
-            success_games = [game for game in games if game['success'] is True]
-            written_count_games += len(success_games)
+async def main():
+    started_at = time.perf_counter()
+    first_game_at = None
+    stats = {'pages': 0, 'found': 0, 'failed_pages': 0}
+    last_page = 0
+
+    if config['replay'] is not None:
+        logging.info(f"Replaying dead letters from {config['replay']}")
+        games_links = list(read_dead_letters(config['replay']))
+    else:
+        # getting max count page
+        uri = f"{config['site_url']}/"
+        html_text = await get_request(uri)
+        soup = make_soup(html_text, class_strainer('pages'))
+        soup_div_pages = soup.find('div', class_='pages')
+        soup_a_pages = soup_div_pages.find_all('a')
+        last_page = int(soup_a_pages[-1].text)
 
-            failure_games = [game for game in games if game['success'] is False]
+        games_links = discover_game_links(last_page, config['listing_concurrency'], stats)
 
-            games_for_json_write.extend(success_games)
-            failure_games_for_write.extend(failure_games)
+    written_count_games = 0
 
-            index_for_scrape = 0
-            get_games_tasks.clear()
-            await asyncio.sleep(4)
+    count_game_for_write = 1200
+    count_game_for_scrape = 24
 
-        if index_for_write >= count_game_for_write or index + 1 >= len(games_links):
-            write_json_file(games_for_json_write, os.path.join(dir_success_games, str(uuid.uuid4()) + '.json'))
-            if len(failure_games_for_write) > 0:
-                write_json_file(failure_games_for_write, os.path.join(dir_failure_games, str(uuid.uuid4()) + '.json'))
+    success_writer = JsonLinesWriter(dir_success_games, prefix='games', compression=config['compression'],
+                                     max_records=count_game_for_write, fsync_every=100, blobs=blob_store)
+    failure_writer = JsonLinesWriter(dir_failure_games, prefix='failed', compression=config['compression'],
+                                     max_records=count_game_for_write, fsync_every=100)
 
-            games_for_json_write.clear()
-            failure_games_for_write.clear()
-            index_for_write = 0
+    metrics_task = asyncio.create_task(write_metrics_periodically(os.path.join(dir_games_path, 'metrics.prom'),
+                                                                  config['metrics_interval']))
+    metrics_server = None
+    if config['metrics_port'] is not None:
+        metrics_server = await start_metrics_server(config['metrics_host'], config['metrics_port'])
 
-        index_for_scrape += 1
-        index_for_write += 1
+    progress_bar = tqdm(desc='format games', bar_format='{l_bar}{bar:30}{r_bar}{bar:-10b}', position=0)
+    scraped_count_games = 0
 
-    logging.info(f"Было записано игр: {written_count_games} из {len(games_links)}")
+    try:
+        async for uri, game in run_pool(games_links, get_game_data, count_game_for_scrape):
+            progress_bar.update()
+            progress_bar.set_postfix(pages=f"{stats['pages']}/{last_page}")
+            scraped_count_games += 1
+
+            if first_game_at is None:
+                first_game_at = time.perf_counter() - started_at
+                logging.info(f'First game page scraped after {first_game_at:.2f}s')
+
+            if isinstance(game, Exception):
+                game = {'success': False, 'uri': uri, 'message': repr(game), 'error': classify_error(game)}
+
+            if isinstance(game, ByrutorGame):
+                if game.genres is not None:
+                    game.genre_ids = taxonomy.encode('genres', game.genres, 'byrutor')
+                game.category_ids = taxonomy.encode('categories', game.categories, 'byrutor')
+                success_writer.write(game)
+                if game_store is not None or change_tracker is not None:
+                    record = game.to_dict()
+                    if game_store is not None:
+                        game_store.add('byrutor', record)
+                    if change_tracker is not None:
+                        change_tracker.observe(game.uri, record)
+                written_count_games += 1
+                RESULTS.inc(source='byrutor', state='ok', error='')
+            else:
+                failure_writer.write(game)
+                RESULTS.inc(source='byrutor', state='failed', error=game.get('error', ERROR_PERMANENT))
+                dead_letters.add(uri, game.get('error', ERROR_PERMANENT), game['message'])
+                if change_tracker is not None:
+                    change_tracker.keep(uri)
+
+        if change_tracker is not None and removals_known(stats):
+            change_tracker.emit_removed()
+        elif change_tracker is not None and config['replay'] is None:
+            logging.warning(f"Removed games are not emitted: {stats['failed_pages']} listing pages did not open")
+    finally:
+        success_writer.close()
+        failure_writer.close()
+        dead_letters.close()
+        if game_store is not None:
+            game_store.close()
+        if change_tracker is not None:
+            change_tracker.close()
+        if blob_store is not None:
+            blob_store.close()
+        progress_bar.close()
+        metrics_task.cancel()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        taxonomy.save()
+        logging.info(f'Taxonomy: {taxonomy.summary()}')
+        close_executor()
+        await close_client()
+
+    logging.info(f"Получилось взять {stats['found']} игр с {stats['pages']} страниц "
+                 f"(не открылось: {stats['failed_pages']}), "
+                 f"с отсеиванием одинаковых ссылок осталось игр: {scraped_count_games}")
+    logging.info(f"Было записано игр: {written_count_games} из {scraped_count_games} "
+                 f"за {time.perf_counter() - started_at:.2f}s")
+    logging.info(f'Retries: {retry_policy.stats.summary()}, dead letters: {dead_letters.count}')
+    if egress is not None:
+        logging.info(egress.summary())
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Byrutor Parser', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--site-url', type=str, default='https://thebyrut.org', help='Base url of the site')
+    parser.add_argument('--listing-concurrency', type=int, default=4,
+                        help='Amount of listing pages fetched at once while game pages are scraped')
+    parser.add_argument('--retries', type=int, default=5,
+                        help='Attempts per page on timeouts, connection errors, 429 and 5xx responses')
+    parser.add_argument('--retry-delay', type=float, default=1.0, help='Base of the exponential retry delay in seconds')
+    parser.add_argument('--retry-max-delay', type=float, default=30.0, help='Upper limit of the retry delay in seconds')
+    parser.add_argument('--replay', type=str,
+                        help='Path to dead_letter.jsonl of a previous run, only its pages are scraped again')
+    parser.add_argument('--metrics-interval', type=float, default=10,
+                        help='Seconds between rewrites of metrics.prom in the run directory')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics at http://host:port/metrics')
+    parser.add_argument('--metrics-host', type=str, default='localhost', help='Host of the metrics endpoint')
+    parser.add_argument('--cache', action='store_true',
+                        help='Keep http responses in outputs/http_cache.sqlite and reuse them on the next runs')
+    parser.add_argument('--cache-ttl', type=float, default=24, help='Hours while a cached response is fresh')
+    parser.add_argument('--cache-size', type=int, default=2048, help='Max size of the response cache in megabytes')
+    parser.add_argument('--store', type=str,
+                        help='Path to a SQLite file where successful games are also upserted with indexes for lookups')
+    parser.add_argument('--delta', action='store_true',
+                        help='Also write added, changed and removed games into delta/ of the run directory, content '
+                             'hashes of the previous runs are kept in outputs/content_hashes.sqlite')
+    parser.add_argument('--blobs', action='store_true',
+                        help='Keep descriptions once per content in outputs/blobs.sqlite, records get only a hash '
+                             'reference')
+    parser.add_argument('--egress', type=str, nargs='+',
+                        help='Routes of the requests: direct, http://proxy:port or local:<source address>. Every '
+                             'route has its own rate limit, a route that got 429 or a connect error pauses for a while')
+    parser.add_argument('--egress-rate', type=float, default=2.0, help='Initial requests per second of one route')
+    parser.add_argument('--egress-max-rate', type=float, default=10.0,
+                        help='Upper limit of requests per second of one route')
+    parser.add_argument('--egress-cooldown', type=float, default=30,
+                        help='Seconds of the first pause of a failed route, doubled while it keeps failing')
+    parser.add_argument('--compression', type=str, default='none', choices=COMPRESSIONS,
+                        help='Compression of the output json lines files')
+    parser.add_argument('--parse-executor', type=str, default='process', choices=EXECUTOR_KINDS,
+                        help='Where pages are parsed: process pool, thread pool or right on the event loop')
+    parser.add_argument('--parse-workers', type=int, help='Amount of parse workers, default: cpu count')
+    parser.add_argument('--html-parser', type=str, default='auto', choices=BACKEND_CHOICES,
+                        help='BeautifulSoup backend, auto takes lxml when it is installed')
+    config = vars(parser.parse_args())
+
     now = datetime.now().strftime('%d-%m-%Y %H-%M-%S')
     outputs_dir = os.path.join(os.getcwd(), 'outputs', 'byrutor')
     dir_games_path = os.path.join(outputs_dir, now)
@@ -284,4 +413,28 @@ if __name__ == '__main__':
 
     logging.basicConfig(filename=os.path.join(dir_games_path, f'logs-{now}.log'), encoding='utf-8',
                         format='%(asctime)s.%(msecs)03d %(message)s', datefmt='%d-%m-%Y %H:%M:%S', level=logging.DEBUG)
+
+    taxonomy = Taxonomy(os.path.join(os.getcwd(), 'outputs', 'taxonomy.json'))
+    # неудачи byrutor пишутся пачками: контрольных точек, как у steam_scraper, здесь нет
+    dead_letters = DeadLetterQueue(os.path.join(dir_games_path, 'dead_letter.jsonl'), sync_every=100)
+    game_store = GameStore(config['store']) if config['store'] is not None else None
+    change_tracker = None
+    if config['delta']:
+        change_tracker = ChangeTracker(os.path.join(os.getcwd(), 'outputs', 'content_hashes.sqlite'), 'byrutor', now,
+                                       os.path.join(dir_games_path, 'delta'), config['compression'])
+    blob_store = BlobStore(os.path.join(os.getcwd(), 'outputs', 'blobs.sqlite')) if config['blobs'] else None
+    retry_policy = RetryPolicy(config['retries'], config['retry_delay'], config['retry_max_delay'])
+
+    if config['cache']:
+        get_client().cache = open_cache(os.path.join(os.getcwd(), 'outputs', 'http_cache.sqlite'),
+                                        config['cache_ttl'], config['cache_size'])
+    egress = None
+    if config['egress'] is not None:
+        egress = EgressPool(config['egress'], config['egress_rate'], config['egress_max_rate'],
+                            config['egress_cooldown'], channel='byrutor')
+
+    set_backend(config['html_parser'])
+    if config['parse_executor'] != 'inline':
+        open_executor(config['parse_executor'], config['parse_workers'])
+
     asyncio.run(main())
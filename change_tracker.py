@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from output_writer import JsonLinesWriter
+
+
+OP_ADDED = 'added'
+OP_CHANGED = 'changed'
+OP_REMOVED = 'removed'
+
+
+def canonical_json(value):
+    # одинаковые данные дают одинаковую строку независимо от порядка ключей
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def content_hash(record: dict):
+    return hashlib.sha1(canonical_json(record).encode('utf-8')).hexdigest()
+
+
+def field_hashes(record: dict):
+    # короткие хеши полей нужны только чтобы назвать изменившиеся поля
+    return {field: hashlib.sha1(canonical_json(value).encode('utf-8')).hexdigest()[:12]
+            for field, value in record.items()}
+
+
+class ChangeTracker:
+    # Хеши содержимого записей прошлых запусков по (source, key) в SQLite. Запуск пишет в дельту
+    # только новые и изменившиеся записи, а после полного обхода - и пропавшие.
+    # Ключи, увиденные в этом запуске, помечаются номером запуска: пропавшие - те, что остались со старым.
+    # Поля из ignored_fields (откуда получена запись) не сравниваются вовсе, поля из unknown у observe
+    # в этой записи неизвестны: сравниваются только поля, которые есть и в новой записи, и в прошлой.
+    def __init__(self, path: str, source: str, run_id: str, delta_dir: str, compression: str = 'none',
+                 batch_size: int = 500, ignored_fields: tuple = ()):
+        self.source = source
+        self.ignored_fields = ignored_fields
+        self.run_id = run_id
+        self.delta_dir = delta_dir
+        self.batch_size = batch_size
+        self.pending = []
+        self.counts = {OP_ADDED: 0, OP_CHANGED: 0, OP_REMOVED: 0, 'unchanged': 0}
+        self.changed_fields = {}
+
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS hashes ('
+                                'source TEXT NOT NULL, key TEXT NOT NULL, hash TEXT NOT NULL, fields TEXT NOT NULL, '
+                                'run_id TEXT NOT NULL, changed_at REAL NOT NULL, PRIMARY KEY (source, key))')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS hashes_run ON hashes (source, run_id)')
+
+        os.makedirs(delta_dir, exist_ok=True)
+        self.writer = JsonLinesWriter(delta_dir, prefix='delta', compression=compression, fsync_every=None)
+
+    def observe(self, key, record: dict, unknown: tuple = ()):
+        key = str(key)
+        known = {field: value for field, value in record.items()
+                 if field not in self.ignored_fields and field not in unknown}
+        record_hash = content_hash(known)
+        row = self.connection.execute('SELECT hash, fields FROM hashes WHERE source = ? AND key = ?',
+                                      (self.source, key)).fetchone()
+
+        if row is not None and row[0] == record_hash:
+            self.counts['unchanged'] += 1
+            self.pending.append(('touch', key))
+        else:
+            fields = field_hashes(known)
+            if row is None:
+                op, changed = OP_ADDED, []
+            else:
+                # неизвестные в этой записи поля остаются с прошлыми хешами
+                old_fields = {field: value for field, value in json.loads(row[1]).items()
+                              if field not in self.ignored_fields}
+                changed = sorted(field for field in fields.keys() & old_fields.keys()
+                                 if fields[field] != old_fields[field])
+                op = OP_CHANGED if len(changed) > 0 else None
+                fields = old_fields | fields
+
+            if op is None:
+                self.counts['unchanged'] += 1
+            else:
+                for field in changed:
+                    self.changed_fields[field] = self.changed_fields.get(field, 0) + 1
+                self.counts[op] += 1
+                self.writer.write({'op': op, 'source': self.source, 'key': key, 'hash': record_hash,
+                                   'changed_fields': changed, 'record': record})
+            self.pending.append(('put', key, record_hash, json.dumps(fields)))
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return self.counts
+
+    def keep(self, key):
+        # запись не получена из-за временной ошибки: игра не считается пропавшей
+        self.pending.append(('touch', str(key)))
+
+    def remove(self, key):
+        # источник ответил, что записи больше нет: она пропала сразу, без ожидания конца полного обхода
+        key = str(key)
+        row = self.connection.execute('SELECT hash FROM hashes WHERE source = ? AND key = ?',
+                                      (self.source, key)).fetchone()
+        if row is None:
+            return self.counts
+
+        self.counts[OP_REMOVED] += 1
+        self.writer.write({'op': OP_REMOVED, 'source': self.source, 'key': key, 'hash': row[0],
+                           'changed_fields': [], 'record': None})
+        self.pending.append(('delete', key))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return self.counts
+
+    def flush(self):
+        # дельта сбрасывается на диск раньше хешей: после падения запись попадёт в дельту повторно, но не потеряется
+        self.writer.sync()
+        if len(self.pending) == 0:
+            return
+
+        now = time.time()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.executemany('UPDATE hashes SET run_id = ? WHERE source = ? AND key = ?',
+                                        [(self.run_id, self.source, item[1])
+                                         for item in self.pending if item[0] == 'touch'])
+            self.connection.executemany('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)',
+                                        [(self.source, item[1], item[2], item[3], self.run_id, now)
+                                         for item in self.pending if item[0] == 'put'])
+            self.connection.executemany('DELETE FROM hashes WHERE source = ? AND key = ?',
+                                        [(self.source, item[1]) for item in self.pending if item[0] == 'delete'])
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.pending.clear()
+
+    def emit_removed(self):
+        # только после полного обхода: при частичном не увиденные ключи ещё не значит пропавшие
+        self.flush()
+        removed = self.connection.execute('SELECT key, hash FROM hashes WHERE source = ? AND run_id != ?',
+                                          (self.source, self.run_id)).fetchall()
+        for key, record_hash in removed:
+            self.writer.write({'op': OP_REMOVED, 'source': self.source, 'key': key, 'hash': record_hash,
+                               'changed_fields': [], 'record': None})
+        self.counts[OP_REMOVED] += len(removed)
+        self.writer.sync()
+
+        self.connection.execute('DELETE FROM hashes WHERE source = ? AND run_id != ?', (self.source, self.run_id))
+
+    def summary(self):
+        fields = ', '.join(f'{field}: {count}' for field, count in
+                           sorted(self.changed_fields.items(), key=lambda item: -item[1])) or 'none'
+        return (f'delta: added: {self.counts[OP_ADDED]}, changed: {self.counts[OP_CHANGED]}, '
+                f'removed: {self.counts[OP_REMOVED]}, unchanged: {self.counts["unchanged"]}, '
+                f'changed fields: {fields}')
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        self.connection.close()
+
+        with open(os.path.join(self.delta_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'run_id': self.run_id, **self.counts,
+                       'changed_fields': self.changed_fields}, f, ensure_ascii=False, indent=4)
+        logging.info(self.summary())
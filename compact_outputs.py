@@ -0,0 +1,219 @@
+import argparse
+import glob
+import heapq
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import zlib
+
+from output_writer import EXTENSIONS, fsync_dir, read_records
+from utils import peak_rss_mb
+
+
+# Сжатие истории запусков в один набор: шарды всех запусков читаются потоком и раскладываются
+# по хешу ключа в файлы-разделы на диске, каждый раздел отдельно очищается от повторов и сортируется,
+# затем разделы сливаются heapq.merge в один файл. В памяти одновременно только один раздел.
+
+# папки с записями у steam_scraper.py и byrutor_scraper.py
+SHARD_DIRS = {'successful': True, 'success': True, 'failed': False, 'failure': False}
+INDEX_SUFFIX = '.idx'
+
+
+def record_key(record: dict):
+    # у Steam ключ - appid, у byrutor - адрес страницы игры
+    if 'appid' in record:
+        return str(record['appid'])
+    return record.get('uri')
+
+
+def sort_key(key: str):
+    # appid сортируются как числа, адреса - как строки
+    return (0, int(key), '') if key.isdigit() else (1, 0, key)
+
+
+def read_shard(path: str):
+    if not path.endswith('.json'):
+        yield from read_records(path)
+        return
+
+    # старый формат: целый json файл, словарь {appid: данные} или список записей
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        for appid, game in data.items():
+            yield {'appid': appid, **game}
+    else:
+        yield from data
+
+
+def find_shards(inputs: list, include_failed: bool, output: str):
+    # (успешность, путь): порядок по времени изменения, новее - позже
+    shards = []
+    for root in inputs:
+        if os.path.isfile(root):
+            shards.append((True, root))
+            continue
+
+        for path in glob.glob(os.path.join(root, '**', '*'), recursive=True):
+            if not os.path.isfile(path) or os.path.abspath(path) == os.path.abspath(output):
+                continue
+            if not path.endswith(tuple(EXTENSIONS.values()) + ('.json',)):
+                continue
+
+            successful = SHARD_DIRS.get(os.path.basename(os.path.dirname(path)))
+            if successful is None or (not successful and not include_failed):
+                continue
+            shards.append((successful, path))
+
+    return sorted(shards, key=lambda shard: (os.path.getmtime(shard[1]), shard[1]))
+
+
+class Compactor:
+    def __init__(self, output: str, partitions: int = 64, work_dir: str = None):
+        if partitions <= 0:
+            raise ValueError('"partitions" value cannot be less or equal zero')
+
+        self.output = output
+        self.partitions = partitions
+        self.work_dir = tempfile.mkdtemp(prefix='compact-', dir=work_dir or os.path.dirname(os.path.abspath(output)))
+        self.stats = {'shards': 0, 'read': 0, 'without_key': 0, 'written': 0, 'largest_partition': 0}
+
+    def spill(self, shards: list):
+        # строка раздела: [успешность, номер шарда, номер строки, ключ, запись]
+        files = [open(os.path.join(self.work_dir, f'{number}.spill'), 'w', encoding='utf-8')
+                 for number in range(self.partitions)]
+        try:
+            for shard_number, (successful, path) in enumerate(shards):
+                self.stats['shards'] += 1
+                for line_number, record in enumerate(read_shard(path)):
+                    self.stats['read'] += 1
+                    key = record_key(record)
+                    if key is None:
+                        self.stats['without_key'] += 1
+                        continue
+
+                    # у неудачной записи из папки успешных success: False
+                    ok = int(successful and record.get('success', True) is not False)
+                    partition = zlib.crc32(key.encode('utf-8')) % self.partitions
+                    files[partition].write(json.dumps([ok, shard_number, line_number, key, record],
+                                                      ensure_ascii=False, separators=(',', ':')) + '\n')
+        finally:
+            for f in files:
+                f.close()
+
+    def reduce(self, number: int):
+        # последняя победившая запись по ключу: успешная важнее неудачной, среди равных - более новая
+        newest = {}
+        path = os.path.join(self.work_dir, f'{number}.spill')
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                ok, shard_number, line_number, key, record = json.loads(line)
+                rank = (ok, shard_number, line_number)
+                if key not in newest or newest[key][0] < rank:
+                    newest[key] = (rank, record)
+        os.remove(path)
+
+        self.stats['largest_partition'] = max(self.stats['largest_partition'], len(newest))
+        sorted_path = os.path.join(self.work_dir, f'{number}.sorted')
+        with open(sorted_path, 'w', encoding='utf-8') as f:
+            for key in sorted(newest, key=sort_key):
+                f.write(json.dumps([key, newest[key][1]], ensure_ascii=False, separators=(',', ':')) + '\n')
+        return sorted_path
+
+    @staticmethod
+    def read_sorted(path: str):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                key, record = json.loads(line)
+                yield sort_key(key), key, record
+
+    def merge(self, sorted_paths: list):
+        # ключи разных разделов не пересекаются, поэтому слияние только упорядочивает
+        tmp_output = self.output + '.tmp'
+        tmp_index = self.output + INDEX_SUFFIX + '.tmp'
+        with open(tmp_output, 'wb') as output, open(tmp_index, 'w', encoding='utf-8') as index:
+            for _, key, record in heapq.merge(*(self.read_sorted(path) for path in sorted_paths)):
+                index.write(f'{key}\t{output.tell()}\n')
+                output.write((json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8'))
+                self.stats['written'] += 1
+            output.flush()
+            os.fsync(output.fileno())
+            index.flush()
+            os.fsync(index.fileno())
+
+        os.replace(tmp_output, self.output)
+        os.replace(tmp_index, self.output + INDEX_SUFFIX)
+        fsync_dir(os.path.dirname(os.path.abspath(self.output)))
+
+    def run(self, shards: list):
+        try:
+            self.spill(shards)
+            self.merge([self.reduce(number) for number in range(self.partitions)])
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        return self.stats
+
+
+class CompactedDataset:
+    # Чтение сжатого набора: весь файл потоком или одна запись по ключу через индекс смещений
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets = {}
+        with open(path + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+            for line in f:
+                key, offset = line.rstrip('\n').split('\t')
+                self.offsets[key] = int(offset)
+        self.file = open(path, 'rb')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, key):
+        return str(key) in self.offsets
+
+    def get(self, key):
+        offset = self.offsets.get(str(key))
+        if offset is None:
+            return None
+        self.file.seek(offset)
+        return json.loads(self.file.readline())
+
+    def __iter__(self):
+        return read_records(self.path)
+
+    def close(self):
+        self.file.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merge output shards of many runs into one deduplicated dataset',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('inputs', type=str, nargs='+',
+                        help='Run directories, their parents (outputs/steam) or single shard files')
+    parser.add_argument('-o', '--output', type=str, required=True,
+                        help='Path of the compacted .jsonl file, its offset index is written next to it with .idx. '
+                             'A previous output given as an input is compacted incrementally')
+    parser.add_argument('--include-failed', action='store_true',
+                        help='Keep failed records for keys which never succeeded')
+    parser.add_argument('--partitions', type=int, default=64,
+                        help='Spill partitions, memory use is bounded by the largest one')
+    parser.add_argument('--work-dir', type=str, help='Directory of the spill files, default: next to the output')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(message)s', datefmt='%d-%m-%Y %H:%M:%S', level=logging.INFO)
+
+    started_at = time.perf_counter()
+    shards = find_shards(args.inputs, args.include_failed, args.output)
+    if len(shards) == 0:
+        exception_message = 'No output shards found in the inputs'
+        logging.error(exception_message)
+        raise Exception(exception_message)
+
+    stats = Compactor(args.output, args.partitions, args.work_dir).run(shards)
+    print(f"shards: {stats['shards']}, records read: {stats['read']}, written: {stats['written']}, "
+          f"duplicates dropped: {stats['read'] - stats['without_key'] - stats['written']}, "
+          f"without key: {stats['without_key']}, largest partition: {stats['largest_partition']}, "
+          f"peak RSS: {peak_rss_mb():.1f}MB, time: {time.perf_counter() - started_at:.2f}s")
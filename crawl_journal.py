@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+
+
+STATE_OK = 'ok'
+STATE_NOT_GAME = 'not game'
+STATE_NOT_RELEASED = 'not released'
+STATE_FAILED = 'failed'
+
+# с такими состояниями appid при возобновлении больше не запрашивается
+COMPLETED_STATES = (STATE_OK, STATE_NOT_GAME, STATE_NOT_RELEASED)
+
+
+def state_from_result(game: dict):
+    # неудача из get_game_data: {'appid': ..., 'reason': ...}, успешная игра - SteamGame
+    if not isinstance(game, dict):
+        return STATE_OK, None
+
+    reason = game.get('reason', 'unknown')
+    if reason == 'is not game':
+        return STATE_NOT_GAME, None
+    if reason == 'not released':
+        return STATE_NOT_RELEASED, None
+    return STATE_FAILED, reason
+
+
+class CrawlJournal:
+    # Журнал дописывается по строке JSON на каждый appid, последняя запись побеждает.
+    # При открытии журнал целиком читается в словарь, поэтому проверка appid стоит O(1).
+    def __init__(self, path: str):
+        self.path = path
+        self.states = {}
+        self.pending = []
+        self._load()
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        for entry in self._read(self.path):
+            self.states[entry['appid']] = entry['state']
+        logging.info(f'Journal loaded: {len(self.states)} appids, completed: {self.completed_count()}')
+
+    @staticmethod
+    def _read(path: str):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # недописанная строка после падения
+                    logging.warning(f'Skip broken journal line: {line!r}')
+
+    def merge(self, path: str):
+        # состояния из журнала другого воркера, уже завершённые у себя appid не перезаписываются
+        if not os.path.exists(path) or os.path.abspath(path) == os.path.abspath(self.path):
+            return
+
+        for entry in self._read(path):
+            if not self.is_completed(entry['appid']):
+                self.states[entry['appid']] = entry['state']
+
+    def record(self, appid, state: str, reason: str = None):
+        appid = str(appid)
+        self.states[appid] = state
+        entry = {'appid': appid, 'state': state}
+        if reason is not None:
+            entry['reason'] = reason
+        # на диск запись попадает только в sync(), после того как записаны сами данные игр
+        self.pending.append(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def record_result(self, game):
+        # успешная игра - запись SteamGame, неудача - словарь с appid
+        state, reason = state_from_result(game)
+        self.record(game.appid if state == STATE_OK else game['appid'], state, reason)
+
+    def is_completed(self, appid):
+        return self.states.get(str(appid)) in COMPLETED_STATES
+
+    def completed_count(self):
+        return sum(1 for state in self.states.values() if state in COMPLETED_STATES)
+
+    def sync(self):
+        self.file.writelines(self.pending)
+        self.pending.clear()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.sync()
+        self.file.close()
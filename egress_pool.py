@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+
+from metrics import get_metrics
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from retry import ERROR_CONNECT, ERROR_TIMEOUT, classify_error
+
+
+ROUTE_DIRECT = 'direct'
+LOCAL_PREFIX = 'local:'
+# здоровье маршрута - скользящее среднее успешных запросов, у больного маршрута нагрузка считается больше
+HEALTH_WEIGHT = 0.2
+MIN_HEALTH = 0.1
+
+EGRESS_REQUESTS = get_metrics().counter('scraper_egress_requests_total', 'Requests by egress route and outcome')
+EGRESS_HEALTH = get_metrics().gauge('scraper_egress_health', 'Health score of egress routes from 0 to 1')
+
+
+class EgressRoute:
+    # Один путь запросов наружу: прямое соединение (direct), http прокси (http://host:port)
+    # или локальный адрес исходящих соединений (local:192.168.1.10). У каждого свой ограничитель скорости
+    def __init__(self, spec: str, rate: float, max_rate: float, channel: str = 'egress'):
+        self.spec = spec
+        self.channel = channel
+        self.proxy = None
+        self.local_address = None
+
+        if spec.startswith(('http://', 'https://')):
+            self.proxy = spec
+            parts = urlsplit(spec)
+            # логин и пароль прокси не попадают в логи и метрики
+            self.name = f'{parts.hostname}:{parts.port}' if parts.port is not None else parts.hostname
+        elif spec.startswith(LOCAL_PREFIX):
+            self.local_address = spec[len(LOCAL_PREFIX):]
+            self.name = spec
+        elif spec == ROUTE_DIRECT:
+            self.name = spec
+        else:
+            raise ValueError(f'Unknown egress route "{spec}", expected direct, http://host:port or local:address')
+
+        self.limiter = AdaptiveRateLimiter(rate=rate, max_rate=max_rate, name=f'{channel} route {self.name}')
+        self.health = 1.0
+        self.cooldown_until = 0.0
+        self.failures_in_row = 0
+        self.in_flight = 0
+        self.stats = {'ok': 0, 'throttled': 0, 'errors': 0}
+
+    def load(self):
+        # сколько ждал бы новый запрос на этом маршруте, с поправкой на его здоровье
+        return (self.limiter.expected_wait() + self.in_flight / self.limiter.rate) / self.health
+
+    def available(self, now: float):
+        return now >= self.cooldown_until
+
+    def summary(self):
+        return (f"{self.name}: rate {self.limiter.rate:.3f}/s, health {self.health:.2f}, ok: {self.stats['ok']}, "
+                f"throttled: {self.stats['throttled']}, errors: {self.stats['errors']}")
+
+
+class EgressPool:
+    # Набор маршрутов, заданных в настройках. Запрос уходит по наименее загруженному маршруту вне паузы,
+    # после 429/503 или ошибки соединения маршрут отдыхает cooldown секунд (дольше при повторах подряд),
+    # а запрос повторяется по другому маршруту. У каждого маршрута своя скорость, поэтому общая скорость
+    # растёт с числом маршрутов. Пул передаётся в HttpClient.fetch(egress=...). У каждого канала запросов
+    # (appdetails, страницы магазина) свой пул: 429 на одном канале не тормозит маршруты другого.
+    def __init__(self, specs: list, rate: float, max_rate: float, cooldown: float = 30.0, max_cooldown: float = 600.0,
+                 channel: str = 'egress'):
+        if len(specs) == 0:
+            raise ValueError('Egress pool needs at least one route')
+
+        self.channel = channel
+        self.routes = [EgressRoute(spec, rate, max_rate, channel) for spec in specs]
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+    def __len__(self):
+        return len(self.routes)
+
+    def choose(self):
+        now = time.monotonic()
+        routes = [route for route in self.routes if route.available(now)]
+        if len(routes) == 0:
+            return None
+        return min(routes, key=EgressRoute.load)
+
+    async def take(self):
+        # (маршрут, момент выдачи токена); момент передаётся в on_response, как issued_at у AdaptiveRateLimiter
+        while True:
+            route = self.choose()
+            if route is None:
+                # все маршруты на паузе, ждём ближайший
+                await asyncio.sleep(max(0.0, min(route.cooldown_until for route in self.routes) - time.monotonic()))
+                continue
+
+            issued_at = await route.limiter.acquire()
+            # пока запрос ждал токен, маршрут мог уйти на паузу
+            if route.available(time.monotonic()):
+                route.in_flight += 1
+                return route, issued_at
+
+    def on_response(self, route: EgressRoute, status: int, headers, issued_at: float = None):
+        # True - маршрут ограничен сервером, запрос стоит повторить по другому.
+        # Без issued_at из take() каждый 429 запросов, ушедших до перегрузки, снова снижает скорость маршрута
+        route.in_flight -= 1
+        if status == 429 or status == 503:
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+            route.stats['throttled'] += 1
+            route.limiter.on_throttle(retry_after, issued_at)
+            self._fail(route, 'throttled', retry_after)
+            return True
+
+        route.stats['ok'] += 1
+        route.failures_in_row = 0
+        route.limiter.on_success()
+        self._set_health(route, 1.0)
+        EGRESS_REQUESTS.inc(channel=route.channel, route=route.name, outcome='ok')
+        return False
+
+    def on_error(self, route: EgressRoute, error: BaseException):
+        # True - ошибка самого маршрута (соединение, таймаут), по другому маршруту запрос может пройти
+        route.in_flight -= 1
+        if not isinstance(error, Exception):
+            # отмена задачи или остановка программы - не ошибка маршрута
+            return False
+
+        kind = classify_error(error)
+        if kind not in (ERROR_CONNECT, ERROR_TIMEOUT):
+            EGRESS_REQUESTS.inc(channel=route.channel, route=route.name, outcome='error')
+            return False
+
+        route.stats['errors'] += 1
+        self._fail(route, kind, None)
+        return True
+
+    def _fail(self, route: EgressRoute, outcome: str, retry_after: float):
+        route.failures_in_row += 1
+        self._set_health(route, 0.0)
+        pause = min(self.max_cooldown, self.cooldown * 2 ** (route.failures_in_row - 1))
+        if retry_after is not None:
+            pause = max(pause, retry_after)
+        route.cooldown_until = time.monotonic() + pause
+        EGRESS_REQUESTS.inc(channel=route.channel, route=route.name, outcome=outcome)
+        logging.warning(f'Egress {route.channel} route {route.name}: {outcome}, paused for {pause:.1f}s, '
+                        f'health {route.health:.2f}')
+
+    @staticmethod
+    def _set_health(route: EgressRoute, value: float):
+        route.health = max(MIN_HEALTH, route.health * (1 - HEALTH_WEIGHT) + value * HEALTH_WEIGHT)
+        EGRESS_HEALTH.set(route.health, channel=route.channel, route=route.name)
+
+    def expected_wait(self):
+        # сколько ждал бы новый запрос на лучшем маршруте, как AdaptiveRateLimiter.expected_wait у прямых запросов
+        now = time.monotonic()
+        waits = [route.limiter.expected_wait() for route in self.routes if route.available(now)]
+        if len(waits) > 0:
+            return min(waits)
+        return max(0.0, min(route.cooldown_until for route in self.routes) - now)
+
+    def summary(self):
+        return f'{self.channel} routes: ' + '; '.join(route.summary() for route in self.routes)
@@ -3,8 +3,9 @@ import json
 import logging
 import asyncio
 import os
-import aiohttp
-from bs4 import BeautifulSoup
+from html_parser import make_soup, class_strainer
+from http_client import get_client, close_client
+from taxonomy import Taxonomy
 
 parser = argparse.ArgumentParser(description='Steam Parser', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 parser.add_argument('-a', '--above', type=int, help='The upper limit of the parsing list, default: max')
@@ -18,17 +19,19 @@ logging.basicConfig(filename='logs.log', encoding='utf-8',
                     format='%(asctime)s %(message)s', datefmt='%d-%m-%Y %H:%M:%S', level=logging.INFO)
 
 outputs_dir = os.path.join(os.getcwd(), 'outputs')
+taxonomy = Taxonomy(os.path.join(outputs_dir, 'taxonomy.json'))
 
 
 async def get_all_genres():
     logging.info(f'Getting all genres')
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {'Accept-Language': 'en-US'}
-            async with session.get('https://store.steampowered.com/', headers=headers,
-                                   allow_redirects=False) as response:
-                if response.status == 200:
-                    return scrape_genres(await response.text())
+        response = await get_client().fetch('https://store.steampowered.com/', allow_redirects=False)
+        if response.status == 200:
+            genres = scrape_genres(response.text)
+            taxonomy.encode('genres', genres, 'steam')
+            if taxonomy.save():
+                taxonomy.export_names('genres', 'steam', os.path.join(outputs_dir, 'genres.json'))
+            return genres
     except asyncio.TimeoutError as timeout_error:
         message_error = f'Timeout error getting genres'
         logging.error(message_error)
@@ -36,7 +39,7 @@ async def get_all_genres():
 
 
 def scrape_genres(html: str):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html, class_strainer('popup_genre_expand_content'))
     genres = []
 
     # Находим все элементы с классом "popup_genre_expand_content"
@@ -51,10 +54,6 @@ def scrape_genres(html: str):
             genre = link.get_text(strip=True)
             genres.append(genre)
 
-    path_genres_json_file = os.path.join(outputs_dir, 'genres.json')
-    genres_from_file = read_json_file(path_genres_json_file)
-    all_genres = list(set(genres_from_file) | set(genres))
-    write_json_file(all_genres, path_genres_json_file)
     return genres
 
 
@@ -75,15 +74,12 @@ def write_json_file(games_list, path_file: str):
 async def get_stored_steam_game_html(game_id):
     logging.info(f'Getting game from steam store')
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {'Accept-Language': 'en-US'}
-            async with session.get(f'https://store.steampowered.com/app/{game_id}', headers=headers,
-                                   allow_redirects=False) as response:
-                if response.status == 200:
-                    return await response.text()
-                else:
-                    print(f'Failed to access. Status: {response.status}, game id: {game_id}')
-                    return None
+        response = await get_client().fetch(f'https://store.steampowered.com/app/{game_id}', allow_redirects=False)
+        if response.status == 200:
+            return response.text
+        else:
+            print(f'Failed to access. Status: {response.status}, game id: {game_id}')
+            return None
     except asyncio.TimeoutError as timeout_error:
         message_error = f'Timeout error'
         logging.error(message_error)
@@ -91,7 +87,7 @@ async def get_stored_steam_game_html(game_id):
 
 
 def scrape_steam_game_html(html: str):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     game_name_by_id = soup.find('div', id='appHubAppName')
 
     if game_name_by_id is not None:
@@ -127,10 +123,11 @@ async def main():
         count_try += 1
 
     print(count_try)
+    await close_client()
 
 
 def get_description_text(html: str):
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = make_soup(html)
 
     if soup is not None:
         return soup.text
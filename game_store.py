@@ -0,0 +1,340 @@
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import time
+
+from records import STORE_PAGE_UNKNOWN
+
+
+SOURCES = ('steam', 'byrutor')
+# поля записи, которые лежат в колонках таблицы games, остальное уходит в extra
+GAME_COLUMNS = ('appid', 'name', 'release_date', 'release_year', 'age', 'short_description', 'description',
+                'website', 'header_image_uri', 'languages', 'version', 'torrent_size')
+CHILD_FIELDS = ('genres', 'categories', 'developers', 'publishers', 'screenshots', 'requirements', 'price')
+PRICE_COLUMNS = ('currency', 'initial', 'final', 'discount_percent')
+# id справочника taxonomy.json в хранилище не нужны: у жанров и категорий здесь своя таблица terms
+SKIPPED_FIELDS = ('source', 'key', 'genre_ids', 'category_ids')
+YEAR_PATTERN = re.compile(r'\b(19|20)\d\d\b')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS games ('
+    'id INTEGER PRIMARY KEY, source TEXT NOT NULL, key TEXT NOT NULL, appid INTEGER, name TEXT, '
+    'release_date TEXT, release_year INTEGER, age INTEGER, short_description TEXT, description TEXT, '
+    'website TEXT, header_image_uri TEXT, languages TEXT, version TEXT, torrent_size TEXT, extra TEXT, '
+    'updated_at REAL NOT NULL, UNIQUE (source, key))',
+    'CREATE INDEX IF NOT EXISTS games_appid ON games (appid)',
+    'CREATE INDEX IF NOT EXISTS games_release_year ON games (release_year)',
+    'CREATE INDEX IF NOT EXISTS games_name ON games (name COLLATE NOCASE)',
+    # жанры и категории: имя хранится один раз, связь с игрой - пара id
+    'CREATE TABLE IF NOT EXISTS terms (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, '
+    'UNIQUE (kind, name))',
+    'CREATE TABLE IF NOT EXISTS game_terms (term_id INTEGER NOT NULL, game_id INTEGER NOT NULL, '
+    'PRIMARY KEY (term_id, game_id)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS game_terms_game ON game_terms (game_id)',
+    'CREATE TABLE IF NOT EXISTS companies (game_id INTEGER NOT NULL, role TEXT NOT NULL, name TEXT NOT NULL, '
+    'position INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS companies_name ON companies (name COLLATE NOCASE, role)',
+    'CREATE INDEX IF NOT EXISTS companies_game ON companies (game_id)',
+    'CREATE TABLE IF NOT EXISTS screenshots (game_id INTEGER NOT NULL, position INTEGER NOT NULL, '
+    'thumbnail TEXT, full TEXT NOT NULL, PRIMARY KEY (game_id, position)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS requirements (game_id INTEGER NOT NULL, level TEXT NOT NULL, '
+    'property TEXT NOT NULL, value TEXT, position INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS requirements_game ON requirements (game_id)',
+    # цена в отдельной таблице: обновление цен (price_refresh.py) не трогает остальные поля игры.
+    # Строка с currency NULL - игра бесплатная или без цены в регионе
+    'CREATE TABLE IF NOT EXISTS prices (game_id INTEGER PRIMARY KEY, currency TEXT, initial INTEGER, '
+    'final INTEGER, discount_percent INTEGER, updated_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS prices_discount ON prices (discount_percent)',
+)
+
+
+def release_year(date: str):
+    match = YEAR_PATTERN.search(date or '')
+    return int(match[0]) if match is not None else None
+
+
+def normalize_steam(record: dict):
+    # SteamGame.to_dict(): {'appid': ..., **данные игры}
+    game = dict(record)
+    game['key'] = str(game['appid'])
+    game['appid'] = int(game['appid'])
+    game['description'] = game.pop('long_description', None)
+    game['release_year'] = release_year(game.get('release_date'))
+    game['screenshots'] = [(screenshot.get('path_thumbnail'), screenshot['path_full'])
+                           for screenshot in game.get('screenshots', [])]
+    game['requirements'] = [(level, prop, value) for level, fields in game.get('requirements', {}).items()
+                            for prop, value in fields.items()]
+    game.pop('success', None)
+    # на странице магазина нет цены, видео и сайта игры, в хранилище остаются значения из appdetails
+    if game.get('channel') == 'store_page':
+        for field in STORE_PAGE_UNKNOWN:
+            game.pop(field, None)
+    return game
+
+
+def normalize_byrutor(record: dict):
+    # ByrutorGame.to_dict(), ключ - адрес страницы, appid появится после сопоставления со Steam
+    game = dict(record)
+    game['key'] = game.pop('uri')
+    game['appid'] = None
+    if game.get('release_year', -1) == -1:
+        game['release_year'] = release_year(game.get('release_date'))
+    developers = game.get('developers')
+    game['developers'] = [developers] if isinstance(developers, str) and developers != '' else developers or []
+    game['screenshots'] = [(None, url) for url in game.get('screenshots', [])]
+    game['requirements'] = [('', field['property'], field['value']) for field in game.get('requirements', [])]
+    game.pop('success', None)
+    return game
+
+
+NORMALIZERS = {'steam': normalize_steam, 'byrutor': normalize_byrutor}
+
+
+class GameStore:
+    # Хранилище разобранных игр обоих источников в SQLite с индексами по appid, жанрам, категориям,
+    # разработчикам и году выхода. Записи копятся в памяти и пишутся пачкой в одной транзакции,
+    # повторная запись той же игры (source, key) заменяет прежнюю, кроме полей, которых в ней нет.
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+        self.flush_seconds = 0.0
+
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA foreign_keys=OFF')
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        self.term_ids = {(kind, name): term_id
+                         for term_id, kind, name in self.connection.execute('SELECT id, kind, name FROM terms')}
+
+    def add(self, source: str, record: dict):
+        if source not in NORMALIZERS:
+            raise ValueError(f'Unknown source: {source}, expected one of {SOURCES}')
+
+        self.pending.append(NORMALIZERS[source](record) | {'source': source})
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+
+        started_at = time.perf_counter()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            for game in self.pending:
+                self._upsert(game)
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            # id справочника из откатившейся транзакции больше не действительны
+            self.term_ids = {(kind, name): term_id
+                             for term_id, kind, name in self.connection.execute('SELECT id, kind, name FROM terms')}
+            raise
+
+        self.written += len(self.pending)
+        self.pending.clear()
+        self.flush_seconds += time.perf_counter() - started_at
+
+    def _term_id(self, kind: str, name: str):
+        term_id = self.term_ids.get((kind, name))
+        if term_id is None:
+            self.connection.execute('INSERT OR IGNORE INTO terms (kind, name) VALUES (?, ?)', (kind, name))
+            term_id = self.connection.execute('SELECT id FROM terms WHERE kind = ? AND name = ?',
+                                              (kind, name)).fetchone()[0]
+            self.term_ids[(kind, name)] = term_id
+        return term_id
+
+    def _upsert(self, game: dict):
+        values = [game.get(column) for column in GAME_COLUMNS]
+        extra = {name: value for name, value in game.items()
+                 if name not in GAME_COLUMNS and name not in CHILD_FIELDS and name not in SKIPPED_FIELDS}
+        # колонки, которых нет в записи, остаются прежними, а extra неполной записи дополняет прежний
+        updated = tuple(column for column in GAME_COLUMNS if column in game) + ('extra', 'updated_at')
+        updates = ', '.join(f'{column} = excluded.{column}' for column in updated)
+        if game.get('channel') == 'store_page':
+            row = self.connection.execute('SELECT extra FROM games WHERE source = ? AND key = ?',
+                                          (game['source'], game['key'])).fetchone()
+            if row is not None:
+                extra = {**json.loads(row[0] or '{}'), **extra}
+
+        game_id = self.connection.execute(
+            f'INSERT INTO games (source, key, {", ".join(GAME_COLUMNS)}, extra, updated_at) '
+            f'VALUES ({", ".join("?" * (len(GAME_COLUMNS) + 4))}) '
+            f'ON CONFLICT (source, key) DO UPDATE SET {updates} RETURNING id',
+            (game['source'], game['key'], *values, json.dumps(extra, ensure_ascii=False), time.time())).fetchone()[0]
+
+        # дочерние строки проще переписать целиком, чем сравнивать со старыми
+        for table in ('game_terms', 'companies', 'screenshots', 'requirements'):
+            self.connection.execute(f'DELETE FROM {table} WHERE game_id = ?', (game_id,))
+        if 'price' in game:
+            self._put_price(game_id, game['price'], time.time())
+
+        self.connection.executemany('INSERT OR IGNORE INTO game_terms (term_id, game_id) VALUES (?, ?)',
+                                    [(self._term_id(kind, name), game_id)
+                                     for kind in ('genres', 'categories') for name in game.get(kind, [])])
+        self.connection.executemany('INSERT INTO companies (game_id, role, name, position) VALUES (?, ?, ?, ?)',
+                                    [(game_id, role, name, position)
+                                     for role in ('developers', 'publishers')
+                                     for position, name in enumerate(game.get(role, []))])
+        self.connection.executemany('INSERT INTO screenshots (game_id, position, thumbnail, full) VALUES (?, ?, ?, ?)',
+                                    [(game_id, position, thumbnail, full)
+                                     for position, (thumbnail, full) in enumerate(game['screenshots'])])
+        self.connection.executemany('INSERT INTO requirements (game_id, level, property, value, position) '
+                                    'VALUES (?, ?, ?, ?, ?)',
+                                    [(game_id, level, prop, value, position)
+                                     for position, (level, prop, value) in enumerate(game['requirements'])])
+
+    def _put_price(self, game_id: int, price: dict, updated_at: float):
+        price = price or {}
+        self.connection.execute('INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?)',
+                                (game_id, *(price.get(column) for column in PRICE_COLUMNS), updated_at))
+
+    def update_prices(self, prices: list):
+        # [(appid, цена или None)] одной транзакцией; игры, которых нет в хранилище, пропускаются
+        now = time.time()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            before = self.connection.total_changes
+            self.connection.executemany("INSERT OR REPLACE INTO prices SELECT id, ?, ?, ?, ?, ? FROM games "
+                                        "WHERE source = 'steam' AND key = ?",
+                                        [(*((price or {}).get(column) for column in PRICE_COLUMNS), now, str(appid))
+                                         for appid, price in prices])
+            updated = self.connection.total_changes - before
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return updated
+
+    def steam_appids(self):
+        return [int(key) for key, in self.connection.execute("SELECT key FROM games WHERE source = 'steam' "
+                                                               "ORDER BY appid")]
+
+    def _games(self, where: str, params: tuple, limit: int = None):
+        query = f'SELECT * FROM games WHERE {where} ORDER BY id'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+
+        cursor = self.connection.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        return [self._load_game(dict(zip(columns, row))) for row in cursor.fetchall()]
+
+    def _load_game(self, row: dict):
+        game_id = row.pop('id')
+        game = {**row, **json.loads(row.pop('extra') or '{}')}
+        game.pop('updated_at')
+
+        game['genres'], game['categories'] = [], []
+        for kind, name in self.connection.execute('SELECT terms.kind, terms.name FROM game_terms '
+                                                  'JOIN terms ON terms.id = game_terms.term_id '
+                                                  'WHERE game_terms.game_id = ? ORDER BY terms.id', (game_id,)):
+            game[kind].append(name)
+
+        game['developers'], game['publishers'] = [], []
+        for role, name in self.connection.execute('SELECT role, name FROM companies WHERE game_id = ? '
+                                                  'ORDER BY role, position', (game_id,)):
+            game[role].append(name)
+
+        game['screenshots'] = [{'path_thumbnail': thumbnail, 'path_full': full} for thumbnail, full in
+                               self.connection.execute('SELECT thumbnail, full FROM screenshots WHERE game_id = ? '
+                                                       'ORDER BY position', (game_id,))]
+        game['requirements'] = [{'level': level, 'property': prop, 'value': value} for level, prop, value in
+                                self.connection.execute('SELECT level, property, value FROM requirements '
+                                                        'WHERE game_id = ? ORDER BY position', (game_id,))]
+        price = self.connection.execute(f'SELECT {", ".join(PRICE_COLUMNS)} FROM prices WHERE game_id = ?',
+                                        (game_id,)).fetchone()
+        if price is not None:
+            game['price'] = dict(zip(PRICE_COLUMNS, price)) if price[0] is not None else None
+        return game
+
+    def get(self, source: str, key):
+        games = self._games('source = ? AND key = ?', (source, str(key)))
+        return games[0] if len(games) > 0 else None
+
+    def get_by_appid(self, appid: int):
+        return self._games('appid = ?', (int(appid),))
+
+    def find_by_term(self, kind: str, name: str, source: str = None, limit: int = None):
+        # поиск идёт по первичному ключу game_terms (term_id, game_id), без просмотра всех игр
+        where = 'id IN (SELECT game_id FROM game_terms WHERE term_id = ' \
+                '(SELECT id FROM terms WHERE kind = ? AND name = ?))'
+        params = (kind, name)
+        if source is not None:
+            where += ' AND source = ?'
+            params += (source,)
+        return self._games(where, params, limit)
+
+    def find_by_genre(self, name: str, source: str = None, limit: int = None):
+        return self.find_by_term('genres', name, source, limit)
+
+    def find_by_category(self, name: str, source: str = None, limit: int = None):
+        return self.find_by_term('categories', name, source, limit)
+
+    def find_by_developer(self, name: str, source: str = None, limit: int = None):
+        where = 'id IN (SELECT game_id FROM companies WHERE name = ? COLLATE NOCASE AND role = ?)'
+        params = (name, 'developers')
+        if source is not None:
+            where += ' AND source = ?'
+            params += (source,)
+        return self._games(where, params, limit)
+
+    def find_by_year(self, year: int, source: str = None, limit: int = None):
+        where = 'release_year = ?'
+        params = (year,)
+        if source is not None:
+            where += ' AND source = ?'
+            params += (source,)
+        return self._games(where, params, limit)
+
+    def count(self, source: str = None):
+        if source is None:
+            return self.connection.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+        return self.connection.execute('SELECT COUNT(*) FROM games WHERE source = ?', (source,)).fetchone()[0]
+
+    def summary(self):
+        return f'game store: written: {self.written}, pending: {len(self.pending)}, ' \
+               f'flush time: {self.flush_seconds:.2f}s'
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+        logging.info(self.summary())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the game store',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('path', type=str, help='Path to the SQLite file written with --store')
+    parser.add_argument('--source', type=str, choices=SOURCES, help='Only games of this source')
+    parser.add_argument('--appid', type=int, help='Games with this Steam appid')
+    parser.add_argument('--genre', type=str, help='Games of this genre')
+    parser.add_argument('--category', type=str, help='Games of this category')
+    parser.add_argument('--developer', type=str, help='Games of this developer')
+    parser.add_argument('--year', type=int, help='Games released this year')
+    parser.add_argument('--limit', type=int, default=20, help='Max amount of printed games')
+    args = parser.parse_args()
+
+    store = GameStore(args.path)
+    if args.appid is not None:
+        games = store.get_by_appid(args.appid)
+    elif args.genre is not None:
+        games = store.find_by_genre(args.genre, args.source, args.limit)
+    elif args.category is not None:
+        games = store.find_by_category(args.category, args.source, args.limit)
+    elif args.developer is not None:
+        games = store.find_by_developer(args.developer, args.source, args.limit)
+    elif args.year is not None:
+        games = store.find_by_year(args.year, args.source, args.limit)
+    else:
+        games = []
+        print(f'games: {store.count(args.source)}')
+
+    for game in games:
+        print(json.dumps(game, ensure_ascii=False))
+    store.connection.close()
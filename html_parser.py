@@ -0,0 +1,57 @@
+import os
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+
+BACKENDS = ('lxml', 'html.parser')
+BACKEND_CHOICES = ('auto',) + BACKENDS
+# через переменную окружения выбранный парсер доходит и до процессов пула разбора
+BACKEND_ENV = 'PARSER_STEAM_GAMES_HTML_BACKEND'
+
+SOURCE_TAG_PATTERN = re.compile(r'<source\b[^>]*>', re.IGNORECASE)
+
+
+def available_backends():
+    return [backend for backend in BACKENDS if backend != 'lxml' or lxml is not None]
+
+
+def set_backend(backend: str):
+    if backend == 'auto':
+        backend = 'lxml' if lxml is not None else 'html.parser'
+
+    if backend not in available_backends():
+        raise ValueError(f'HTML parser backend is not available: {backend}')
+
+    os.environ[BACKEND_ENV] = backend
+    return backend
+
+
+def get_backend():
+    return os.environ.get(BACKEND_ENV, 'html.parser')
+
+
+def make_soup(html: str, parse_only: SoupStrainer = None, backend: str = None):
+    return BeautifulSoup(html, backend or get_backend(), parse_only=parse_only)
+
+
+def class_strainer(*classes: str):
+    # оставляет только поддеревья элементов с одним из классов, остальная страница в дерево не попадает.
+    # Регулярка нужна, потому что при разборе class сравнивается целой строкой, например "tech_details clearfix"
+    pattern = re.compile(r'(?:^|\s)(?:' + '|'.join(re.escape(name) for name in classes) + r')(?:\s|$)')
+    return SoupStrainer(attrs={'class': pattern})
+
+
+def tag_strainer(name: str, **attrs):
+    return SoupStrainer(name, **attrs)
+
+
+def find_source_tags(html: str, backend: str = None):
+    # <source> не привязаны к классу, поэтому вместо разбора всей страницы вырезаются только сами теги
+    snippet = ''.join(SOURCE_TAG_PATTERN.findall(html))
+    return make_soup(snippet, tag_strainer('source'), backend)
@@ -0,0 +1,284 @@
+import asyncio
+import codecs
+import logging
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from metrics import SIZE_BUCKETS, get_metrics, status_class
+
+
+# headers for every request, host specific headers are merged on top of them
+DEFAULT_HEADERS = {'Accept-Language': 'en-US'}
+HOST_HEADERS = {
+    'thebyrut.org': {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                                   '(KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'},
+}
+
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
+REQUEST_TIMEOUT = 10
+# для перцентилей хранятся времена только последних запросов
+LATENCY_WINDOW = 10000
+
+DNS_SECONDS = get_metrics().histogram('scraper_dns_seconds', 'Time of DNS resolution')
+CONNECT_SECONDS = get_metrics().histogram('scraper_connect_seconds', 'Time of opening a new connection')
+REQUEST_SECONDS = get_metrics().histogram('scraper_request_seconds', 'Time of http requests by host and status class')
+RESPONSE_BYTES = get_metrics().histogram('scraper_response_bytes', 'Size of response bodies by host', SIZE_BUCKETS)
+CACHE_RESPONSES = get_metrics().counter('scraper_cache_responses_total', 'Responses taken from the cache by host')
+
+
+class HttpResponse:
+    __slots__ = ('url', 'status', 'headers', 'text')
+
+    def __init__(self, url: str, status: int, headers, text: str):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.text = text
+
+
+class PoolStats:
+    def __init__(self):
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def connection_hit_rate(self):
+        total = self.connections_created + self.connections_reused
+        return self.connections_reused / total if total else 0.0
+
+    def dns_hit_rate(self):
+        total = self.dns_hits + self.dns_misses
+        return self.dns_hits / total if total else 0.0
+
+    def latency_percentile(self, q: float):
+        if len(self.latencies) == 0:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def summary(self):
+        return (f'requests: {self.requests}, '
+                f'connections created: {self.connections_created}, reused: {self.connections_reused} '
+                f'(hit rate {self.connection_hit_rate():.1%}), '
+                f'dns hits: {self.dns_hits}, misses: {self.dns_misses} (hit rate {self.dns_hit_rate():.1%}), '
+                f'latency p50: {self.latency_percentile(0.5) * 1000:.1f}ms, '
+                f'p99: {self.latency_percentile(0.99) * 1000:.1f}ms')
+
+
+class HttpClient:
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, dns_ttl: int = 300,
+                 keepalive_timeout: float = 30, timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT,
+                 trust_env: bool = True, cache=None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.trust_env = trust_env
+        self.cache = cache
+        self.stats = PoolStats()
+        self._session = None
+        self._route_sessions = {}
+
+    def _trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_start(session, context, params):
+            context.connect_started_at = time.perf_counter()
+
+        async def on_connection_create_end(session, context, params):
+            self.stats.connections_created += 1
+            CONNECT_SECONDS.observe(time.perf_counter() - context.connect_started_at)
+
+        async def on_connection_reuseconn(session, context, params):
+            self.stats.connections_reused += 1
+
+        async def on_dns_cache_hit(session, context, params):
+            self.stats.dns_hits += 1
+
+        async def on_dns_cache_miss(session, context, params):
+            self.stats.dns_misses += 1
+
+        async def on_dns_resolvehost_start(session, context, params):
+            context.dns_started_at = time.perf_counter()
+
+        async def on_dns_resolvehost_end(session, context, params):
+            DNS_SECONDS.observe(time.perf_counter() - context.dns_started_at)
+
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        return trace_config
+
+    def _new_session(self, trust_env: bool, local_address: str = None):
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                         ttl_dns_cache=self.dns_ttl, use_dns_cache=True,
+                                         keepalive_timeout=self.keepalive_timeout,
+                                         local_addr=(local_address, 0) if local_address is not None else None)
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout, trust_env=trust_env,
+                                     trace_configs=[self._trace_config()])
+
+    @property
+    def session(self):
+        # сессия создаётся лениво, потому что ей нужен запущенный event loop
+        if self._session is None or self._session.closed:
+            self._session = self._new_session(self.trust_env)
+        return self._session
+
+    def route_session(self, route):
+        # у каждого маршрута свои соединения; прокси из окружения не используется, маршрут задан явно
+        session = self._route_sessions.get(route.name)
+        if session is None or session.closed:
+            session = self._new_session(False, route.local_address)
+            self._route_sessions[route.name] = session
+        return session
+
+    @staticmethod
+    def build_headers(url: str, headers: dict = None):
+        result = dict(DEFAULT_HEADERS)
+        result.update(HOST_HEADERS.get(urlsplit(url).hostname or '', {}))
+        if headers:
+            result.update(headers)
+        return result
+
+    def cached_response(self, url: str, headers: dict = None):
+        # свежий ответ из кэша без обращения к сети, иначе None
+        if self.cache is None:
+            return None
+
+        entry = self.cache.get(self.cache.make_key(url, self.build_headers(url, headers)))
+        if entry is None or not self.cache.is_fresh(entry):
+            return None
+
+        self.cache.record_hit(entry)
+        CACHE_RESPONSES.inc(host=urlsplit(url).hostname or '', state='fresh')
+        return HttpResponse(url, entry.status, entry.headers, entry.text)
+
+    async def fetch(self, url: str, headers: dict = None, allow_redirects: bool = True,
+                    timeout: float = REQUEST_TIMEOUT, egress=None):
+        # egress - egress_pool.EgressPool канала запросов: маршруты со своими ограничителями, None - прямой запрос
+        request_headers = self.build_headers(url, headers)
+        host = urlsplit(url).hostname or ''
+        entry = None
+        cache_key = None
+
+        if self.cache is not None:
+            cache_key = self.cache.make_key(url, request_headers)
+            entry = self.cache.get(cache_key)
+
+            if entry is not None:
+                if self.cache.is_fresh(entry):
+                    self.cache.record_hit(entry)
+                    CACHE_RESPONSES.inc(host=host, state='fresh')
+                    return HttpResponse(url, entry.status, entry.headers, entry.text)
+
+                request_headers.update(entry.conditional_headers())
+
+        if egress is None:
+            return await self._send(url, request_headers, allow_redirects, timeout, entry, cache_key)
+
+        # ответ 429/503 или ошибка соединения на одном маршруте - запрос повторяется по другому,
+        # вызывающий код видит их, только если не прошло ни по одному
+        for attempt in range(len(egress)):
+            last = attempt == len(egress) - 1
+            route, issued_at = await egress.take()
+            try:
+                result = await self._send(url, request_headers, allow_redirects, timeout, entry, cache_key, route)
+            except BaseException as e:
+                # отмена тоже освобождает маршрут, on_error не считает её ошибкой маршрута
+                if not egress.on_error(route, e) or last:
+                    raise
+                continue
+            if not egress.on_response(route, result.status, result.headers, issued_at) or last:
+                return result
+
+    async def _send(self, url: str, request_headers: dict, allow_redirects: bool, timeout: float, entry, cache_key,
+                    route=None):
+        host = urlsplit(url).hostname or ''
+        session = self.session if route is None else self.route_session(route)
+        self.stats.requests += 1
+        started_at = time.perf_counter()
+        try:
+            async with session.get(url, headers=request_headers, allow_redirects=allow_redirects, timeout=timeout,
+                                   proxy=route.proxy if route is not None else None) as response:
+                if response.status == 304 and entry is not None:
+                    self.cache.record_revalidated(entry)
+                    CACHE_RESPONSES.inc(host=host, state='revalidated')
+                    result = HttpResponse(url, entry.status, entry.headers, entry.text)
+                else:
+                    body = await response.read()
+                    RESPONSE_BYTES.observe(len(body), host=host)
+                    text = await response.text()
+
+                    if self.cache is not None and response.status == 200:
+                        self.cache.put(cache_key, url, response.status, response.headers, text)
+
+                    result = HttpResponse(url, response.status, response.headers, text)
+        except Exception:
+            REQUEST_SECONDS.observe(time.perf_counter() - started_at, host=host, status='error')
+            raise
+
+        elapsed = time.perf_counter() - started_at
+        self.stats.latencies.append(elapsed)
+        REQUEST_SECONDS.observe(elapsed, host=host, status=status_class(response.status))
+        return result
+
+    async def stream(self, url: str, headers: dict = None, chunk_size: int = 64 * 1024):
+        # тело ответа отдаётся декодированными кусками по мере загрузки, без кэша и без общего таймаута
+        self.stats.requests += 1
+        async with self.session.get(url, headers=self.build_headers(url, headers)) as response:
+            response.raise_for_status()
+            decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield decoder.decode(chunk)
+
+            yield decoder.decode(b'', final=True)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        for session in self._route_sessions.values():
+            if not session.closed:
+                await session.close()
+        self._route_sessions.clear()
+
+
+_client = None
+
+
+def get_client():
+    global _client
+
+    if _client is None:
+        _client = HttpClient()
+
+    return _client
+
+
+async def close_client():
+    global _client
+
+    if _client is None:
+        return
+
+    logging.info(f'HTTP pool stats: {_client.stats.summary()}')
+    if _client.cache is not None:
+        logging.info(f'HTTP cache stats: {_client.cache.summary()}')
+        _client.cache.close()
+
+    await _client.close()
+    # даём время закрыться TLS соединениям
+    await asyncio.sleep(0.25)
+    _client = None
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import os
+from bisect import bisect_left
+
+from aiohttp import web
+
+
+# секунды: от DNS и соединения до разбора больших страниц
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2)
+
+
+def status_class(status: int):
+    return f'{status // 100}xx'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple, extra: str = ''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        return [f'{self.name}{_format_labels(key)} {_format_number(value)}' for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: tuple = TIME_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # по набору меток: счётчики по корзинам (последняя - +Inf), сумма и количество
+        self.values = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{_format_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {_format_number(total)}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    # Счётчики и гистограммы по стадиям обхода в текстовом формате Prometheus.
+    # Метрики создаются при первом обращении, повторный вызов с тем же именем отдаёт ту же метрику.
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, cls, name: str, description: str, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, description, *args)
+        return metric
+
+    def counter(self, name: str, description: str):
+        return self._get(Counter, name, description)
+
+    def gauge(self, name: str, description: str):
+        return self._get(Gauge, name, description)
+
+    def histogram(self, name: str, description: str, buckets: tuple = TIME_BUCKETS):
+        return self._get(Histogram, name, description, buckets)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        # файл подменяется целиком, читатель не увидит его наполовину записанным
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(path + '.tmp', path)
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    return _registry
+
+
+async def write_metrics_periodically(path: str, interval: float):
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            _registry.write(path)
+    finally:
+        # последний снимок пишется и при остановке обхода
+        _registry.write(path)
+
+
+async def start_metrics_server(host: str, port: int):
+    async def handle_metrics(request: web.Request):
+        return web.Response(text=_registry.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f'Metrics are served at http://{host}:{port}/metrics')
+    return runner
@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+
+from aiohttp import ClientSession, web
+
+
+# Локальная замена store.steampowered.com и thebyrut.org для проверки скрейперов без сети.
+# Сервер отдаёт 429 с Retry-After, если клиент превышает заданную скорость,
+# а также может добавлять задержку и случайные 500 к каждому ответу.
+# Скорость, как у Steam, считается по адресу клиента; с --proxy-ports рядом поднимаются простые http прокси,
+# каждый из них для сервера - отдельный адрес (X-Forwarded-For), на них проверяется egress_pool.py.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BYRUTOR_LINK_PATTERN = re.compile(r'https://thebyrut\.org/\d+-game-(\d+)\.html')
+BYRUTOR_PAGES_PATTERN = re.compile(r'<div class="pages">.*?</div>', re.DOTALL)
+# на соседних страницах списка byrutor повторяется столько игр, чтобы скрейперу было что отсеивать
+BYRUTOR_PAGE_OVERLAP = 2
+# заголовки одного соединения, прокси их не пересылает
+HOP_HEADERS = ('connection', 'keep-alive', 'proxy-authorization', 'proxy-connection', 'te', 'trailer',
+               'transfer-encoding', 'upgrade', 'host')
+
+
+class ServerThrottle:
+    # token bucket на каждый адрес клиента
+    def __init__(self, rate: float, burst: float, retry_after: float):
+        self.rate = rate
+        self.burst = burst
+        self.retry_after = retry_after
+        # адрес -> [токены, время обновления]
+        self.buckets = {}
+        self.accepted = 0
+        self.rejected = 0
+
+    def allow(self, client: str = ''):
+        if self.rate <= 0:
+            self.accepted += 1
+            return True
+
+        now = time.monotonic()
+        bucket = self.buckets.setdefault(client, [self.burst, now])
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.accepted += 1
+            return True
+
+        self.rejected += 1
+        return False
+
+
+def client_address(request: web.Request):
+    return request.headers.get('X-Forwarded-For', request.remote)
+
+
+def fake_price(appid: int):
+    # скидка меняется раз в час, чтобы обновлению цен было что обновлять
+    discount = (appid + int(time.time() // 3600)) % 4 * 25
+    initial = 499 + appid % 10 * 500
+    return {'currency': 'USD', 'initial': initial, 'final': initial * (100 - discount) // 100,
+            'discount_percent': discount, 'initial_formatted': '', 'final_formatted': ''}
+
+
+def fake_app_details(appid: int):
+    # каждое пятое приложение не игра, каждое седьмое ещё не вышло, у каждого одиннадцатого возрастное ограничение
+    app_type = 'dlc' if appid % 5 == 0 else 'game'
+    return {str(appid): {'success': True, 'data': {
+        'type': app_type,
+        'name': f'Game {appid}',
+        'steam_appid': appid,
+        'required_age': 18 if appid % 11 == 0 else 0,
+        'short_description': f'Short description of game {appid}',
+        'supported_languages': 'English, Russian',
+        'developers': [f'Developer {appid % 13}'],
+        'publishers': [f'Publisher {appid % 7}'],
+        'website': '',
+        'header_image': f'https://cdn.example/{appid}/header.jpg',
+        'screenshots': [{'id': 0, 'path_thumbnail': f'https://cdn.example/{appid}/0.jpg',
+                         'path_full': f'https://cdn.example/{appid}/0_full.jpg'}],
+        'about_the_game': f'<p>About game {appid}</p>',
+        'release_date': {'coming_soon': appid % 7 == 0, 'date': '1 Jan, 2020'},
+        'genres': [{'id': '1', 'description': 'Action'}, {'id': str(appid % 4 + 2), 'description': f'Genre {appid % 4}'}],
+        'categories': [{'id': 2, 'description': 'Single-player'}],
+        'movies': [],
+        'is_free': appid % 6 == 1,
+        **({} if appid % 6 == 1 else {'price_overview': fake_price(appid)}),
+        'pc_requirements': {'minimum': '<strong>Minimum:</strong><br><ul class="bb_ul">'
+                                       '<li><strong>OS:</strong> Windows 10<br></li>'
+                                       '<li><strong>Memory:</strong> 4 GB RAM</li></ul>'},
+    }}}
+
+
+def fake_app_page(appid: int):
+    # страница магазина с теми же данными, что и fake_app_details, в разметке store.steampowered.com/app/
+    data = fake_app_details(appid)[str(appid)]['data']
+    if data['required_age'] > 0:
+        # без cookie с датой рождения Steam показывает возрастной фильтр вместо страницы
+        return (f'<!DOCTYPE html><html><head><title>Site Error</title></head><body class="v6 agecheck">'
+                f'<div id="app_agegate" class="agegate_age_validation"><h2>{data["name"]}</h2>'
+                f'<div class="agegate_birthday_selector"><select name="ageYear"></select></div></div></body></html>')
+    bubble = ''
+    if data['type'] != 'game':
+        bubble = '<div class="game_area_dlc_bubble game_area_bubble"><h1>Downloadable Content</h1></div>'
+    elif data['release_date']['coming_soon']:
+        bubble = '<div class="game_area_comingsoon game_area_bubble"><h1>Coming soon</h1></div>'
+    screenshots = ''.join(f'<a class="highlight_screenshot_link" href="{screenshot["path_full"]}">'
+                          f'<img src="{screenshot["path_thumbnail"]}"></a>' for screenshot in data['screenshots'])
+    genres = ', '.join(f'<a href="/genre/{genre["description"]}/">{genre["description"]}</a>'
+                       for genre in data['genres'])
+    categories = ''.join(f'<a class="game_area_details_specs_ctn"><div class="label">{category["description"]}'
+                         f'</div></a>' for category in data['categories'])
+    languages = ''.join(f'<tr><td class="ellipsis">{language.strip()}</td></tr>'
+                        for language in data['supported_languages'].split(','))
+    return (f'<!DOCTYPE html><html><head><title>{data["name"]} on Steam</title></head><body class="v6 app game_bg">'
+            f'<div class="apphub_HomeHeaderContent"><div id="appHubAppName" class="apphub_AppName">'
+            f'{data["name"]}</div></div>{bubble}<img class="game_header_image_full" src="{data["header_image"]}">'
+            f'<div class="game_description_snippet">{data["short_description"]}</div>'
+            f'<div class="release_date"><div class="subtitle column">Release Date:</div>'
+            f'<div class="date">{data["release_date"]["date"]}</div></div>'
+            f'<div class="highlight_ctn">{screenshots}</div>'
+            f'<div id="game_area_description" class="game_area_description"><h2>About This Game</h2>'
+            f'{data["about_the_game"]}</div>'
+            f'<div class="details_block"><b>Title:</b> {data["name"]}<br><b>Genre:</b> <span>{genres}</span><br>'
+            f'<div class="dev_row"><b>Developer:</b> <a href="/developer/">{data["developers"][0]}</a></div>'
+            f'<div class="dev_row"><b>Publisher:</b> <a href="/publisher/">{data["publishers"][0]}</a></div></div>'
+            f'<div class="game_area_features_list_ctn">{categories}</div>'
+            f'<table id="languageTable">{languages}</table>'
+            f'<div class="game_area_sys_req sysreq_content active" data-os="win"><div class="game_area_sys_req_full">'
+            f'{data["pc_requirements"]["minimum"]}</div></div></body></html>')
+
+
+def read_fixture(*path):
+    with open(os.path.join(FIXTURES_DIR, *path), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def recorded_app_details(appid: int):
+    # записанные ответы Steam из fixtures/steam, для остальных appid ответ генерируется
+    path = os.path.join(FIXTURES_DIR, 'steam', f'appdetails_{appid}.json')
+    if not os.path.exists(path):
+        return fake_app_details(appid)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def byrutor_listing(html: str, base_url: str, page: int, pages: int):
+    per_page = len(BYRUTOR_LINK_PATTERN.findall(html))
+    first_game = (page - 1) * (per_page - BYRUTOR_PAGE_OVERLAP)
+
+    def game_link(match):
+        game = first_game + int(match.group(1))
+        return f'{base_url}/{game}-game-{game}.html'
+
+    html = BYRUTOR_LINK_PATTERN.sub(game_link, html)
+    pager = f'<div class="pages"><span>{page}</span> <a href="{base_url}/page/{pages}/">{pages}</a></div>'
+    return BYRUTOR_PAGES_PATTERN.sub(pager, html)
+
+
+def fake_app_list(apps: int):
+    # у каждого одиннадцатого приложения пустое имя, как у части записей в настоящем GetAppList
+    return {'applist': {'apps': [{'appid': appid, 'name': f'Game {appid}' if appid % 11 != 0 else ''}
+                                 for appid in range(1, apps + 1)]}}
+
+
+def create_app(rate: float = 1.0, burst: float = 5.0, retry_after: float = 2.0, apps: int = 1000,
+               latency: float = 0.0, error_rate: float = 0.0, pages: int = 10, seed: int = None,
+               page_rate: float = 0.0):
+    throttle = ServerThrottle(rate, burst, retry_after)
+    # страницы игр у Steam ограничиваются отдельно от api/appdetails
+    page_throttle = ServerThrottle(page_rate, burst, retry_after)
+    randomizer = random.Random(seed)
+    counters = {'errors': 0}
+
+    listing_html = read_fixture('byrutor', 'listing_page.html')
+    game_pages = [read_fixture('byrutor', 'game_page.html'), read_fixture('byrutor', 'game_page_minimal.html')]
+    store_html = read_fixture('steam', 'store_page.html')
+    app_html = read_fixture('steam', 'app_page.html')
+
+    @web.middleware
+    async def simulate_network(request: web.Request, handler):
+        if request.path == '/stats':
+            return await handler(request)
+
+        # задержка равномерная от 0 до 2 * latency, в среднем latency
+        if latency > 0:
+            await asyncio.sleep(randomizer.uniform(0, 2 * latency))
+
+        if randomizer.random() < error_rate:
+            counters['errors'] += 1
+            return web.Response(status=500, text='Simulated error')
+
+        return await handler(request)
+
+    app = web.Application(middlewares=[simulate_network])
+    app['throttle'] = throttle
+
+    async def app_details(request: web.Request):
+        if not throttle.allow(client_address(request)):
+            return web.Response(status=429, headers={'Retry-After': str(throttle.retry_after)})
+
+        appids = request.query.get('appids', '')
+        response = {}
+        for appid in appids.split(','):
+            if appid.isdigit():
+                response.update(recorded_app_details(int(appid)))
+
+        # как у Steam: с filters в data только запрошенные поля, а если их нет - пустой список
+        filters = request.query.get('filters')
+        if filters is not None:
+            for details in response.values():
+                if details.get('success'):
+                    data = {name: details['data'][name] for name in filters.split(',') if name in details['data']}
+                    details['data'] = data if len(data) > 0 else []
+
+        text = json.dumps(response)
+        etag = '"' + hashlib.sha1(text.encode('utf-8')).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+
+        return web.Response(text=text, content_type='application/json', headers={'ETag': etag})
+
+    async def app_list(request: web.Request):
+        # отдаётся кусками, чтобы клиент разбирал список по мере загрузки
+        response = web.StreamResponse(headers={'Content-Type': 'application/json'})
+        await response.prepare(request)
+        text = json.dumps(fake_app_list(apps)).encode('utf-8')
+        for position in range(0, len(text), 4096):
+            await response.write(text[position:position + 4096])
+        await response.write_eof()
+        return response
+
+    async def store_page(request: web.Request):
+        return web.Response(text=store_html, content_type='text/html')
+
+    async def app_page(request: web.Request):
+        if not page_throttle.allow(client_address(request)):
+            return web.Response(status=429, headers={'Retry-After': str(page_throttle.retry_after)})
+
+        appid = request.match_info['appid']
+        if not appid.isdigit():
+            return web.Response(status=302, headers={'Location': '/'})
+        # записанная страница только у Portal 2, для остальных appid страница генерируется
+        return web.Response(text=app_html if appid == '620' else fake_app_page(int(appid)),
+                            content_type='text/html')
+
+    def byrutor_url(request: web.Request):
+        return f'{request.scheme}://{request.host}/byrutor'
+
+    async def byrutor_index(request: web.Request):
+        return web.Response(text=byrutor_listing(listing_html, byrutor_url(request), 1, pages), content_type='text/html')
+
+    async def byrutor_page(request: web.Request):
+        page = int(request.match_info['page'])
+        if page > pages:
+            return web.Response(status=404)
+
+        return web.Response(text=byrutor_listing(listing_html, byrutor_url(request), page, pages),
+                            content_type='text/html')
+
+    async def byrutor_game(request: web.Request):
+        game = int(request.match_info['game'])
+        return web.Response(text=game_pages[game % 2], content_type='text/html')
+
+    async def stats(request: web.Request):
+        return web.json_response({'clients': len(throttle.buckets),
+                                  'accepted': throttle.accepted, 'rejected': throttle.rejected,
+                                  'page_accepted': page_throttle.accepted, 'page_rejected': page_throttle.rejected,
+                                  'errors': counters['errors']})
+
+    app.router.add_get('/', store_page)
+    app.router.add_get('/app/{appid}', app_page)
+    app.router.add_get('/api/appdetails', app_details)
+    app.router.add_get('/ISteamApps/GetAppList/v2', app_list)
+    app.router.add_get('/byrutor/', byrutor_index)
+    app.router.add_get(r'/byrutor/page/{page:\d+}/', byrutor_page)
+    app.router.add_get(r'/byrutor/{game:\d+}-game-{name:\d+}.html', byrutor_game)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+def create_proxy(address: str):
+    # Http прокси для проверки маршрутов: запросы приходят в absolute-form (GET http://host/path),
+    # пересылаются как есть и помечаются адресом прокси в X-Forwarded-For
+    counters = {'forwarded': 0}
+
+    async def open_session(app: web.Application):
+        app['session'] = ClientSession(auto_decompress=False)
+
+    async def close_session(app: web.Application):
+        await app['session'].close()
+
+    async def forward(request: web.Request):
+        counters['forwarded'] += 1
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in HOP_HEADERS}
+        headers['X-Forwarded-For'] = address
+        async with request.app['session'].get(str(request.url), headers=headers, allow_redirects=False) as upstream:
+            body = await upstream.read()
+            return web.Response(status=upstream.status, body=body,
+                                headers={name: value for name, value in upstream.headers.items()
+                                         if name.lower() not in HOP_HEADERS and name.lower() != 'content-length'})
+
+    async def stats(request: web.Request):
+        return web.json_response({'address': address, 'forwarded': counters['forwarded']})
+
+    app = web.Application()
+    app.on_startup.append(open_session)
+    app.on_cleanup.append(close_session)
+    app.router.add_get('/proxy-stats', stats)
+    app.router.add_get('/{path:.*}', forward)
+    return app
+
+
+async def serve(host: str, port: int, app: web.Application, proxy_ports: list):
+    runners = []
+    try:
+        for server_port, server_app in [(port, app)] + [(proxy_port, create_proxy(f'10.0.0.{position + 1}'))
+                                                        for position, proxy_port in enumerate(proxy_ports)]:
+            runner = web.AppRunner(server_app)
+            await runner.setup()
+            await web.TCPSite(runner, host, server_port).start()
+            runners.append(runner)
+            print(f'Serving on http://{host}:{server_port}/')
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local Steam store stand-in',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--host', type=str, default='localhost')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--rate', type=float, default=1.0, help='Allowed requests per second, 0 disables throttling')
+    parser.add_argument('--burst', type=float, default=5.0, help='Requests allowed in a burst')
+    parser.add_argument('--retry-after', type=float, default=2.0, help='Value of the Retry-After header')
+    parser.add_argument('--apps', type=int, default=1000, help='Amount of apps in the GetAppList response')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean delay of every response in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of responses replaced by 500')
+    parser.add_argument('--pages', type=int, default=10, help='Amount of byrutor listing pages')
+    parser.add_argument('--seed', type=int, help='Seed of the simulated latency and errors')
+    parser.add_argument('--page-rate', type=float, default=0.0,
+                        help='Allowed store page requests per second, 0 disables throttling')
+    parser.add_argument('--proxy-ports', type=int, nargs='+', default=[],
+                        help='Also run stand-in http proxies on these ports, each one is a separate client address')
+    args = parser.parse_args()
+
+    mock_app = create_app(args.rate, args.burst, args.retry_after, args.apps, args.latency, args.error_rate,
+                          args.pages, args.seed, args.page_rate)
+    if len(args.proxy_ports) == 0:
+        web.run_app(mock_app, host=args.host, port=args.port)
+    else:
+        asyncio.run(serve(args.host, args.port, mock_app, args.proxy_ports))
@@ -0,0 +1,243 @@
+import argparse
+import glob
+import heapq
+import json
+import logging
+import os
+import pickle
+import re
+import time
+import unicodedata
+from array import array
+from collections import Counter
+from itertools import islice
+
+from app_list import read_apps_from_file
+from output_writer import read_records
+
+
+INDEX_VERSION = 3
+# сколько вхождений триграмм просматривается на запрос: редкие триграммы идут первыми,
+# частые («gam», «the») добавляются, только пока бюджет не исчерпан
+POSTINGS_BUDGET = 2000
+MIN_TRIGRAMS = 3
+RESCORE_CANDIDATES = 30
+
+SYMBOLS_PATTERN = re.compile(r'[™®©]')
+SEPARATORS_PATTERN = re.compile(r'[^\w]+')
+ROMAN_NUMERALS = {'ii': '2', 'iii': '3', 'iv': '4', 'v': '5', 'vi': '6', 'vii': '7', 'viii': '8', 'ix': '9', 'x': '10'}
+
+
+def normalize_name(name: str):
+    # «The Witcher® 3: Wild Hunt — GOTY» и «the witcher iii wild hunt goty» дают одну строку
+    name = SYMBOLS_PATTERN.sub('', name)
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char)).lower().replace('&', ' and ')
+    words = [ROMAN_NUMERALS.get(word, word) for word in SEPARATORS_PATTERN.sub(' ', name).split()]
+    return ' '.join(words)
+
+
+def trigrams(normalized: str):
+    padded = f'  {normalized} '
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+
+class NameIndex:
+    # Инвертированный индекс триграмм нормализованных имён GetAppList: по триграмме - номера имён в array('I').
+    # Кандидаты набираются по самым редким триграммам запроса, лучшие по числу общих триграмм
+    # пересчитываются точной мерой Дайса. Строится один раз по списку игр и сохраняется на диск.
+    def __init__(self):
+        self.appids = array('I')
+        self.names = []
+        self.exact = {}
+        self.postings = {}
+        # номера триграмм каждого имени подряд в одном array, имя doc - срез offsets[doc]:offsets[doc + 1].
+        # По ним мера Дайса считается пересечением множеств в C, без разбора строки кандидата
+        self.trigram_ids = {}
+        self.doc_trigrams = array('I')
+        self.offsets = array('I', [0])
+        self.source = None
+
+    @classmethod
+    def build(cls, apps):
+        index = cls()
+        postings = {}
+
+        for appid, name in apps:
+            if name == '':
+                continue
+
+            normalized = normalize_name(name)
+            if normalized == '':
+                continue
+
+            doc = len(index.appids)
+            index.appids.append(appid)
+            index.names.append(name)
+            index.exact.setdefault(normalized, []).append(doc)
+            for trigram in trigrams(normalized):
+                postings.setdefault(trigram, array('I')).append(doc)
+                index.doc_trigrams.append(index.trigram_ids.setdefault(trigram, len(index.trigram_ids)))
+            index.offsets.append(len(index.doc_trigrams))
+
+        # точные совпадения в том же порядке, что и нечёткие при равной уверенности: по возрастанию appid
+        for docs in index.exact.values():
+            docs.sort(key=index.appids.__getitem__)
+        index.postings = postings
+        return index
+
+    def __len__(self):
+        return len(self.appids)
+
+    def candidates(self, query_trigrams: set):
+        counts = Counter()
+        used = 0
+        spent = 0
+
+        for trigram in sorted(query_trigrams, key=lambda item: len(self.postings.get(item, ()))):
+            docs = self.postings.get(trigram)
+            if docs is None:
+                continue
+            if used >= MIN_TRIGRAMS and spent + len(docs) > POSTINGS_BUDGET:
+                break
+
+            counts.update(docs)
+            used += 1
+            spent += len(docs)
+
+        if len(counts) <= RESCORE_CANDIDATES:
+            return list(counts)
+        # почти все имена делят с запросом одну триграмму, сортируются только встреченные чаще.
+        # Порядок тот же, что у устойчивой сортировки всех: при равенстве - по порядку появления
+        best = sorted([doc for doc, count in counts.items() if count > 1], key=counts.__getitem__, reverse=True)
+        if len(best) < RESCORE_CANDIDATES:
+            best.extend(islice((doc for doc, count in counts.items() if count == 1), RESCORE_CANDIDATES - len(best)))
+        return best[:RESCORE_CANDIDATES]
+
+    def lookup(self, name: str, k: int = 5):
+        # [(appid, имя в Steam, уверенность от 0 до 1)], лучшие первыми
+        normalized = normalize_name(name)
+        if normalized == '':
+            return []
+
+        exact = self.exact.get(normalized, [])
+        if len(exact) >= k:
+            return [(self.appids[doc], self.names[doc], 1.0) for doc in exact[:k]]
+
+        query_trigrams = trigrams(normalized)
+        # триграмм, которых нет ни в одном имени, нет и в пересечении, но в мере Дайса они учитываются
+        query_ids = {self.trigram_ids[trigram] for trigram in query_trigrams if trigram in self.trigram_ids}
+        scored = {doc: 1.0 for doc in exact}
+        for doc in self.candidates(query_trigrams):
+            if doc not in scored:
+                start, end = self.offsets[doc], self.offsets[doc + 1]
+                common = len(query_ids.intersection(self.doc_trigrams[start:end]))
+                scored[doc] = 2 * common / (len(query_trigrams) + end - start)
+
+        # при равной уверенности выше приложение с меньшим appid: обычно это основная игра, а не DLC
+        best = heapq.nsmallest(k, scored.items(), key=lambda item: (-item[1], self.appids[item[0]]))
+        return [(self.appids[doc], self.names[doc], round(score, 4)) for doc, score in best]
+
+    def save(self, path: str):
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump((INDEX_VERSION, self.source, self.appids, self.names, self.exact, self.postings,
+                         self.trigram_ids, self.doc_trigrams, self.offsets), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data[0] != INDEX_VERSION:
+            return None
+
+        index = cls()
+        (_, index.source, index.appids, index.names, index.exact, index.postings,
+         index.trigram_ids, index.doc_trigrams, index.offsets) = data
+        return index
+
+
+def source_signature(app_list_path: str):
+    stat = os.stat(app_list_path)
+    return [os.path.abspath(app_list_path), stat.st_size, stat.st_mtime]
+
+
+def open_name_index(app_list_path: str, index_path: str):
+    # индекс перестраивается, только если список игр изменился с прошлого построения
+    signature = source_signature(app_list_path)
+    if os.path.exists(index_path):
+        index = NameIndex.load(index_path)
+        if index is not None and index.source == signature:
+            return index
+
+    started_at = time.perf_counter()
+    index = NameIndex.build(read_apps_from_file(app_list_path))
+    index.source = signature
+    index.save(index_path)
+    logging.info(f'Name index built: {len(index)} names, {len(index.postings)} trigrams '
+                 f'in {time.perf_counter() - started_at:.2f}s')
+    return index
+
+
+def join_byrutor(index: NameIndex, inputs: list, output: str, min_confidence: float, k: int):
+    # каждой игре byrutor - лучший appid, уверенность и остальные кандидаты
+    stats = {'games': 0, 'matched': 0}
+    paths = []
+    for root in inputs:
+        paths.extend([root] if os.path.isfile(root) else
+                     glob.glob(os.path.join(root, '**', 'success', '*.jsonl*'), recursive=True))
+
+    with open(output + '.tmp', 'w', encoding='utf-8') as f:
+        for path in sorted(paths):
+            for game in read_records(path):
+                if game.get('success') is False or 'name' not in game:
+                    continue
+
+                candidates = index.lookup(game['name'], k)
+                best = candidates[0] if len(candidates) > 0 and candidates[0][2] >= min_confidence else None
+                stats['games'] += 1
+                stats['matched'] += best is not None
+                f.write(json.dumps({'uri': game['uri'], 'name': game['name'],
+                                    'appid': best[0] if best is not None else None,
+                                    'steam_name': best[1] if best is not None else None,
+                                    'confidence': candidates[0][2] if len(candidates) > 0 else 0.0,
+                                    'candidates': [{'appid': appid, 'name': name, 'confidence': score}
+                                                   for appid, name, score in candidates]},
+                                   ensure_ascii=False) + '\n')
+    os.replace(output + '.tmp', output)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Match byrutor games to Steam appids by name',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--app-list', type=str, default=os.path.join('outputs', 'steam', 'games.json'),
+                        help='Json list of Steam apps saved by steam_scraper.py')
+    parser.add_argument('--index', type=str, default=os.path.join('outputs', 'name_index.pickle'),
+                        help='Where the built index is kept between runs')
+    parser.add_argument('-k', type=int, default=5, help='Amount of candidates per game')
+    parser.add_argument('--query', type=str, help='Print candidates for one name')
+    parser.add_argument('--join', type=str, nargs='+',
+                        help='byrutor run directories or shards, every game gets the best appid')
+    parser.add_argument('-o', '--output', type=str, default=os.path.join('outputs', 'byrutor_steam_matches.jsonl'),
+                        help='Result of --join')
+    parser.add_argument('--min-confidence', type=float, default=0.6,
+                        help='Below this similarity the game is left without appid')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(message)s', datefmt='%d-%m-%Y %H:%M:%S', level=logging.INFO)
+
+    name_index = open_name_index(args.app_list, args.index)
+    if args.query is not None:
+        started_at = time.perf_counter()
+        result = name_index.lookup(args.query, args.k)
+        elapsed = time.perf_counter() - started_at
+        for appid, name, confidence in result:
+            print(f'{appid:>10} {confidence:.3f} {name}')
+        print(f'lookup: {elapsed * 1000:.3f}ms')
+
+    if args.join is not None:
+        started_at = time.perf_counter()
+        join_stats = join_byrutor(name_index, args.join, args.output, args.min_confidence, args.k)
+        print(f"games: {join_stats['games']}, matched: {join_stats['matched']}, "
+              f"time: {time.perf_counter() - started_at:.2f}s, written to {args.output}")
@@ -0,0 +1,219 @@
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+from metrics import get_metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+EXTENSIONS = {'none': '.jsonl', 'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+PART_SUFFIX = '.part'
+
+WRITE_SECONDS = get_metrics().histogram('scraper_write_seconds', 'Time of writing a record, including rotation')
+WRITTEN_RECORDS = get_metrics().counter('scraper_written_records_total', 'Written records by writer')
+WRITTEN_BYTES = get_metrics().counter('scraper_written_bytes_total', 'Uncompressed bytes written by writer')
+# ошибки чтения обрезанного сжатого файла
+TRUNCATED_ERRORS = (EOFError, OSError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def open_compressed(raw, compression: str):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+    return raw
+
+
+def open_records(path: str):
+    # читает любой шард: .jsonl, .jsonl.gz, .jsonl.zst, в том числе недописанный .part
+    name = path[:-len(PART_SUFFIX)] if path.endswith(PART_SUFFIX) else path
+    if name.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if name.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('zstandard package is required to read .zst files')
+        return zstandard.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def read_records(path: str):
+    with open_records(path) as f:
+        try:
+            for line in f:
+                if line.strip() == '':
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # обрезанная последняя строка после падения
+                    logging.warning(f'Broken line in {path}')
+                    return
+        except TRUNCATED_ERRORS:
+            logging.warning(f'Truncated compressed file: {path}')
+
+
+def fsync_dir(directory: str):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class JsonLinesWriter:
+    # Пишет записи по одной строке JSON сразу по готовности, память не зависит от размера шарда.
+    # Шард пишется в файл *.part и переименовывается только после закрытия,
+    # поэтому читатели никогда не видят недописанный файл.
+    def __init__(self, directory: str, prefix: str = 'part', compression: str = 'none', max_records: int = None,
+                 max_bytes: int = None, fsync_every: int = 1000, blobs=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'Unknown compression: {compression}, expected one of {COMPRESSIONS}')
+        if compression == 'zstd' and zstandard is None:
+            raise RuntimeError('zstandard package is required for zstd compression')
+
+        self.directory = directory
+        self.prefix = prefix
+        self.compression = compression
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.fsync_every = fsync_every
+        # blob_store.BlobStore: описания записей из records.py уходят туда, в шард - только ссылки
+        self.blobs = blobs
+
+        self.records = 0
+        self.bytes_written = 0
+        self.files = []
+        self.write_seconds = 0.0
+
+        self._raw = None
+        self._stream = None
+        self._path = None
+        self._file_records = 0
+        self._file_bytes = 0
+        self._unsynced = 0
+
+    def _open(self):
+        name = f'{self.prefix}-{datetime.now().strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        self._path = os.path.join(self.directory, name + EXTENSIONS[self.compression])
+        self._raw = open(self._path + PART_SUFFIX, 'wb')
+        self._stream = open_compressed(self._raw, self.compression)
+        self._file_records = 0
+        self._file_bytes = 0
+
+    def write(self, record):
+        started_at = time.perf_counter()
+
+        if self._stream is None:
+            self._open()
+
+        # записи из records.py сериализуются сами, большие поля у них уже готовыми JSON литералами
+        text = record.to_json(self.blobs) if hasattr(record, 'to_json') else json.dumps(record, ensure_ascii=False,
+                                                                              separators=(',', ':'))
+        line = (text + '\n').encode('utf-8')
+        self._stream.write(line)
+
+        self.records += 1
+        self.bytes_written += len(line)
+        self._file_records += 1
+        self._file_bytes += len(line)
+        self._unsynced += 1
+
+        if (self.max_records is not None and self._file_records >= self.max_records) or \
+                (self.max_bytes is not None and self._file_bytes >= self.max_bytes):
+            self.rotate()
+        elif self.fsync_every is not None and self._unsynced >= self.fsync_every:
+            self.sync()
+
+        elapsed = time.perf_counter() - started_at
+        self.write_seconds += elapsed
+        WRITE_SECONDS.observe(elapsed, writer=self.prefix)
+        WRITTEN_RECORDS.inc(writer=self.prefix)
+        WRITTEN_BYTES.inc(len(line), writer=self.prefix)
+
+    def sync(self):
+        if self._stream is None:
+            return
+
+        # блобы коммитятся раньше шарда: в записанной на диск строке не бывает ссылки на несохранённое описание
+        if self.blobs is not None:
+            self.blobs.flush()
+
+        if self.compression == 'gzip':
+            self._stream.flush(zlib.Z_SYNC_FLUSH)
+        elif self.compression == 'zstd':
+            self._stream.flush(zstandard.FLUSH_BLOCK)
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._unsynced = 0
+
+    def rotate(self):
+        if self._stream is None:
+            return
+
+        if self.blobs is not None:
+            self.blobs.flush()
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+
+        os.replace(self._path + PART_SUFFIX, self._path)
+        fsync_dir(self.directory)
+        self.files.append(self._path)
+
+        self._raw = None
+        self._stream = None
+        self._unsynced = 0
+
+    def close(self):
+        self.rotate()
+
+    def summary(self):
+        return (f'{self.prefix}: records: {self.records}, bytes: {self.bytes_written}, files: {len(self.files)}, '
+                f'write time: {self.write_seconds:.2f}s')
+
+
+def recover_parts(directory: str, prefix: str = None):
+    # недописанные после падения шарды: оставляем целые строки и публикуем файл.
+    # С prefix восстанавливаются только свои шарды, чужие может прямо сейчас дописывать другой воркер
+    recovered = 0
+    for name in os.listdir(directory):
+        if not name.endswith(PART_SUFFIX):
+            continue
+        if prefix is not None and not name.startswith(prefix + '-'):
+            continue
+
+        part_path = os.path.join(directory, name)
+        final_path = part_path[:-len(PART_SUFFIX)]
+        compression = 'gzip' if final_path.endswith('.gz') else 'zstd' if final_path.endswith('.zst') else 'none'
+        tmp_path = final_path + '.recover'
+
+        with open(tmp_path, 'wb') as raw:
+            stream = open_compressed(raw, compression)
+            for record in read_records(part_path):
+                stream.write((json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8'))
+                recovered += 1
+            if stream is not raw:
+                stream.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        os.replace(tmp_path, final_path)
+        os.remove(part_path)
+        logging.info(f'Recovered shard: {final_path}')
+
+    fsync_dir(directory)
+    return recovered
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import get_metrics
+
+
+EXECUTOR_KINDS = ('process', 'thread', 'inline')
+
+PARSE_SECONDS = get_metrics().histogram('scraper_parse_seconds', 'Time of parsing in a worker by function')
+PARSE_WAIT_SECONDS = get_metrics().histogram('scraper_parse_wait_seconds',
+                                             'Time from submit to result, including the queue of the pool')
+PARSE_FAILURES = get_metrics().counter('scraper_parse_failures_total', 'Failed parse calls by function')
+
+
+def _timed_call(fn, args):
+    # выполняется в воркере, время разбора меряется там же, без ожидания в очереди
+    started_at = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started_at
+
+
+class ParseStats:
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.parse_seconds = 0.0
+
+    @property
+    def depth(self):
+        return self.submitted - self.completed - self.failed
+
+    def summary(self):
+        done = self.completed + self.failed
+        per_item = self.parse_seconds / done * 1000 if done else 0.0
+        return (f'parsed: {self.completed}, failed: {self.failed}, queue depth: {self.depth} '
+                f'(max {self.max_depth}), parse time per item: {per_item:.2f}ms')
+
+
+class ParseExecutor:
+    # Разбор HTML/JSON уносится с event loop в пул процессов (или потоков, если процессы недоступны),
+    # чтобы во время разбора большой страницы продолжали обслуживаться сокеты.
+    def __init__(self, kind: str = 'process', workers: int = None):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f'Unknown executor kind: {kind}, expected one of {EXECUTOR_KINDS}')
+
+        self.workers = workers or os.cpu_count() or 1
+        self.stats = ParseStats()
+        self.kind = kind
+        self._pool = None
+
+        if kind == 'process':
+            try:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            except (OSError, NotImplementedError, ImportError) as e:
+                logging.warning(f'Process pool is not available ({e!r}), falling back to threads')
+                self.kind = 'thread'
+
+        if self.kind == 'thread':
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='parse')
+
+    def _fallback_to_threads(self):
+        logging.warning('Process pool is broken, falling back to threads')
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.kind = 'thread'
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='parse')
+
+    def submit(self, fn, *args):
+        # возвращает future с результатом fn(*args)
+        return asyncio.ensure_future(self.run(fn, *args))
+
+    async def run(self, fn, *args):
+        submitted_at = time.perf_counter()
+        self.stats.submitted += 1
+        self.stats.max_depth = max(self.stats.max_depth, self.stats.depth)
+
+        try:
+            if self._pool is None:
+                result, elapsed = _timed_call(fn, args)
+            else:
+                loop = asyncio.get_running_loop()
+                try:
+                    result, elapsed = await loop.run_in_executor(self._pool, _timed_call, fn, args)
+                except BrokenProcessPool:
+                    self._fallback_to_threads()
+                    result, elapsed = await loop.run_in_executor(self._pool, _timed_call, fn, args)
+        except BaseException:
+            self.stats.failed += 1
+            PARSE_FAILURES.inc(function=fn.__name__)
+            raise
+
+        self.stats.completed += 1
+        self.stats.parse_seconds += elapsed
+        PARSE_SECONDS.observe(elapsed, function=fn.__name__)
+        PARSE_WAIT_SECONDS.observe(time.perf_counter() - submitted_at, function=fn.__name__)
+        return result
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        _executor = ParseExecutor('inline')
+
+    return _executor
+
+
+def open_executor(kind: str, workers: int = None):
+    global _executor
+
+    _executor = ParseExecutor(kind, workers)
+    logging.info(f'Parse executor: {_executor.kind}, workers: {_executor.workers}')
+    return _executor
+
+
+def close_executor():
+    global _executor
+
+    if _executor is None:
+        return
+
+    logging.info(f'Parse executor stats: {_executor.stats.summary()}')
+    _executor.shutdown()
+    _executor = None
@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from tqdm import tqdm
+
+from app_list import read_apps_from_file
+from egress_pool import EgressPool
+from game_store import GameStore
+from http_client import close_client, get_client
+from output_writer import COMPRESSIONS, JsonLinesWriter
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from retry import ERROR_THROTTLED, FetchError, RetryPolicy, classify_error, error_from_status
+from utils import format_price
+from worker_pool import run_pool
+
+
+# Быстрое обновление одних только цен: appdetails с filters=price_overview принимает сразу сотни appid
+# через запятую, ответ на каждый - несколько полей. Полный обход тратит запрос и разбор HTML на каждую игру,
+# здесь один запрос на --batch-size игр. Обновляются только цены в хранилище (--store), остальные поля
+# игр не трогаются; сами цены запуска пишутся в outputs/steam_prices.
+
+
+def batches(appids: list, size: int):
+    for start in range(0, len(appids), size):
+        yield appids[start:start + size]
+
+
+def parse_prices(appids: list, text: str):
+    # [(appid, успешно, цена или None)]; у бесплатных игр вместо data пустой список, цены нет.
+    # У неуспешных третий элемент - класс ошибки, если ответа не было совсем
+    response = json.loads(text) or {}
+    result = []
+    for appid in appids:
+        details = response.get(str(appid))
+        if details is None or not details.get('success'):
+            result.append((appid, False, None))
+        else:
+            result.append((appid, True, format_price(details.get('data'))))
+    return result
+
+
+async def fetch_prices(appids: list):
+    url = f"{config['store_url']}/api/appdetails?appids={','.join(map(str, appids))}&filters=price_overview"
+    if config['cc'] is not None:
+        url += f"&cc={config['cc']}"
+
+    # с пулом маршрутов скорость держит каждый маршрут, общий ограничитель не нужен
+    issued_at = await rate_limiter.acquire() if egress is None else None
+    response = await get_client().fetch(url, allow_redirects=False, egress=egress)
+
+    if response.status == 429 or response.status == 503:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if egress is None:
+            rate_limiter.on_throttle(retry_after, issued_at)
+        logging.warning(f'Too many requests: batch of {len(appids)} from {appids[0]}')
+        raise FetchError(ERROR_THROTTLED, 'too many requests', retry_after)
+
+    if response.status != 200:
+        message = f'Bad price request with status code {response.status} for batch from {appids[0]}'
+        logging.error(message)
+        raise error_from_status(response.status, message)
+
+    if egress is None:
+        rate_limiter.on_success()
+    return parse_prices(appids, response.text)
+
+
+async def refresh_batch(appids: list):
+    try:
+        return await retry_policy.call(fetch_prices, appids)
+    except Exception as e:
+        logging.error(f'Prices of batch from {appids[0]} are not refreshed: {e!r}')
+        return [(appid, False, classify_error(e)) for appid in appids]
+
+
+def load_appids():
+    if config['file'] is not None:
+        return [appid for appid, _ in read_apps_from_file(config['file'])]
+    return game_store.steam_appids()
+
+
+async def main():
+    appids = load_appids()
+    if len(appids) == 0:
+        exception_message = 'No appids to refresh prices for'
+        logging.error(exception_message)
+        raise Exception(exception_message)
+
+    stats = {'requests': 0, 'priced': 0, 'free': 0, 'failed': 0, 'updated': 0}
+    progress_bar = tqdm(total=len(appids), desc='prices', bar_format='{l_bar}{bar:30}{r_bar}{bar:-10b}')
+    writer = JsonLinesWriter(current_dir, prefix='prices', compression=config['compression'], fsync_every=None)
+    checked_at = time.time()
+
+    try:
+        async for batch, result in run_pool(batches(appids, config['batch_size']), refresh_batch,
+                                            config['concurrency']):
+            stats['requests'] += 1
+            prices = []
+            for appid, success, value in result:
+                if success:
+                    stats['priced' if value is not None else 'free'] += 1
+                    prices.append((appid, value))
+                    writer.write({'appid': appid, 'success': True, 'price': value, 'checked_at': checked_at})
+                else:
+                    stats['failed'] += 1
+                    writer.write({'appid': appid, 'success': False, 'error': value})
+            progress_bar.update(len(batch))
+
+            # цены в хранилище обновляются пачкой на каждый ответ, только после записи самих цен на диск
+            writer.sync()
+            if game_store is not None and len(prices) > 0:
+                stats['updated'] += game_store.update_prices(prices)
+    finally:
+        writer.close()
+        progress_bar.close()
+        await close_client()
+
+    message = (f"appids: {len(appids)}, requests: {stats['requests']}, priced: {stats['priced']}, "
+               f"free or without price: {stats['free']}, failed: {stats['failed']}, "
+               f"updated in store: {stats['updated']}, time: {time.perf_counter() - started_at:.2f}s")
+    logging.info(message)
+    logging.info(rate_limiter.summary() if egress is None else egress.summary())
+    logging.info(f'Retries: {retry_policy.stats.summary()}')
+    print(message)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refresh Steam prices in batches of appids',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--store', type=str,
+                        help='SQLite game store written with --store, prices of its Steam games are updated')
+    parser.add_argument('-f', '--file', type=str,
+                        help='Json list of apps to refresh instead of the Steam games of the store')
+    parser.add_argument('--batch-size', type=int, default=200, help='Appids in one appdetails request')
+    parser.add_argument('--cc', type=str, help='Country code of the prices, default: decided by Steam')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='Amount of requests in flight at once')
+    parser.add_argument('--rate', type=float, default=0.75,
+                        help='Initial requests per second, it is adapted on 429 responses')
+    parser.add_argument('--max-rate', type=float, default=10.0, help='Upper limit of requests per second')
+    parser.add_argument('--store-url', type=str, default='https://store.steampowered.com',
+                        help='Base url of the Steam store')
+    parser.add_argument('--retries', type=int, default=4, help='Attempts of one batch on retryable errors')
+    parser.add_argument('--retry-delay', type=float, default=1.0, help='Base of the exponential retry delay in seconds')
+    parser.add_argument('--egress', type=str, nargs='+',
+                        help='Routes of the requests: direct, http://proxy:port or local:<source address>, '
+                             'every route gets its own --rate and --max-rate')
+    parser.add_argument('--egress-cooldown', type=float, default=30,
+                        help='Seconds of the first pause of a failed route, doubled while it keeps failing')
+    parser.add_argument('--compression', type=str, default='none', choices=COMPRESSIONS,
+                        help='Compression of the output json lines files')
+    config = vars(parser.parse_args())
+
+    now = datetime.now().strftime('%d-%m-%Y %H-%M-%S')
+    current_dir = os.path.join(os.getcwd(), 'outputs', 'steam_prices', now)
+    os.makedirs(current_dir)
+    logging.basicConfig(filename=os.path.join(current_dir, f'logs-{now}.log'), encoding='utf-8',
+                        format='%(asctime)s.%(msecs)03d %(message)s', datefmt='%d-%m-%Y %H:%M:%S', level=logging.INFO)
+
+    if config['store'] is None and config['file'] is None:
+        exception_message = 'Either "store" or "file" value is required'
+        logging.error(exception_message)
+        raise Exception(exception_message)
+    if config['batch_size'] <= 0:
+        exception_message = '"batch_size" value cannot be less or equal zero'
+        logging.error(exception_message)
+        raise Exception(exception_message)
+
+    started_at = time.perf_counter()
+    rate_limiter = AdaptiveRateLimiter(rate=config['rate'], max_rate=config['max_rate'], name='prices')
+    egress = None
+    if config['egress'] is not None:
+        egress = EgressPool(config['egress'], config['rate'], config['max_rate'], config['egress_cooldown'],
+                            channel='prices')
+    retry_policy = RetryPolicy(config['retries'], config['retry_delay'])
+    game_store = GameStore(config['store']) if config['store'] is not None else None
+
+    try:
+        asyncio.run(main())
+    finally:
+        if game_store is not None:
+            game_store.close()
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+
+from metrics import get_metrics
+
+
+LIMITER_WAIT_SECONDS = get_metrics().histogram('scraper_rate_limiter_wait_seconds',
+                                               'Time requests waited for a token by limiter')
+LIMITER_THROTTLED = get_metrics().counter('scraper_throttled_total', '429/503 responses by limiter')
+LIMITER_RATE = get_metrics().gauge('scraper_rate_limit', 'Current requests per second by limiter')
+
+
+def parse_retry_after(value):
+    # Retry-After бывает либо количеством секунд, либо HTTP датой
+    if value is None or value == '':
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# серия успешных ответов для роста скорости - не длиннее, чем успевает набраться за столько секунд
+RECOVERY_SECONDS = 10
+
+
+class AdaptiveRateLimiter:
+    # token bucket, скорость которого подбирается по AIMD:
+    # после серии успешных ответов скорость растёт на increase, но не меньше чем на increase_ratio от текущей,
+    # на 429/503 умножается на decrease - не чаще раза на одну перегрузку: 429 на запросы, выданные
+    # до прошлого снижения, уже учтены в нём
+    def __init__(self, rate: float = 0.75, min_rate: float = 0.05, max_rate: float = 20.0, burst: float = 1.0,
+                 increase: float = 0.05, decrease: float = 0.5, success_threshold: int = 10, name: str = 'limiter',
+                 increase_ratio: float = 0.1):
+        if not min_rate <= rate <= max_rate:
+            raise ValueError('"rate" value must be between "min_rate" and "max_rate"')
+
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.increase_ratio = increase_ratio
+        self.decrease = decrease
+        self.success_threshold = success_threshold
+
+        self.successes_in_row = 0
+        # запросы, которые сейчас ждут токен
+        self.waiting = 0
+        self.total_acquired = 0
+        self.total_throttled = 0
+        self.total_decreased = 0
+
+        self._tokens = burst
+        self._decreased_at = float('-inf')
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        LIMITER_RATE.set(rate, limiter=name)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def delay(self):
+        # сколько придётся ждать следующий токен, без его захвата
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+
+        tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def expected_wait(self):
+        # сколько ждал бы новый запрос: следующий токен плюс все, кто уже стоит в очереди перед ним
+        return self.delay() + self.waiting / self.rate
+
+    async def acquire(self):
+        # возвращает момент выдачи токена, его передают в on_throttle
+        started_at = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._acquire()
+        finally:
+            self.waiting -= 1
+        issued_at = time.monotonic()
+        LIMITER_WAIT_SECONDS.observe(issued_at - started_at, limiter=self.name)
+        return issued_at
+
+    async def _acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.total_acquired += 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        self.successes_in_row += 1
+
+        # на малой скорости серия короче, иначе после сильного снижения подъём занимал бы часы
+        if self.successes_in_row >= max(1, min(self.success_threshold, int(self.rate * RECOVERY_SECONDS))):
+            self.successes_in_row = 0
+            self._set_rate(self.rate + max(self.increase, self.rate * self.increase_ratio))
+
+    def on_throttle(self, retry_after: float = None, issued_at: float = None):
+        # issued_at - что вернул acquire для этого запроса; без него скорость снижается на каждый 429
+        self.successes_in_row = 0
+        self.total_throttled += 1
+        LIMITER_THROTTLED.inc(limiter=self.name)
+
+        now = time.monotonic()
+        if issued_at is None or issued_at >= self._decreased_at:
+            self._set_rate(self.rate * self.decrease)
+            self._decreased_at = now
+            self.total_decreased += 1
+
+        # после 429 токены копить нельзя, иначе сразу уйдёт пачка запросов
+        self._refill(now)
+        self._tokens = 0.0
+
+        if retry_after is not None:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            logging.warning(f'{self.name}: throttled, retry after {retry_after:.1f}s, rate {self.rate:.3f}/s')
+        else:
+            logging.warning(f'{self.name}: throttled, rate {self.rate:.3f}/s')
+
+    def _set_rate(self, rate: float):
+        self._refill(time.monotonic())
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+        LIMITER_RATE.set(self.rate, limiter=self.name)
+
+    def summary(self):
+        return (f'{self.name}: rate {self.rate:.3f}/s, acquired: {self.total_acquired}, '
+                f'throttled: {self.total_throttled}, decreased: {self.total_decreased}')
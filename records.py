@@ -0,0 +1,220 @@
+import hashlib
+import json
+import sys
+import zlib
+
+
+# HTML длиннее этого хранится сжатым уже готовым JSON литералом и разворачивается только по требованию
+LAZY_MIN_BYTES = 1024
+# поля SteamGame, которых нет на странице магазина (их подгружают скрипты): в такой записи они пустые,
+# но на деле неизвестны, поэтому хранилище и дельта оставляют значения из appdetails
+STORE_PAGE_UNKNOWN = ('website', 'movies', 'price')
+
+
+def intern_all(values):
+    return tuple(sys.intern(value) for value in values) if values is not None else ()
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class LazyText:
+    # Большое текстовое поле (описание игры в HTML). Строка один раз кодируется в JSON литерал,
+    # длинный литерал сжимается: запись в файл берёт литерал как есть, текст декодируется только при чтении.
+    # У длинного литерала сразу считаются sha1 - адрес в хранилище блобов - и размер в байтах, пока он ещё не сжат
+    __slots__ = ('_data', 'digest', 'size')
+
+    def __init__(self, text: str = None, literal: str = None):
+        literal = literal if literal is not None else dumps(text if text is not None else '')
+        if len(literal) >= LAZY_MIN_BYTES:
+            encoded = literal.encode('utf-8')
+            self._data = zlib.compress(encoded, 1)
+            self.digest = hashlib.sha1(encoded).digest()
+            self.size = len(encoded)
+        else:
+            self._data = literal
+            self.digest = None
+            self.size = None
+
+    def literal(self):
+        return self._data if isinstance(self._data, str) else zlib.decompress(self._data).decode('utf-8')
+
+    def compressed(self):
+        return self._data if isinstance(self._data, bytes) else zlib.compress(self._data.encode('utf-8'), 1)
+
+    @property
+    def text(self):
+        return json.loads(self.literal())
+
+    def __str__(self):
+        return self.text
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getstate__(self):
+        return self._data, self.digest, self.size
+
+    def __setstate__(self, state):
+        self._data, self.digest, self.size = state
+
+
+class Record:
+    # Базовый класс записей со слотами. FIELDS задаёт порядок полей в JSON, строки из INTERNED интернируются
+    # (языки, жанры, разработчики повторяются в тысячах записей), поля из LAZY хранятся как LazyText,
+    # поля из OPTIONAL со значением None в JSON не пишутся.
+    __slots__ = ()
+    FIELDS = ()
+    INTERNED = ()
+    LAZY = ()
+    OPTIONAL = ()
+
+    def __init__(self, **values):
+        for name in self.FIELDS:
+            setattr(self, name, values.get(name))
+        self._intern()
+
+    def _intern(self):
+        for name in self.INTERNED:
+            value = getattr(self, name)
+            if isinstance(value, str):
+                setattr(self, name, sys.intern(value))
+            elif value is not None:
+                setattr(self, name, intern_all(value))
+        for name in self.LAZY:
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, LazyText):
+                setattr(self, name, LazyText(value))
+
+    def _plain(self):
+        # поля без LAZY в виде, который json.dumps пишет без default
+        data = {}
+        for name in self.FIELDS:
+            if name in self.LAZY:
+                continue
+            value = getattr(self, name)
+            if value is None and name in self.OPTIONAL:
+                continue
+            data[name] = value
+        return data
+
+    def to_dict(self):
+        data = self._plain()
+        for name in self.LAZY:
+            value = getattr(self, name)
+            if value is not None or name not in self.OPTIONAL:
+                data[name] = value.text if value is not None else None
+        return data
+
+    def to_json(self, blobs=None):
+        # большие поля вставляются готовыми литералами, json.dumps экранирует только остальное.
+        # С хранилищем блобов (blob_store.BlobStore) вместо самого поля пишется ссылка на него
+        text = dumps(self._plain())
+        lazy = ''.join(f',"{name}":{self._lazy_literal(getattr(self, name), blobs)}' for name in self.LAZY
+                       if getattr(self, name) is not None)
+        if lazy == '':
+            return text
+        return '{' + lazy[1:] + '}' if text == '{}' else text[:-1] + lazy + '}'
+
+    @staticmethod
+    def _lazy_literal(value: LazyText, blobs):
+        return value.literal() if blobs is None else blobs.reference(value)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**data)
+
+    @classmethod
+    def from_json(cls, line: str):
+        return cls.from_dict(json.loads(line))
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def __setstate__(self, state):
+        # при передаче из процесса разбора интернирование теряется, поэтому повторяется здесь
+        for name, value in zip(self.FIELDS, state):
+            setattr(self, name, value)
+        self._intern()
+
+    def __repr__(self):
+        return f'{type(self).__name__}({", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS[:2])})'
+
+
+class Screenshot(Record):
+    __slots__ = FIELDS = ('id', 'path_thumbnail', 'path_full')
+
+
+class Movie(Record):
+    # webm и mp4 в Steam - словари {качество: адрес}
+    __slots__ = FIELDS = ('name', 'highlight', 'thumbnail', 'webm', 'mp4')
+
+
+class Requirement(Record):
+    # у Steam уровень minimum или recommended, у byrutor уровня нет
+    __slots__ = FIELDS = ('level', 'property', 'value')
+
+    def _intern(self):
+        self.level = sys.intern(self.level) if self.level is not None else None
+        self.property = sys.intern(self.property)
+        # значения требований («4 GB RAM», «Windows 10») тоже повторяются
+        if isinstance(self.value, str) and len(self.value) < 64:
+            self.value = sys.intern(self.value)
+
+
+class SteamGame(Record):
+    # channel - откуда получена запись: ответ api/appdetails или страница магазина.
+    # genre_ids и category_ids - id из taxonomy.Taxonomy, их проставляет скрейпер перед записью
+    __slots__ = FIELDS = ('appid', 'success', 'steamid', 'age', 'name', 'short_description', 'languages',
+                          'developers', 'publishers', 'website', 'header_image_uri', 'screenshots', 'long_description',
+                          'release_date', 'genres', 'categories', 'genre_ids', 'category_ids', 'movies',
+                          'requirements', 'price', 'channel')
+    INTERNED = ('languages', 'developers', 'publishers', 'release_date', 'genres', 'categories')
+    LAZY = ('long_description',)
+    OPTIONAL = ('genre_ids', 'category_ids')
+
+    def _plain(self):
+        data = super()._plain()
+        data['screenshots'] = [screenshot.to_dict() for screenshot in self.screenshots]
+        data['movies'] = [movie.to_dict() for movie in self.movies]
+        requirements = {}
+        for requirement in self.requirements:
+            requirements.setdefault(requirement.level, {})[requirement.property] = requirement.value
+        data['requirements'] = requirements
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        values = dict(data)
+        values['screenshots'] = tuple(Screenshot.from_dict(item) for item in data.get('screenshots', []))
+        values['movies'] = tuple(Movie.from_dict(item) for item in data.get('movies', []))
+        values['requirements'] = tuple(Requirement(level=level, property=name, value=value)
+                                       for level, fields in data.get('requirements', {}).items()
+                                       for name, value in fields.items())
+        return cls(**values)
+
+
+class ByrutorGame(Record):
+    __slots__ = FIELDS = ('uri', 'name', 'description', 'screenshots', 'video_webm', 'video_mp4', 'release_date',
+                          'release_year', 'genres', 'developers', 'ui_language', 'sound_language', 'categories',
+                          'version', 'torrent_size', 'requirements', 'success', 'genre_ids', 'category_ids')
+    INTERNED = ('release_date', 'genres', 'developers', 'ui_language', 'sound_language', 'categories')
+    LAZY = ('description',)
+    # этих блоков может не быть на странице, тогда и ключа нет в записи
+    OPTIONAL = ('genres', 'developers', 'ui_language', 'sound_language', 'genre_ids', 'category_ids')
+
+    def _plain(self):
+        data = super()._plain()
+        data['screenshots'] = list(self.screenshots)
+        data['requirements'] = [{'property': requirement.property, 'value': requirement.value}
+                                for requirement in self.requirements]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        values = dict(data)
+        values['screenshots'] = tuple(data.get('screenshots', []))
+        values['requirements'] = tuple(Requirement(property=field['property'], value=field['value'])
+                                       for field in data.get('requirements', []))
+        return cls(**values)
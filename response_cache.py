@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import zlib
+
+
+# заголовки запроса, от которых зависит ответ
+VARY_HEADERS = ('Accept', 'Accept-Language', 'Cookie')
+# заголовки ответа, которые сохраняются вместе с телом
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Retry-After')
+
+
+class CacheEntry:
+    __slots__ = ('key', 'status', 'headers', 'text', 'etag', 'last_modified', 'stored_at', 'size')
+
+    def __init__(self, key, status, headers, text, etag, last_modified, stored_at, size):
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.size = size
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    # Файл кэша общий для всех процессов (воркеры --coordinator), поэтому блокировка записи держится недолго:
+    # новые ответы и отметки о чтении копятся в памяти и пишутся пачкой в одной короткой транзакции
+    def __init__(self, path: str, ttl: float = 24 * 3600, max_bytes: int = 2 * 1024 ** 3, evict_every: int = 500,
+                 batch_size: int = 50):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.batch_size = batch_size
+        # ключ -> строка таблицы, ещё не записанная в файл
+        self.pending = {}
+        # ключ -> (stored_at или None, accessed_at) для прочитанных и перепроверенных записей
+        self.touched = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bytes_saved = 0
+        self.evicted = 0
+        self._puts = 0
+
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                                'key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, '
+                                'headers TEXT NOT NULL, body BLOB NOT NULL, etag TEXT, last_modified TEXT, '
+                                'stored_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+
+    @staticmethod
+    def make_key(url: str, headers: dict = None):
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        vary = '\n'.join(f'{name}:{headers.get(name.lower(), "")}' for name in VARY_HEADERS)
+        return hashlib.sha1(f'{url}\n{vary}'.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        pending = self.pending.get(key)
+        if pending is not None:
+            row = (pending[2], pending[3], pending[4], pending[5], pending[6], pending[7], pending[9])
+        else:
+            row = self.connection.execute('SELECT status, headers, body, etag, last_modified, stored_at, size '
+                                          'FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        status, headers, body, etag, last_modified, stored_at, size = row
+        stored_at = self.touched.get(key, (None,))[0] or stored_at
+        return CacheEntry(key, status, json.loads(headers), zlib.decompress(body).decode('utf-8'),
+                          etag, last_modified, stored_at, size)
+
+    def is_fresh(self, entry: CacheEntry):
+        return time.time() - entry.stored_at < self.ttl
+
+    def record_hit(self, entry: CacheEntry):
+        self.hits += 1
+        self.bytes_saved += entry.size
+        # время чтения нужно только для вытеснения, поэтому пишется вместе со следующей пачкой
+        stored_at = self.touched.get(entry.key, (None,))[0]
+        self.touched[entry.key] = (stored_at, time.time())
+        self._maybe_flush()
+
+    def record_revalidated(self, entry: CacheEntry):
+        # 304 Not Modified: тело не скачивалось, запись снова свежая
+        self.revalidated += 1
+        self.bytes_saved += entry.size
+        now = time.time()
+        entry.stored_at = now
+        self.touched[entry.key] = (now, now)
+        self._maybe_flush()
+
+    def put(self, key: str, url: str, status: int, headers, text: str):
+        self.misses += 1
+        stored_headers = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        body = text.encode('utf-8')
+        now = time.time()
+        self.pending[key] = (key, url, status, json.dumps(stored_headers), zlib.compress(body),
+                             stored_headers.get('ETag'), stored_headers.get('Last-Modified'), now, now, len(body))
+        self.touched.pop(key, None)
+
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+        else:
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self.pending) + len(self.touched) >= self.batch_size:
+            self.flush()
+
+    def _write(self, statements):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            statements()
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+
+    def flush(self):
+        if len(self.pending) == 0 and len(self.touched) == 0:
+            return
+
+        def statements():
+            self.connection.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                        list(self.pending.values()))
+            self.connection.executemany('UPDATE responses SET stored_at = COALESCE(?, stored_at), accessed_at = ? '
+                                        'WHERE key = ?',
+                                        [(stored_at, accessed_at, key)
+                                         for key, (stored_at, accessed_at) in self.touched.items()])
+
+        self._write(statements)
+        self.pending.clear()
+        self.touched.clear()
+
+    def evict(self):
+        # сначала удаляются протухшие записи без валидаторов, потом самые давно читаемые, пока не влезем в размер
+        self.flush()
+
+        def statements():
+            cursor = self.connection.execute('DELETE FROM responses WHERE stored_at < ? AND etag IS NULL '
+                                             'AND last_modified IS NULL', (time.time() - self.ttl,))
+            self.evicted += cursor.rowcount
+
+            total = self.connection.execute('SELECT COALESCE(SUM(LENGTH(body)), 0) FROM responses').fetchone()[0]
+            if total > self.max_bytes:
+                rows = self.connection.execute('SELECT key, LENGTH(body) FROM responses ORDER BY accessed_at')
+                to_delete = []
+                for key, size in rows:
+                    if total <= self.max_bytes * 0.9:
+                        break
+                    to_delete.append((key,))
+                    total -= size
+
+                self.connection.executemany('DELETE FROM responses WHERE key = ?', to_delete)
+                self.evicted += len(to_delete)
+
+        self._write(statements)
+
+    def close(self):
+        self.evict()
+        self.connection.close()
+
+    def summary(self):
+        return (f'cache hits: {self.hits}, misses: {self.misses}, revalidated: {self.revalidated}, '
+                f'bytes saved: {self.bytes_saved}, evicted: {self.evicted}')
+
+
+def open_cache(path: str, ttl_hours: float, size_mb: int):
+    logging.info(f'Using response cache: {path}')
+    return ResponseCache(path, ttl=ttl_hours * 3600, max_bytes=size_mb * 1024 ** 2)
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import aiohttp
+
+from metrics import get_metrics
+
+
+ERROR_TIMEOUT = 'timeout'
+ERROR_CONNECT = 'connect'
+ERROR_THROTTLED = 'throttled'
+ERROR_SERVER = 'server'
+ERROR_PARSE = 'parse'
+ERROR_PERMANENT = 'permanent'
+
+RETRIES = get_metrics().counter('scraper_retries_total', 'Retried attempts by error class')
+GAVE_UP = get_metrics().counter('scraper_gave_up_total', 'Calls failed after the last attempt by error class')
+
+# ошибки разбора не повторяются: тот же ответ разберётся так же, такие ошибки переигрываются
+# из dead letter после исправления парсера
+RETRYABLE_ERRORS = (ERROR_TIMEOUT, ERROR_CONNECT, ERROR_THROTTLED, ERROR_SERVER)
+
+
+class FetchError(Exception):
+    def __init__(self, kind: str, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+def error_from_status(status: int, message: str, retry_after: float = None):
+    if status == 429 or status == 503:
+        return FetchError(ERROR_THROTTLED, message, retry_after)
+    if status >= 500:
+        return FetchError(ERROR_SERVER, message, retry_after)
+    return FetchError(ERROR_PERMANENT, message)
+
+
+def classify_error(error: BaseException):
+    if isinstance(error, FetchError):
+        return error.kind
+    if isinstance(error, asyncio.TimeoutError):
+        return ERROR_TIMEOUT
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error_from_status(error.status, str(error)).kind
+    if isinstance(error, (aiohttp.ClientConnectionError, ConnectionError)):
+        return ERROR_CONNECT
+    if isinstance(error, (ValueError, KeyError, AttributeError, IndexError, TypeError)):
+        # json.JSONDecodeError тоже ValueError
+        return ERROR_PARSE
+    return ERROR_PERMANENT
+
+
+class RetryStats:
+    def __init__(self):
+        self.calls = 0
+        self.retries = {}
+        self.gave_up = {}
+
+    def summary(self):
+        retries = ', '.join(f'{kind}: {count}' for kind, count in sorted(self.retries.items())) or 'none'
+        gave_up = ', '.join(f'{kind}: {count}' for kind, count in sorted(self.gave_up.items())) or 'none'
+        return f'calls: {self.calls}, retries: {retries}, gave up: {gave_up}'
+
+
+class RetryPolicy:
+    # Экспоненциальная задержка с полным jitter: попытка n ждёт случайное время от 0 до base * 2^n,
+    # но не меньше Retry-After. Повторы идут прямо в воркерах пула, поэтому выполняются параллельно,
+    # а каждая попытка сама проходит через ограничитель скорости.
+    def __init__(self, attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 retryable: tuple = RETRYABLE_ERRORS):
+        if attempts <= 0:
+            raise ValueError('"attempts" value cannot be less or equal zero')
+
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+        self.stats = RetryStats()
+
+    def delay(self, attempt: int, retry_after: float = None):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(self.max_delay, retry_after))
+        return delay
+
+    async def call(self, fn, *args):
+        self.stats.calls += 1
+
+        for attempt in range(self.attempts):
+            try:
+                return await fn(*args)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                kind = classify_error(e)
+                if kind not in self.retryable or attempt == self.attempts - 1:
+                    self.stats.gave_up[kind] = self.stats.gave_up.get(kind, 0) + 1
+                    GAVE_UP.inc(error=kind)
+                    raise
+
+                self.stats.retries[kind] = self.stats.retries.get(kind, 0) + 1
+                RETRIES.inc(error=kind)
+                delay = self.delay(attempt, getattr(e, 'retry_after', None))
+                logging.debug(f'Retry {attempt + 1}/{self.attempts - 1} of {args} in {delay:.2f}s after {kind}: {e!r}')
+                await asyncio.sleep(delay)
+
+
+class DeadLetterQueue:
+    # Окончательные неудачи дописываются по строке JSON, последняя запись по ключу побеждает.
+    # Файл можно переиграть следующим запуском, ключи читает read_dead_letters.
+    # С sync_every строки сбрасываются на диск пачками сами, без него - в sync() на контрольных точках
+    def __init__(self, path: str, sync_every: int = None):
+        self.path = path
+        self.sync_every = sync_every
+        self.pending = []
+        self.count = 0
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def add(self, key, error: str, reason: str):
+        entry = {'key': str(key), 'error': error, 'reason': reason, 'time': round(time.time(), 3)}
+        self.pending.append(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.count += 1
+        if self.sync_every is not None and len(self.pending) >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        self.file.writelines(self.pending)
+        self.pending.clear()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+def read_dead_letters(path: str):
+    # ключи в порядке первого появления, недописанные после падения строки пропускаются
+    entries = {}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f'Skip broken dead letter line: {line!r}')
+                continue
+            entries[entry['key']] = entry
+
+    return entries
@@ -1,14 +1,35 @@
-import requests
 import asyncio
-import aiohttp
+import glob
 import json
-from bs4 import BeautifulSoup
 from tqdm import tqdm
 import os
 from datetime import datetime
-import uuid
 import logging
 import argparse
+import re
+import time
+from http_client import get_client, close_client
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from worker_pool import run_pool
+from response_cache import open_cache
+from crawl_journal import CrawlJournal, STATE_OK, STATE_FAILED, state_from_result
+from output_writer import JsonLinesWriter, COMPRESSIONS, recover_parts
+from parse_executor import EXECUTOR_KINDS, get_executor, open_executor, close_executor
+from html_parser import BACKEND_CHOICES, make_soup, class_strainer, set_backend
+from taxonomy import Taxonomy
+from metrics import get_metrics, start_metrics_server, write_metrics_periodically
+from retry import (ERROR_PARSE, ERROR_PERMANENT, ERROR_THROTTLED, ERROR_TIMEOUT, DeadLetterQueue, FetchError,
+                   RetryPolicy, classify_error, error_from_status, read_dead_letters)
+from app_list import APP_LIST_URL, AppCatalogue, AppListWriter, stream_apps_from_file, stream_apps_from_url
+from game_store import GameStore
+from change_tracker import ChangeTracker
+from blob_store import BlobStore
+from egress_pool import EgressPool
+from app_status import (KIND_NO_DATA, KIND_NOT_GAME, KIND_NOT_RELEASED, PRIORITY_NEW, PRIORITY_SKIP, AppStatusCache,
+                        PriorityScheduler)
+from records import STORE_PAGE_UNKNOWN, Movie, Requirement, Screenshot, SteamGame
+from work_leases import ChunkTracker, LeaseCoordinator, default_worker_id
+from utils import format_price, peak_rss_mb
 
 
 # args setting
@@ -16,7 +37,7 @@ parser = argparse.ArgumentParser(description='Steam Parser', formatter_class=arg
 parser.add_argument('-a', '--above', type=int, help='The upper limit of the parsing list, default: max')
 parser.add_argument('-b', '--below', type=int, help='The lower limit of the parsing list, default: 0')
 parser.add_argument('-q', '--quantity-write', type=int,
-                    help='Which quantity parsing entry for writing json file, default: 1000')
+                    help='Which quantity parsing entry for writing into one output file, default: 1000')
 parser.add_argument('-f', '--file', type=str,
                     help='Path to any json file which was created on last parses. '
                          'The path can be either from the root of the program or the full path. '
@@ -24,31 +45,99 @@ parser.add_argument('-f', '--file', type=str,
 parser.add_argument('-r', '--repeat', action='store_true',
                     help='Flag for trying repeat parse games which could not be accessed at the moment of parsing, '
                          'default: flag is false')
-args = parser.parse_args()
-config = vars(args)
-
-# output setting
-now = datetime.now().strftime('%d-%m-%Y %H-%M-%S')
-outputs_dir = os.path.join(os.getcwd(), 'outputs', 'steam')
-current_dir = os.path.join(outputs_dir, now)
-path_dir_games = os.path.join(current_dir, 'successful')
-path_dir_failed_games = os.path.join(current_dir, 'failed')
-
-os.makedirs(path_dir_games)
-os.makedirs(path_dir_failed_games)
-
-# logging setting
-dir_logs = os.path.join(current_dir, 'logs')
-os.makedirs(dir_logs)
-
-logging.basicConfig(filename=os.path.join(dir_logs, f'logs-{now}.log'), encoding='utf-8',
-                    format='%(asctime)s.%(msecs)03d %(message)s', datefmt='%d-%m-%Y %H:%M:%S', level=logging.DEBUG)
-
-
-def get_all_games():
-    games_url = "https://api.steampowered.com/ISteamApps/GetAppList/v2?format=json"
-    response_json = requests.get(games_url).json()
-    return response_json["applist"]["apps"]
+parser.add_argument('-c', '--concurrency', type=int, default=10, help='Amount of requests in flight at once')
+parser.add_argument('--rate', type=float, default=0.75,
+                    help='Initial requests per second to the appdetails api, adjusted by 429 responses')
+parser.add_argument('--max-rate', type=float, default=10.0, help='Upper limit of requests per second')
+parser.add_argument('--store-url', type=str, default='https://store.steampowered.com',
+                    help='Base url of the Steam store, can be pointed to mock_server.py for offline runs')
+parser.add_argument('--app-list-url', type=str, default=APP_LIST_URL, help='Url of the GetAppList response')
+parser.add_argument('--retries', type=int, default=4,
+                    help='Attempts per appid on timeouts, connection errors, 429 and 5xx responses')
+parser.add_argument('--retry-delay', type=float, default=1.0, help='Base of the exponential retry delay in seconds')
+parser.add_argument('--retry-max-delay', type=float, default=60.0, help='Upper limit of the retry delay in seconds')
+parser.add_argument('--replay', type=str,
+                    help='Path to dead_letter.jsonl of a previous run, only its appids are requested again')
+parser.add_argument('--metrics-interval', type=float, default=10,
+                    help='Seconds between rewrites of metrics.prom in the run directory')
+parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics at http://host:port/metrics')
+parser.add_argument('--metrics-host', type=str, default='localhost', help='Host of the metrics endpoint')
+parser.add_argument('--cache', action='store_true',
+                    help='Keep http responses in outputs/http_cache.sqlite and reuse them on the next runs')
+parser.add_argument('--cache-ttl', type=float, default=24, help='Hours while a cached response is fresh')
+parser.add_argument('--cache-size', type=int, default=2048, help='Max size of the response cache in megabytes')
+parser.add_argument('--resume', type=str,
+                    help='Path to the output dir of an interrupted run. Completed appids from its journal are skipped '
+                         'and the run parameters are taken from it unless given explicitly')
+parser.add_argument('--store', type=str,
+                    help='Path to a SQLite file where successful games are also upserted with indexes for lookups')
+parser.add_argument('--delta', action='store_true',
+                    help='Also write added, changed and removed games into delta/ of the run directory, content hashes '
+                         'of the previous runs are kept in outputs/content_hashes.sqlite')
+parser.add_argument('--blobs', action='store_true',
+                    help='Keep descriptions once per content in outputs/blobs.sqlite, records get only a hash '
+                         'reference')
+parser.add_argument('--negative-cache', action='store_true',
+                    help='Remember in outputs/app_status.sqlite which appids are not games, not released or have no '
+                         'data, skip them while the answer is fresh and request new appids first, known games next '
+                         'and expired non-games last')
+parser.add_argument('--not-game-ttl', type=float, default=90, help='Days while "is not game" is not requested again')
+parser.add_argument('--not-released-ttl', type=float, default=3,
+                    help='Days while "not released" is not requested again')
+parser.add_argument('--no-data-ttl', type=float, default=30,
+                    help='Days while an appid without data (success: false) is not requested again')
+parser.add_argument('--store-page-channel', action='store_true',
+                    help='When requests to appdetails wait for the rate limit longer than --channel-switch-wait, '
+                         'fetch the game from its store page instead, under its own rate limit')
+parser.add_argument('--store-page-rate', type=float, default=0.5, help='Initial requests per second to store pages')
+parser.add_argument('--store-page-max-rate', type=float, default=2.0,
+                    help='Upper limit of requests per second to store pages')
+parser.add_argument('--channel-switch-wait', type=float, default=2.0,
+                    help='Seconds of expected wait for appdetails after which store pages are used')
+parser.add_argument('--egress', type=str, nargs='+',
+                    help='Routes of the requests: direct, http://proxy:port or local:<source address>. Every route '
+                         'gets its own --rate and --max-rate for appdetails and --store-page-rate for store pages, '
+                         'a route after 429 or a connect error pauses for a while')
+parser.add_argument('--egress-cooldown', type=float, default=30,
+                    help='Seconds of the first pause of a failed route, doubled while it keeps failing')
+parser.add_argument('--coordinator', type=str,
+                    help='Path to a shared SQLite file with the work plan. Every process started with the same file '
+                         'leases its own chunks of the games list, the outputs are written next to the file')
+parser.add_argument('--chunk-size', type=int, default=1000, help='Appids in one leased chunk')
+parser.add_argument('--worker-id', type=str, default=default_worker_id(),
+                    help='Name of this worker in the work plan and in its output files')
+parser.add_argument('--lease-seconds', type=float, default=300,
+                    help='Seconds without a heartbeat after which a chunk of a dead worker is given to another one')
+parser.add_argument('--compression', type=str, default='none', choices=COMPRESSIONS,
+                    help='Compression of the output json lines files')
+parser.add_argument('--shard-size', type=int,
+                    help='Max size of one output file in megabytes, by default files are split only by quantity')
+parser.add_argument('--parse-executor', type=str, default='process', choices=EXECUTOR_KINDS,
+                    help='Where responses are parsed: process pool, thread pool or right on the event loop')
+parser.add_argument('--parse-workers', type=int, help='Amount of parse workers, default: cpu count')
+parser.add_argument('--html-parser', type=str, default='auto', choices=BACKEND_CHOICES,
+                    help='BeautifulSoup backend, auto takes lxml when it is installed')
+# записи и журнал сбрасываются на диск каждые SYNC_EVERY обработанных игр
+SYNC_EVERY = 100
+CHANNEL_API = 'appdetails'
+CHANNEL_STORE_PAGE = 'store_page'
+RELEASE_DATE_PATTERN = re.compile(r'Release Date:\s*(.+)')
+RESULTS = get_metrics().counter('scraper_results_total', 'Scraped records by source, journal state and error class')
+taxonomy = None
+game_store = None
+change_tracker = None
+blob_store = None
+app_status = None
+store_page_limiter = None
+# пулы маршрутов (--egress) по каналам: у appdetails и страниц магазина свои скорости и паузы маршрутов
+api_egress = None
+store_page_egress = None
+# appid, у которых страница магазина бесполезна (возрастной фильтр, перенаправление), - только через api
+api_only = set()
+channel_counts = {CHANNEL_API: 0, CHANNEL_STORE_PAGE: 0}
+coordinator = None
+tracker = None
+started_at = time.perf_counter()
 
 
 def format_game_data(game_id, response):
@@ -58,13 +147,14 @@ def format_game_data(game_id, response):
         logging.info(f"Couldn't get game info by id: {game_id}")
         return {'appid': game_id, 'success': False, 'reason': 'unknown'}
 
-    game_json = dict(response[game_id])
+    # ответ только читается, копии словарей не нужны
+    game_json = response[game_id]
 
     if "success" in game_json.keys():
         if not game_json["success"]:
             return {'appid': game_id, 'success': False, 'reason': game_json.get('reason', 'unknown')}
 
-    game_data = dict(game_json.get('data', {}))
+    game_data = game_json.get('data', {})
 
     # Проверка на тип приложения
     if game_data["type"] != "game":
@@ -75,215 +165,594 @@ def format_game_data(game_id, response):
         if game_data['release_date']['coming_soon']:
             return {'appid': game_id, 'success': False, 'reason': 'not released'}
 
-    my_data = {game_id: {
-        "success": True,
-        "steamid": game_data.get("steam_appid"),
-        'age': game_data.get('required_age', 0),
-        "name": game_data.get("name"),
-        'short_description': game_data.get('short_description', ''),
-        # через запятую
-        # если нужно, могу разбить в список
-        "languages": game_data.get("supported_languages", ""),
-        # разработчики идут списков от 0
-        "developers": game_data.get("developers", []),
-        # издатели идут так же списком
-        "publishers": game_data.get("publishers", []),
-        'website': game_data.get('website', ''),
-        'header_image_uri': game_data.get('header_image', ''),
-        'screenshots': game_data.get('screenshots', []),
-    }}
-
-    # scrape description
+    # описание остаётся HTML, текст без разметки извлекается только по запросу (blob_store.plain_text)
     html_description = game_data.get('about_the_game', '')
-    desc_text = get_description_text(html_description)
-
-    # если надо будет только текст, то заменить на desc_text
-    my_data[game_id]['long_description'] = html_description
 
     # get release date
     release_date = game_data.get('release_date', {})
-    my_data[game_id]['release_date'] = ''
+    date = ''
     if release_date != '':
         date = dict(release_date).get('date', '')
-        my_data[game_id]['release_date'] = date
-
-    # get genres
-    genres = [genre['description'] for genre in game_data.get('genres', [])]
-    my_data[game_id]['genres'] = genres
-
-    # get categories
-    categories = [category['description'] for category in game_data.get('categories', [])]
-    my_data[game_id]['categories'] = categories
 
     # get movies
-    movies = [{'name': movie['name'],
-               # пока не знаю, за что отвечает значение "highlight"
-               'highlight': movie['highlight'],
-               'thumbnail': movie['thumbnail'],
-               'webm': movie['webm'],
-               'mp4': movie['mp4']} for movie in game_data.get('movies', [])]
-    my_data[game_id]['movies'] = movies
+    movies = tuple(Movie(name=movie['name'],
+                         # пока не знаю, за что отвечает значение "highlight"
+                         highlight=movie['highlight'],
+                         thumbnail=movie['thumbnail'],
+                         webm=movie['webm'],
+                         mp4=movie['mp4']) for movie in game_data.get('movies', []))
 
     # parse HTML data requirements
-    reqs = {}
+    reqs = []
     for req in game_data.get('pc_requirements', []):
-        soup = BeautifulSoup(game_data["pc_requirements"][req], "html.parser")
-        bb_ul = soup.find("ul")
-        lis = bb_ul.find_all("li")
-
-        reqs[req] = {}
-        os_bit_version = lis[0].text
-
-        if len(os_bit_version.split(':')) < 2:
-            reqs[req]['os_bit_version'] = lis.pop(0).text
-
-        for li in lis:
-            li_split = li.text.split(':')
-
-            if len(li_split) < 2:
-                print(f'Check system requirements in game id: {game_id}')
-                continue
+        reqs.extend(format_requirements(game_id, req, make_soup(game_data["pc_requirements"][req])))
+
+    return SteamGame(
+        appid=game_id,
+        success=True,
+        steamid=game_data.get("steam_appid"),
+        age=game_data.get('required_age', 0),
+        name=game_data.get("name"),
+        short_description=game_data.get('short_description', ''),
+        # через запятую
+        # если нужно, могу разбить в список
+        languages=game_data.get("supported_languages", ""),
+        # разработчики идут списков от 0
+        developers=game_data.get("developers", []),
+        # издатели идут так же списком
+        publishers=game_data.get("publishers", []),
+        website=game_data.get('website', ''),
+        header_image_uri=game_data.get('header_image', ''),
+        screenshots=tuple(Screenshot.from_dict(screenshot) for screenshot in game_data.get('screenshots', [])),
+        long_description=html_description,
+        release_date=date,
+        genres=[genre['description'] for genre in game_data.get('genres', [])],
+        categories=[category['description'] for category in game_data.get('categories', [])],
+        movies=movies,
+        requirements=tuple(reqs),
+        price=format_price(game_data),
+        channel=CHANNEL_API,
+    )
+
+
+def format_requirements(game_id, level: str, tag):
+    # список требований одного уровня: <ul class="bb_ul"><li><strong>OS:</strong> Windows 10</li>...
+    reqs = []
+    bb_ul = tag.find("ul")
+    lis = bb_ul.find_all("li")
+
+    os_bit_version = lis[0].text
+
+    if len(os_bit_version.split(':')) < 2:
+        reqs.append(Requirement(level=level, property='os_bit_version', value=lis.pop(0).text))
+
+    for li in lis:
+        li_split = li.text.split(':')
+
+        if len(li_split) < 2:
+            print(f'Check system requirements in game id: {game_id}')
+            continue
 
-            key = li_split[0].replace('*', '').strip()
-            reqs[req][key] = li_split[1].strip()
+        key = li_split[0].replace('*', '').strip()
+        reqs.append(Requirement(level=level, property=key, value=li_split[1].strip()))
+    return reqs
 
-    my_data[game_id]["requirements"] = reqs
-    return my_data
 
+def is_age_gate(soup):
+    # возрастной фильтр вместо страницы: обычно Steam перенаправляет на /agecheck/app/{id}, но бывает и сразу
+    return soup.find(id='app_agegate') is not None or soup.find(class_='agegate_birthday_selector') is not None
 
-def get_description_text(html):
-    soup = BeautifulSoup(html, 'html.parser')
 
-    if soup is not None:
-        return soup.text
-    else:
+def parse_store_page(game_id, html: str):
+    # Страница store.steampowered.com/app/{id} в записи того же вида, что и format_game_data.
+    # Видео и цены на странице подгружаются скриптами, поэтому их в записи нет.
+    # None - это не страница приложения (Steam отправил на главную или показал возрастной фильтр),
+    # такой appid запрашивается через api
+    soup = make_soup(html)
+    if is_age_gate(soup):
+        return None
+    name = soup.find(id='appHubAppName')
+    if name is None:
         return None
 
+    if soup.find(class_='game_area_dlc_bubble') is not None or soup.find(class_='game_area_soundtrack_bubble'):
+        return {'appid': game_id, 'success': False, 'reason': 'is not game'}
+    if soup.find(class_='game_area_comingsoon') is not None:
+        return {'appid': game_id, 'success': False, 'reason': 'not released'}
+
+    description = soup.find(id='game_area_description')
+    if description is not None:
+        # заголовок «About This Game» есть только на странице, в about_the_game его нет
+        if description.h2 is not None:
+            description.h2.decompose()
+        description = description.decode_contents().strip()
+
+    date = soup.select_one('.release_date .date')
+    date = date.text.strip() if date is not None else ''
+    details = soup.find(class_='details_block')
+    if date == '' and details is not None:
+        match = RELEASE_DATE_PATTERN.search(details.text)
+        date = match[1].strip() if match is not None else ''
+
+    companies = {'Developer': [], 'Publisher': []}
+    for row in soup.find_all(class_='dev_row'):
+        label = row.find('b')
+        role = label.text.strip(' :') if label is not None else ''
+        if role in companies:
+            companies[role].extend(link.text.strip() for link in row.find_all('a'))
+
+    reqs = []
+    sys_req = soup.select_one('.game_area_sys_req[data-os="win"]') or soup.find(class_='game_area_sys_req')
+    if sys_req is not None:
+        for level, column in (('minimum', 'game_area_sys_req_full'), ('minimum', 'game_area_sys_req_leftCol'),
+                              ('recommended', 'game_area_sys_req_rightCol')):
+            tag = sys_req.find(class_=column)
+            if tag is not None and tag.find('ul') is not None:
+                reqs.extend(format_requirements(game_id, level, tag))
+
+    header_image = soup.find('img', class_='game_header_image_full')
+    snippet = soup.find(class_='game_description_snippet')
+    return SteamGame(
+        appid=game_id,
+        success=True,
+        steamid=int(game_id),
+        # без cookie с датой рождения страница с возрастным ограничением не открывается, значит его нет
+        age=0,
+        name=name.text.strip(),
+        short_description=snippet.text.strip() if snippet is not None else '',
+        languages=', '.join(cell.text.strip() for cell in soup.select('#languageTable td.ellipsis')),
+        developers=companies['Developer'],
+        publishers=companies['Publisher'],
+        website='',
+        header_image_uri=header_image['src'] if header_image is not None else '',
+        screenshots=tuple(Screenshot(id=position, path_thumbnail=link.img['src'] if link.img is not None else None,
+                                     path_full=link['href'])
+                          for position, link in enumerate(soup.find_all('a', class_='highlight_screenshot_link'))),
+        long_description=description or '',
+        release_date=date,
+        genres=[link.text.strip() for link in details.select('a[href*="/genre/"]')] if details is not None else [],
+        categories=[label.text.strip() for label in soup.select('.game_area_features_list_ctn .label')],
+        movies=(),
+        requirements=tuple(reqs),
+        price=None,
+        channel=CHANNEL_STORE_PAGE,
+    )
+
+
+def parse_game_data(game_id, text: str):
+    # выполняется в пуле разбора: на воркер передаётся сырой текст ответа, а не разобранный словарь
+    return format_game_data(game_id, json.loads(text))
+
 
 async def get_game_data(game_id: str):
     logging.info(f'Getting game: {game_id}')
-    session_timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
     try:
-        async with aiohttp.ClientSession(timeout=session_timeout) as session:
-            headers = {'Accept-Language': 'en-US'}
-            async with session.get(f"https://store.steampowered.com/api/appdetails?appids={game_id}",
-                                   allow_redirects=False, timeout=10, headers=headers) as response:
-                if response.status == 429:
-                    logging.warning(f"Too many requests: {game_id}")
-                    return {'appid': game_id, 'success': False, 'reason': 'too many requests'}
-
-                text = await response.text()
-
-                if response.status == 200:
-                    response_json = json.loads(text)
-                    return format_game_data(game_id, response_json)
-                else:
-                    response_message = (f'Try getting game: {game_id}\n'
-                                        f'Bad request with status code: {response.status}\n'
-                                        f'Response text: {text}')
-                    logging.error(response_message)
-                    return {'appid': game_id, 'success': False, 'reason': response_message}
-    except asyncio.TimeoutError as e:
+        return await retry_policy.call(fetch_game_data, game_id)
+    except asyncio.TimeoutError:
         logging.warning(f"TimeoutError on game_id: {game_id}")
-        return {'appid': game_id, 'success': False, 'reason': 'timeout error'}
-    except json.JSONDecodeError as e:
+        return {'appid': game_id, 'success': False, 'reason': 'timeout error', 'error': ERROR_TIMEOUT}
+    except Exception as e:
+        reason = str(e) if isinstance(e, FetchError) else repr(e)
+        return {'appid': game_id, 'success': False, 'reason': reason, 'error': classify_error(e)}
+
+
+def channel_wait(limiter: AdaptiveRateLimiter, egress: EgressPool):
+    # с пулом маршрутов скорость канала держат его маршруты, а не ограничитель
+    return egress.expected_wait() if egress is not None else limiter.expected_wait()
+
+
+def choose_channel(game_id: str):
+    # страница магазина - запасной канал: берётся, только когда очередь к appdetails длиннее порога
+    # и у страниц очередь короче. Пока appdetails отвечает без ожидания, все запросы идут в api
+    if store_page_limiter is None or game_id in api_only:
+        return CHANNEL_API
+    api_wait = channel_wait(rate_limiter, api_egress)
+    if api_wait > config['channel_switch_wait'] and channel_wait(store_page_limiter, store_page_egress) < api_wait:
+        return CHANNEL_STORE_PAGE
+    return CHANNEL_API
+
+
+async def fetch_game_data(game_id: str):
+    if choose_channel(game_id) == CHANNEL_STORE_PAGE:
+        game = await fetch_store_page(game_id)
+        if game is not None:
+            channel_counts[CHANNEL_STORE_PAGE] += 1
+            return game
+        # страница не подошла, та же попытка продолжается через api
+        api_only.add(game_id)
+
+    url = f"{config['store_url']}/api/appdetails?appids={game_id}"
+    response = get_client().cached_response(url)
+
+    issued_at = None
+    if response is None:
+        if api_egress is None:
+            issued_at = await rate_limiter.acquire()
+        response = await get_client().fetch(url, allow_redirects=False, egress=api_egress)
+
+    if response.status == 429 or response.status == 503:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if api_egress is None:
+            rate_limiter.on_throttle(retry_after, issued_at)
+        logging.warning(f"Too many requests: {game_id}")
+        raise FetchError(ERROR_THROTTLED, 'too many requests', retry_after)
+
+    if response.status != 200:
+        response_message = (f'Try getting game: {game_id}\n'
+                            f'Bad request with status code: {response.status}\n'
+                            f'Response text: {response.text}')
+        logging.error(response_message)
+        raise error_from_status(response.status, response_message)
+
+    if api_egress is None:
+        rate_limiter.on_success()
+    try:
+        game = await get_executor().run(parse_game_data, game_id, response.text)
+    except json.JSONDecodeError:
         message_error = f'Failed to convert json file: {game_id}'
         logging.error(message_error)
-        return {'appid': game_id, 'success': False, 'reason': message_error}
+        raise FetchError(ERROR_PARSE, message_error)
+    channel_counts[CHANNEL_API] += 1
+    return game
 
 
-async def write_games_info(games: list, below: int, above: int, quantity_write: int):
-    if above <= below:
+async def fetch_store_page(game_id: str):
+    # None - страница не годится (перенаправление на возрастной фильтр или главную), нужен api
+    url = f"{config['store_url']}/app/{game_id}"
+    response = get_client().cached_response(url)
+
+    issued_at = None
+    if response is None:
+        if store_page_egress is None:
+            issued_at = await store_page_limiter.acquire()
+        response = await get_client().fetch(url, allow_redirects=False, egress=store_page_egress)
+
+    if response.status == 429 or response.status == 503:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if store_page_egress is None:
+            store_page_limiter.on_throttle(retry_after, issued_at)
+        logging.warning(f"Too many requests to store page: {game_id}")
+        raise FetchError(ERROR_THROTTLED, 'too many requests', retry_after)
+
+    if response.status != 200:
+        logging.info(f'Store page of game {game_id} is not usable, status code: {response.status}')
+        return None
+
+    if store_page_egress is None:
+        store_page_limiter.on_success()
+    game = await get_executor().run(parse_store_page, game_id, response.text)
+    if game is None:
+        logging.info(f'Store page of game {game_id} has no app data')
+    return game
+
+
+def channel_summary():
+    return (f"channels: appdetails: {channel_counts[CHANNEL_API]}, store page: {channel_counts[CHANNEL_STORE_PAGE]}, "
+            f"api only: {len(api_only)}")
+
+
+def log_channel_rates():
+    logging.info(rate_limiter.summary() if api_egress is None else api_egress.summary())
+    if store_page_limiter is not None:
+        logging.info(store_page_limiter.summary() if store_page_egress is None else store_page_egress.summary())
+        logging.info(channel_summary())
+
+
+async def write_games_info(catalogue: AppCatalogue, loading_task: asyncio.Task, below: int, above: int,
+                           quantity_write: int, concurrency: int):
+    if above is not None and above <= below:
         exception_message = '"above" value cannot be less or equal "below"'
         logging.error(exception_message)
         raise Exception(exception_message)
 
-    if below >= len(games):
-        exception_message = '"below" value cannot be greater than games amount'
+    if quantity_write <= 0:
+        exception_message = '"quantity_write" value cannot be less or equal zero. Recommended value gather 500'
         logging.error(exception_message)
         raise Exception(exception_message)
 
-    if quantity_write <= 0:
-        exception_message = '"quantity_write" value cannot be less or equal zero. Recommended value gather 500'
+    if concurrency <= 0:
+        exception_message = '"concurrency" value cannot be less or equal zero'
         logging.error(exception_message)
         raise Exception(exception_message)
 
-    games_format_data_dict = {}
-    failed_games_list = []
+    shard_bytes = config['shard_size'] * 1024 ** 2 if config['shard_size'] is not None else None
+    success_writer = JsonLinesWriter(path_dir_games, prefix=games_prefix, compression=config['compression'],
+                                     max_records=quantity_write, max_bytes=shard_bytes, fsync_every=None,
+                                     blobs=blob_store)
+    failed_writer = JsonLinesWriter(path_dir_failed_games, prefix=failed_prefix, compression=config['compression'],
+                                    max_records=quantity_write, max_bytes=shard_bytes, fsync_every=None)
+    for_repeat = []
 
     game_counter = 0
-    task_counter = 0
-    tasks = []
-    max_step = 10
-    for index in tqdm(range(below, above), desc='main',
-                      bar_format='{l_bar}{bar:30}{r_bar}{bar:-10b}', position=0):
-        task_counter += 1
-        game_counter += 1
-        tasks.append(get_game_data(str(games[index]["appid"])))
-
-        if task_counter < max_step and index < above - 1:
-            continue
+    progress_bar = tqdm(total=above - below if above is not None else None, desc='main',
+                        bar_format='{l_bar}{bar:30}{r_bar}{bar:-10b}', position=0)
+    if coordinator is not None:
+        game_ids = iter_leased_game_ids(catalogue, loading_task, below, above, progress_bar)
+    else:
+        game_ids = iter_game_ids(catalogue, loading_task, below, above, progress_bar)
 
-        response_games = await asyncio.gather(*tasks, return_exceptions=True)
-        await asyncio.sleep(13)
+    try:
+        async for game_id, game in run_pool(game_ids, get_game_data, concurrency):
+            progress_bar.update()
+            game_counter += 1
 
-        for game in response_games:
-            check_failed_game = game.get('appid', '')
+            if isinstance(game, Exception):
+                game = {'appid': game_id, 'success': False, 'reason': repr(game)}
 
-            if check_failed_game == '':
-                games_format_data_dict.update(game)
+            if config['repeat'] and is_repeatable(game):
+                for_repeat.append(game)
             else:
-                failed_games_list.append(game)
+                write_game_result(game, success_writer, failed_writer)
+
+            if tracker is not None:
+                tracker.result(game_id)
+
+            if game_counter % SYNC_EVERY == 0 or (tracker is not None and len(tracker.finished) > 0):
+                await checkpoint(success_writer, failed_writer, for_repeat)
+
+        await checkpoint(success_writer, failed_writer, for_repeat)
+    finally:
+        success_writer.close()
+        failed_writer.close()
+        progress_bar.close()
+        logging.info(success_writer.summary())
+        logging.info(failed_writer.summary())
+
+
+async def iter_game_ids(catalogue: AppCatalogue, loading_task: asyncio.Task, below: int, above: int,
+                        progress_bar: tqdm):
+    # appid отдаются по мере загрузки списка игр, запросы начинаются до того, как он скачан целиком.
+    # С --negative-cache сразу отдаются только новые appid, остальные - после загрузки списка
+    index = below
+    first_yielded = False
+    scheduler = PriorityScheduler()
+    while above is None or index < above:
+        if index < len(catalogue):
+            appid = catalogue.appids[index]
+            index += 1
+
+            if journal.is_completed(appid):
+                progress_bar.update()
+                continue
+
+            if app_status is not None:
+                priority, checked_at = app_status.priority(appid)
+                if priority == PRIORITY_SKIP:
+                    skip_cached(appid)
+                    progress_bar.update()
+                    continue
+                if priority != PRIORITY_NEW:
+                    scheduler.defer(appid, priority, checked_at)
+                    continue
+
+            if not first_yielded:
+                first_yielded = True
+                logging.info(f'First appid is ready for request after {time.perf_counter() - started_at:.2f}s')
+            yield str(appid)
+        elif loading_task.done():
+            # ошибка загрузки списка пробрасывается сюда
+            loading_task.result()
+            if index < len(catalogue):
+                continue
+
+            if below >= len(catalogue):
+                exception_message = '"below" value cannot be greater than games amount'
+                logging.error(exception_message)
+                raise Exception(exception_message)
+            break
+        else:
+            await asyncio.sleep(0.05)
+
+        if progress_bar.total is None and loading_task.done():
+            progress_bar.total = (above if above is not None else len(catalogue)) - below
+            progress_bar.refresh()
+
+    if len(scheduler) > 0:
+        logging.info(f'New appids are done, {len(scheduler)} known appids are requested by priority')
+    for appid in scheduler.drain():
+        yield str(appid)
+
 
-        if game_counter >= quantity_write or index == above - 1:
-            if config['repeat']:
-                # ready list games for repeat requests
-                for_repeat = [game for game in failed_games_list
-                              if game['reason'] != 'is not game' and game['reason'] != 'not released']
+async def iter_leased_game_ids(catalogue: AppCatalogue, loading_task: asyncio.Task, below: int, above: int,
+                               progress_bar: tqdm):
+    # appid берутся чанками из общего плана, пока невыполненные чанки не кончатся у всех воркеров
+    await loading_task
+    total = (min(above, len(catalogue)) if above is not None else len(catalogue)) - below
+    if total <= 0:
+        exception_message = '"below" value cannot be greater than games amount'
+        logging.error(exception_message)
+        raise Exception(exception_message)
 
-                failed_games_list = [fail for fail in failed_games_list if fail not in for_repeat]
+    if not coordinator.plan(total, config['chunk_size'],
+                            meta={'file': os.path.abspath(config['file']) if config['file'] is not None else None,
+                                  'below': below, 'above': above}):
+        # план уже создан другим воркером: индексы чанков имеют смысл только с его границами списка
+        check_plan_bounds(below, above)
+    progress_bar.total = total
+    progress_bar.refresh()
+    first_yielded = False
+
+    while True:
+        lease = coordinator.lease()
+        if lease is None:
+            if coordinator.unfinished() == 0:
+                return
+            # остальные чанки ещё в работе у других воркеров, их аренда может истечь
+            await asyncio.sleep(min(config['lease_seconds'] / 3, 1))
+            continue
 
-                result = await repeat_get_games(for_repeat)
-                games_format_data_dict.update(result['success'])
-                failed_games_list.extend(result['failed'])
+        if lease.attempt > 1:
+            # чанк не доделал другой воркер: его готовые appid берутся из его журнала
+            for path in glob.glob(os.path.join(current_dir, 'journal-*.jsonl')):
+                journal.merge(path)
 
-            genres_from_games = []
+        logging.info(f'Leased chunk {lease.chunk_id}: {lease.start}-{lease.end}, attempt {lease.attempt}')
+        for index in range(below + lease.start, below + lease.end):
+            appid = str(catalogue.appids[index])
 
-            for game in games_format_data_dict:
-                genres_from_games = genres_from_games + [genre for genre in games_format_data_dict[game]['genres']
-                                                         if genre not in genres_from_games]
+            if journal.is_completed(appid) or appid in tracker.chunk_of:
+                progress_bar.update()
+                continue
 
-            update_genres(genres_from_games)
+            # чанки плана идут по порядку списка, поэтому здесь свежие не-игры только пропускаются, без приоритетов
+            if app_status is not None and app_status.priority(appid)[0] == PRIORITY_SKIP:
+                skip_cached(appid)
+                progress_bar.update()
+                continue
 
-            write_json_file(games_format_data_dict, os.path.join(path_dir_games, str(uuid.uuid4()) + '.json'))
-            games_format_data_dict.clear()
+            if not first_yielded:
+                first_yielded = True
+                logging.info(f'First appid is ready for request after {time.perf_counter() - started_at:.2f}s')
+            tracker.add(lease.chunk_id, appid)
+            yield appid
+        tracker.seal(lease.chunk_id)
 
-            write_json_file(failed_games_list, os.path.join(path_dir_failed_games, str(uuid.uuid4()) + '.json'))
-            failed_games_list.clear()
 
-            game_counter = 0
+def plan_bounds():
+    # границы списка, с которыми построен план, или None, если плана ещё нет
+    below = coordinator.get_meta('below')
+    if below is None:
+        return None
+    above = coordinator.get_meta('above')
+    return int(below), int(above) if above is not None else None
 
-        task_counter = 0
-        tasks.clear()
+
+def check_plan_bounds(below: int, above: int):
+    bounds = plan_bounds()
+    if bounds is not None and bounds != (below, above):
+        exception_message = (f'Work plan is built for below {bounds[0]} and above {bounds[1]}, '
+                             f'worker is started with below {below} and above {above}')
+        logging.error(exception_message)
+        raise Exception(exception_message)
+
+
+def skip_cached(appid):
+    # appid не запрашивается: для дельты игра не пропала, просто не проверялась в этот раз
+    if change_tracker is not None:
+        change_tracker.keep(appid)
+
+
+async def send_heartbeats():
+    while True:
+        await asyncio.sleep(config['lease_seconds'] / 3)
+        lost = coordinator.heartbeat(tracker.active())
+        if len(lost) > 0:
+            logging.warning(f'Leases lost for chunks {lost}, their appids may be requested twice')
+
+
+def is_repeatable(game):
+    if isinstance(game, SteamGame):
+        return False
+    reason = game.get('reason')
+    if game.get('error') == ERROR_PERMANENT or game.get('error') == ERROR_PARSE:
+        return False
+    return game.get('appid', '') != '' and reason != 'is not game' and reason != 'not released'
+
+
+def is_delisted(game):
+    # success: false или null от appdetails - ответ о самом приложении (снято или удалено), а не сбой запроса
+    return 'error' not in game and game.get('reason') == 'unknown'
+
+
+def write_game_result(game, success_writer: JsonLinesWriter, failed_writer: JsonLinesWriter):
+    if app_status is not None:
+        app_status.record(game.appid if isinstance(game, SteamGame) else game['appid'], game)
+
+    if isinstance(game, SteamGame):
+        game.genre_ids = taxonomy.encode('genres', game.genres, 'steam')
+        game.category_ids = taxonomy.encode('categories', game.categories, 'steam')
+        success_writer.write(game)
+        if game_store is not None or change_tracker is not None:
+            # словарь со всеми полями нужен только хранилищу и дельте
+            record = game.to_dict()
+            if game_store is not None:
+                game_store.add('steam', record)
+            if change_tracker is not None:
+                # на странице магазина нет цены, видео и сайта: для дельты они неизвестны, а не пропали
+                change_tracker.observe(game.appid, record,
+                                       STORE_PAGE_UNKNOWN if game.channel == CHANNEL_STORE_PAGE else ())
+        journal.record_result(game)
+        RESULTS.inc(source='steam', state=STATE_OK, error='')
+    else:
+        failed_writer.write(game)
+        journal.record_result(game)
+
+        state, reason = state_from_result(game)
+        RESULTS.inc(source='steam', state=state, error=game.get('error', ''))
+        if state == STATE_FAILED:
+            dead_letters.add(game['appid'], game.get('error', ERROR_PERMANENT), reason)
+            if change_tracker is not None:
+                if is_delisted(game):
+                    change_tracker.remove(game['appid'])
+                else:
+                    change_tracker.keep(game['appid'])
+
+
+async def checkpoint(success_writer: JsonLinesWriter, failed_writer: JsonLinesWriter, for_repeat: list):
+    if len(for_repeat) > 0:
+        result = await repeat_get_games(for_repeat)
+        for game in result['success']:
+            write_game_result(game, success_writer, failed_writer)
+        for failed_game in result['failed']:
+            write_game_result(failed_game, success_writer, failed_writer)
+        for_repeat.clear()
+
+    # справочник переписывается, только если появились новые жанры или категории
+    save_taxonomy()
+
+    # в журнал попадают только уже записанные на диск игры, чтобы после падения их не потерять
+    success_writer.sync()
+    failed_writer.sync()
+    if game_store is not None:
+        game_store.flush()
+    if change_tracker is not None:
+        change_tracker.flush()
+    if app_status is not None:
+        app_status.flush()
+    if get_client().cache is not None:
+        get_client().cache.flush()
+    dead_letters.sync()
+    journal.sync()
+
+    # чанк отмечается выполненным только после того, как его результаты сброшены на диск
+    if tracker is not None:
+        for chunk_id in tracker.take_finished():
+            coordinator.complete(chunk_id)
+
+    log_channel_rates()
+    logging.info(get_executor().stats.summary())
+    logging.info(f'Retries: {retry_policy.stats.summary()}')
+
+
+def save_taxonomy():
+    # outputs/steam/genres.json - прежний список жанров Steam для тех, кто читает его напрямую
+    if taxonomy.save():
+        taxonomy.export_names('genres', 'steam', os.path.join(outputs_dir, 'genres.json'))
 
 
 async def repeat_get_games(games: list):
     logging.debug('Repeat getting failed games')
     again_failed = []
-    success_games = {}
+    success_games = []
 
-    for raw_game in tqdm(games, desc='repeat',
-                         bar_format='{l_bar}{bar:30}{r_bar}{bar:-10b}', position=1, leave=False):
-        format_game = await get_game_data(raw_game['appid'])
-        await asyncio.sleep(1.1)
+    game_ids = [raw_game['appid'] for raw_game in games]
+    progress_bar = tqdm(total=len(game_ids), desc='repeat',
+                        bar_format='{l_bar}{bar:30}{r_bar}{bar:-10b}', position=1, leave=False)
 
-        try_game_id = format_game.get(raw_game['appid'], '')
+    # повторы идут тем же пулом, что и основной обход, под общим ограничителем скорости
+    async for game_id, format_game in run_pool(game_ids, get_game_data, config['concurrency']):
+        progress_bar.update()
 
-        if try_game_id == '':
-            again_failed.append(format_game)
+        if isinstance(format_game, Exception):
+            format_game = {'appid': game_id, 'success': False, 'reason': repr(format_game),
+                           'error': classify_error(format_game)}
+
+        if isinstance(format_game, SteamGame):
+            success_games.append(format_game)
         else:
-            success_games.update(format_game)
+            again_failed.append(format_game)
 
+    progress_bar.close()
     return {'success': success_games, 'failed': again_failed}
 
 
@@ -308,11 +777,10 @@ def read_json_file(path_file: str):
 async def get_steam_html():
     logging.info(f'Getting all genres')
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {'Accept-Language': 'en-US'}
-            async with session.get('https://store.steampowered.com/', headers=headers,
-                                   allow_redirects=False) as response:
-                return await response.text()
+        # главная - тоже страница магазина, с пулом маршрутов идёт по маршрутам своего канала
+        response = await get_client().fetch(f"{config['store_url']}/", allow_redirects=False,
+                                            egress=store_page_egress if store_page_egress is not None else api_egress)
+        return response.text
     except asyncio.TimeoutError as timeout_error:
         message_error = f'Timeout error getting genres'
         logging.error(message_error)
@@ -320,7 +788,7 @@ async def get_steam_html():
 
 
 def scrape_genres(html: str):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html, class_strainer('popup_genre_expand_content'))
     genres = []
 
     # Находим все элементы с классом "popup_genre_expand_content"
@@ -338,18 +806,10 @@ def scrape_genres(html: str):
     return genres
 
 
-def update_genres(genres: list):
-    path_genres_json_file = os.path.join(outputs_dir, 'genres.json')
-    genres_from_file = read_json_file(path_genres_json_file)
-
-    if genres_from_file is not None:
-        genres = list(set(genres_from_file) | set(genres))
-
-    write_json_file(genres, path_genres_json_file)
-    return genres
-
-
 async def main():
+    global started_at
+    started_at = time.perf_counter()
+
     logging.info(f'Program started with params:\n'
                  f'\t\t\t\tabove: {config['above']}\n'
                  f'\t\t\t\tbelow: {config['below']}\n'
@@ -357,33 +817,214 @@ async def main():
                  f'\t\t\t\tfile: {config['file']}\n'
                  f'\t\t\t\trepeat: {config['repeat']}\n')
 
+    load_run_params()
+    if coordinator is not None and config['file'] is None:
+        # второй и следующие воркеры берут список игр, по которому построен план
+        config['file'] = coordinator.get_meta('file')
+        if config['file'] is None and config['replay'] is None:
+            exception_message = '"file" value is required for the first worker of the work plan'
+            logging.error(exception_message)
+            raise Exception(exception_message)
+    if coordinator is not None and plan_bounds() is not None:
+        # без -b и -a воркер берёт границы плана, с другими явными границами не запускается
+        below, above = plan_bounds()
+        if config['below'] is None and config['above'] is None:
+            config['below'], config['above'] = below, above
+        check_plan_bounds(config['below'] if config['below'] is not None else 0, config['above'])
     path_json_file = config['file'] if config['file'] is not None else ''
 
     html = await get_steam_html()
 
     if html is not None:
-        genres = scrape_genres(html)
-        all_genres = update_genres(genres)
+        taxonomy.encode('genres', scrape_genres(html), 'steam')
+        save_taxonomy()
+
+    b = config['below'] if config['below'] is not None else 0
+    a = config['above']
+    q = config['quantity_write'] if config['quantity_write'] is not None else 1000
 
-    if path_json_file != '':
+    write_run_params(b, a, q, path_json_file)
+
+    catalogue = AppCatalogue()
+    loading_task = asyncio.create_task(load_games(path_json_file, catalogue, b, a, q))
+    metrics_task = asyncio.create_task(write_metrics_periodically(os.path.join(current_dir, f'metrics{suffix}.prom'),
+                                                                  config['metrics_interval']))
+    heartbeat_task = asyncio.create_task(send_heartbeats()) if coordinator is not None else None
+    metrics_server = None
+    if config['metrics_port'] is not None:
+        metrics_server = await start_metrics_server(config['metrics_host'], config['metrics_port'])
+
+    try:
+        await write_games_info(catalogue, loading_task, b, a, q, config['concurrency'])
+
+        # пропавшие игры видны только по полному обходу одним процессом
+        if change_tracker is not None and b == 0 and a is None and config['replay'] is None \
+                and coordinator is None:
+            change_tracker.emit_removed()
+    finally:
+        loading_task.cancel()
+        metrics_task.cancel()
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
+            # недоделанные чанки сразу возвращаются в план, не дожидаясь истечения аренды
+            for chunk_id in tracker.active():
+                coordinator.release(chunk_id)
+            logging.info(f'Work plan: {coordinator.summary()}')
+            coordinator.close()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        log_channel_rates()
+        logging.info(f'Taxonomy: {taxonomy.summary()}')
+        logging.info(f'Retries: {retry_policy.stats.summary()}, dead letters: {dead_letters.count}')
+        dead_letters.close()
+        journal.close()
+        if game_store is not None:
+            game_store.close()
+        if change_tracker is not None:
+            change_tracker.close()
+        if blob_store is not None:
+            blob_store.close()
+        if app_status is not None:
+            app_status.close()
+        close_executor()
+        await close_client()
+
+
+async def load_games(path_json_file: str, catalogue: AppCatalogue, below: int, above: int, quantity_write: int):
+    # список загружается целиком в фоне, независимо от того, как быстро идут запросы по играм
+    loading_started_at = time.perf_counter()
+
+    if config['replay'] is not None:
+        logging.info(f"Replaying dead letters from {config['replay']}")
+        for key in read_dead_letters(config['replay']):
+            catalogue.add(int(key), '')
+    elif path_json_file != '':
         logging.info(f'Getting list of games from file {path_json_file}')
-        games = read_json_file(path_json_file)
+        async for appid, name in stream_apps_from_file(path_json_file):
+            catalogue.add(appid, name)
     else:
         logging.info(f'Getting list of games from url')
-        games = get_all_games()
-        write_json_file(games, os.path.join(outputs_dir, 'games.json'))
+        all_games_writer = AppListWriter(os.path.join(outputs_dir, 'games.json'))
+        # список сохраняется в папку запуска, чтобы --resume продолжил по тому же списку
+        run_games_writer = AppListWriter(os.path.join(current_dir, f'games{suffix}.json'))
 
-        games = [game for game in games if game['name'] != '']
-        logging.debug(f"Found games amount: {len(games)}")
+        try:
+            async for appid, name in stream_apps_from_url(get_client(), config['app_list_url']):
+                all_games_writer.write(appid, name)
+                if name != '':
+                    run_games_writer.write(appid, name)
+                    catalogue.add(appid, name)
+        except BaseException:
+            all_games_writer.abort()
+            run_games_writer.abort()
+            raise
+
+        all_games_writer.close()
+        run_games_writer.close()
+        config['file'] = run_games_writer.path
+        write_run_params(below, above, quantity_write, run_games_writer.path)
+
+    logging.debug(f"Found games amount: {len(catalogue)}")
+    logging.info(f'List of games loaded in {time.perf_counter() - loading_started_at:.2f}s, '
+                 f'catalogue memory: {catalogue.memory_bytes() / 1024 ** 2:.1f}MB, '
+                 f'peak RSS: {peak_rss_mb():.1f}MB')
 
-    b = config['below'] if config['below'] is not None else 0
-    a = config['above'] if config['above'] is not None else len(games)
-    q = config['quantity_write'] if config['quantity_write'] is not None else 1000
 
-    await write_games_info(games, b, a, q)
+def write_run_params(below: int, above: int, quantity_write: int, path_json_file: str):
+    write_json_file({'below': below, 'above': above, 'quantity_write': quantity_write,
+                     'file': path_json_file if path_json_file != '' else None}, path_run_params)
+
+
+def load_run_params():
+    # при возобновлении параметры берутся из прерванного запуска, если не заданы явно
+    if config['resume'] is None:
+        return
+
+    run_params = read_json_file(path_run_params)
+    if run_params is None:
+        return
+
+    for key in ('below', 'above', 'quantity_write', 'file'):
+        if config[key] is None:
+            config[key] = run_params.get(key)
+
+    logging.info(f'Resuming run {current_dir}, completed appids: {journal.completed_count()}')
 
 
 if __name__ == "__main__":
+    args = parser.parse_args()
+    config = vars(args)
+
+    rate_limiter = AdaptiveRateLimiter(rate=config['rate'], max_rate=config['max_rate'], name='appdetails')
+    if config['store_page_channel']:
+        store_page_limiter = AdaptiveRateLimiter(rate=config['store_page_rate'], max_rate=config['store_page_max_rate'],
+                                                 name='store_page')
+
+    # output setting
+    now = datetime.now().strftime('%d-%m-%Y %H-%M-%S')
+    outputs_dir = os.path.join(os.getcwd(), 'outputs', 'steam')
+    current_dir = config['resume'] if config['resume'] is not None else os.path.join(outputs_dir, now)
+    # у воркеров общего плана одна папка вывода рядом с файлом плана, а журнал, шарды и логи свои
+    suffix = ''
+    if config['coordinator'] is not None:
+        current_dir = os.path.dirname(os.path.abspath(config['coordinator']))
+        suffix = f"-{config['worker_id']}"
+    games_prefix = f'games{suffix}'
+    failed_prefix = f'failed{suffix}'
+    path_dir_games = os.path.join(current_dir, 'successful')
+    path_dir_failed_games = os.path.join(current_dir, 'failed')
+    path_run_params = os.path.join(current_dir, f'run{suffix}.json')
+
+    os.makedirs(outputs_dir, exist_ok=True)
+    os.makedirs(path_dir_games, exist_ok=True)
+    os.makedirs(path_dir_failed_games, exist_ok=True)
+
+    # logging setting
+    dir_logs = os.path.join(current_dir, 'logs')
+    os.makedirs(dir_logs, exist_ok=True)
+
+    logging.basicConfig(filename=os.path.join(dir_logs, f'logs{suffix}-{now}.log'), encoding='utf-8',
+                        format='%(asctime)s.%(msecs)03d %(message)s', datefmt='%d-%m-%Y %H:%M:%S', level=logging.DEBUG)
+
+    journal = CrawlJournal(os.path.join(current_dir, f'journal{suffix}.jsonl'))
+    dead_letters = DeadLetterQueue(os.path.join(current_dir, f'dead_letter{suffix}.jsonl'))
+    retry_policy = RetryPolicy(config['retries'], config['retry_delay'], config['retry_max_delay'])
+    taxonomy = Taxonomy(os.path.join(os.getcwd(), 'outputs', 'taxonomy.json'))
+    if config['store'] is not None:
+        game_store = GameStore(config['store'])
+    if config['delta']:
+        change_tracker = ChangeTracker(os.path.join(os.getcwd(), 'outputs', 'content_hashes.sqlite'), 'steam',
+                                       os.path.basename(current_dir), os.path.join(current_dir, f'delta{suffix}'),
+                                       config['compression'], ignored_fields=('channel',))
+    if config['negative_cache']:
+        app_status = AppStatusCache(os.path.join(os.getcwd(), 'outputs', 'app_status.sqlite'),
+                                    {KIND_NOT_GAME: config['not_game_ttl'],
+                                     KIND_NOT_RELEASED: config['not_released_ttl'],
+                                     KIND_NO_DATA: config['no_data_ttl']})
+    if config['blobs']:
+        blob_store = BlobStore(os.path.join(os.getcwd(), 'outputs', 'blobs.sqlite'))
+    recover_parts(path_dir_games, games_prefix if suffix != '' else None)
+    recover_parts(path_dir_failed_games, failed_prefix if suffix != '' else None)
+
+    if config['coordinator'] is not None:
+        coordinator = LeaseCoordinator(config['coordinator'], config['worker_id'], config['lease_seconds'])
+        tracker = ChunkTracker(coordinator)
+
+    if config['cache']:
+        get_client().cache = open_cache(os.path.join(os.getcwd(), 'outputs', 'http_cache.sqlite'),
+                                        config['cache_ttl'], config['cache_size'])
+    if config['egress'] is not None:
+        # маршруты те же, но у каждого канала свои скорости: 429 страниц магазина не тормозит appdetails
+        api_egress = EgressPool(config['egress'], config['rate'], config['max_rate'], config['egress_cooldown'],
+                                channel=CHANNEL_API)
+        if store_page_limiter is not None:
+            store_page_egress = EgressPool(config['egress'], config['store_page_rate'], config['store_page_max_rate'],
+                                           config['egress_cooldown'], channel=CHANNEL_STORE_PAGE)
+
+    set_backend(config['html_parser'])
+    if config['parse_executor'] != 'inline':
+        open_executor(config['parse_executor'], config['parse_workers'])
+
     message = f'Program has been run at {now}\n'
     print(message)
     logging.info(message)
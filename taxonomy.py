@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import sys
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+KINDS = ('genres', 'categories')
+
+
+@contextmanager
+def file_lock(path: str):
+    # блокировка между процессами на время чтения и перезаписи справочника
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_json_atomic(data, path: str):
+    # у каждого процесса свой временный файл: файл могут сохранять несколько воркеров сразу
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+
+class Taxonomy:
+    # Справочник жанров и категорий Steam и byrutor. У каждого имени компактный id (номер в списке),
+    # эти id пишутся в записи игр (genre_ids, category_ids), имена интернируются, поиск по имени - словарь.
+    # Новое имя сразу записывается в файл под блокировкой, вместе с именами других процессов, поэтому
+    # выданный id одинаков у всех воркеров и не меняется. Источники имён пишутся на диск только в save().
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.names = {kind: [] for kind in KINDS}
+        self.ids = {kind: {} for kind in KINDS}
+        self.sources = {kind: [] for kind in KINDS}
+        self.dirty = False
+        self._merge_saved()
+        if len(self.names['genres']) + len(self.names['categories']) > 0:
+            logging.info(f'Taxonomy loaded: {self.summary()}')
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _insert(self, kind: str, name: str):
+        term_id = len(self.names[kind])
+        name = sys.intern(name)
+        self.ids[kind][name] = term_id
+        self.names[kind].append(name)
+        self.sources[kind].append(set())
+        return term_id
+
+    def _merge_saved(self):
+        # в файле все имена, которые выдали id другие процессы, в порядке id; свои имена уже в нём же,
+        # так что новые из файла дописываются в конец, а источники объединяются
+        data = self._read()
+        if data is None:
+            return
+
+        for kind in KINDS:
+            for entry in data.get(kind, []):
+                term_id = self.ids[kind].get(entry['name'])
+                if term_id is None:
+                    term_id = self._insert(kind, entry['name'])
+                self.sources[kind][term_id].update(entry.get('sources', []))
+
+    def _write(self):
+        data = {kind: [{'id': term_id, 'name': name, 'sources': sorted(sources)}
+                       for term_id, (name, sources) in enumerate(zip(self.names[kind], self.sources[kind]))]
+                for kind in KINDS}
+        write_json_atomic(data, self.path)
+
+    def _reserve(self, kind: str, name: str):
+        with file_lock(self.lock_path):
+            self._merge_saved()
+            term_id = self.ids[kind].get(name)
+            if term_id is None:
+                term_id = self._insert(kind, name)
+                self._write()
+        return term_id
+
+    def add(self, kind: str, name: str, source: str):
+        term_id = self.ids[kind].get(name)
+        if term_id is None:
+            term_id = self._reserve(kind, name)
+
+        if source not in self.sources[kind][term_id]:
+            self.sources[kind][term_id].add(source)
+            self.dirty = True
+
+        return term_id
+
+    def encode(self, kind: str, names: list, source: str):
+        return tuple(self.add(kind, name, source) for name in names)
+
+    def decode(self, kind: str, term_ids: list):
+        return [self.names[kind][term_id] for term_id in term_ids]
+
+    def names_of(self, kind: str, source: str = None):
+        return [name for name, sources in zip(self.names[kind], self.sources[kind])
+                if source is None or source in sources]
+
+    def save(self):
+        if not self.dirty:
+            return False
+
+        with file_lock(self.lock_path):
+            self._merge_saved()
+            self._write()
+        self.dirty = False
+        return True
+
+    def export_names(self, kind: str, source: str, path: str):
+        # простой список имён одного источника, как прежний outputs/steam/genres.json
+        write_json_atomic(self.names_of(kind, source), path)
+
+    def summary(self):
+        return ', '.join(f'{kind}: {len(self.names[kind])}' for kind in KINDS)
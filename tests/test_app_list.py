@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from app_list import AppCatalogue, AppListParser, AppListWriter, read_apps_from_file, stream_apps_from_file
+
+
+APPS = [{'appid': appid, 'name': f'Игра "{appid}" [{appid}]'} for appid in range(1, 50)]
+
+
+def test_objects_split_across_chunks_are_parsed():
+    text = json.dumps({'applist': {'apps': APPS}}, ensure_ascii=False)
+    for size in (1, 7, 64, len(text)):
+        parser = AppListParser()
+        apps = []
+        for position in range(0, len(text), size):
+            apps.extend(parser.feed(text[position:position + size]))
+        assert apps == APPS
+        assert parser.finished
+
+
+def test_written_list_is_streamed_back(tmp_path):
+    path = str(tmp_path / 'games.json')
+    writer = AppListWriter(path)
+    for app in APPS:
+        writer.write(app['appid'], app['name'])
+    writer.close()
+
+    expected = [(app['appid'], app['name']) for app in APPS]
+    assert list(read_apps_from_file(path)) == expected
+
+    async def collect():
+        return [app async for app in stream_apps_from_file(path)]
+
+    assert asyncio.run(collect()) == expected
+
+
+def test_aborted_list_keeps_the_previous_one(tmp_path):
+    path = str(tmp_path / 'games.json')
+    writer = AppListWriter(path)
+    writer.write(1, 'Old')
+    writer.close()
+
+    writer = AppListWriter(path)
+    writer.write(2, 'New')
+    writer.abort()
+    assert list(read_apps_from_file(path)) == [(1, 'Old')]
+
+
+def test_catalogue_interns_names():
+    catalogue = AppCatalogue()
+    catalogue.add(10, ''.join(['Counter', '-Strike']))
+    catalogue.add(20, ''.join(['Counter-', 'Strike']))
+    assert list(catalogue) == [(10, 'Counter-Strike'), (20, 'Counter-Strike')]
+    assert catalogue.names[0] is catalogue.names[1]
+    assert len(catalogue) == 2 and catalogue.memory_bytes() > 0
+
+
+def test_synchronous_reader_works_inside_event_loop_and_stops_early(tmp_path):
+    path = str(tmp_path / 'games.json')
+    writer = AppListWriter(path)
+    for app in APPS:
+        writer.write(app['appid'], app['name'])
+    writer.close()
+
+    async def read_inside_loop():
+        return list(read_apps_from_file(path))
+
+    assert asyncio.run(read_inside_loop()) == [(app['appid'], app['name']) for app in APPS]
+
+    apps = read_apps_from_file(path)
+    assert next(apps) == (1, APPS[0]['name'])
+    apps.close()
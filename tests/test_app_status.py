@@ -0,0 +1,46 @@
+from app_status import (KIND_GAME, KIND_NO_DATA, KIND_NOT_GAME, KIND_NOT_RELEASED, PRIORITY_NEGATIVE,
+                        PRIORITY_NEW, PRIORITY_SKIP, PRIORITY_STALE, AppStatusCache, PriorityScheduler,
+                        kind_from_result)
+from records import SteamGame
+
+
+def test_kind_from_result():
+    assert kind_from_result(SteamGame(appid=10)) == KIND_GAME
+    assert kind_from_result({'appid': 10, 'reason': 'is not game'}) == KIND_NOT_GAME
+    assert kind_from_result({'appid': 10, 'reason': 'not released'}) == KIND_NOT_RELEASED
+    assert kind_from_result({'appid': 10, 'reason': 'unknown'}) == KIND_NO_DATA
+    # временные ошибки не кэшируются
+    assert kind_from_result({'appid': 10, 'reason': 'unknown', 'error': '429'}) is None
+
+
+def test_fresh_negatives_are_skipped_and_expired_ones_requeued(tmp_path):
+    path = str(tmp_path / 'status.sqlite')
+    cache = AppStatusCache(path, {KIND_NOT_GAME: 30, KIND_NOT_RELEASED: 1})
+    cache.record(10, SteamGame(appid=10))
+    cache.record(20, {'appid': 20, 'reason': 'is not game'})
+    cache.record(30, {'appid': 30, 'reason': 'not released'})
+    cache.record(40, {'appid': 40, 'error': 'timeout'})
+    cache.close()
+    # «не вышла» проверена 2 дня назад, срок - 1 день
+    cache = AppStatusCache(path, {KIND_NOT_GAME: 30, KIND_NOT_RELEASED: 1})
+    cache.connection.execute('UPDATE apps SET checked_at = checked_at - 2 * 86400 WHERE appid = 30')
+
+    assert cache.priority(10)[0] == PRIORITY_STALE
+    assert cache.priority(20)[0] == PRIORITY_SKIP
+    assert cache.priority(30)[0] == PRIORITY_NEGATIVE
+    assert cache.priority(40) == (PRIORITY_NEW, 0.0)
+    assert cache.counts == {'new': 1, 'stale': 1, 'expired': 1, 'skipped': 1}
+    assert cache.skipped == {KIND_NOT_GAME: 1}
+    cache.close()
+
+
+def test_scheduler_drains_by_priority_then_oldest_check():
+    scheduler = PriorityScheduler()
+    scheduler.defer(1, PRIORITY_NEGATIVE, 10.0)
+    scheduler.defer(2, PRIORITY_STALE, 300.0)
+    scheduler.defer(3, PRIORITY_STALE, 100.0)
+    scheduler.defer(4, PRIORITY_NEGATIVE, 5.0)
+    assert len(scheduler) == 4
+
+    assert list(scheduler.drain()) == [3, 2, 4, 1]
+    assert len(scheduler) == 0
@@ -0,0 +1,43 @@
+import json
+import pickle
+
+from blob_store import BlobStore
+from records import LAZY_MIN_BYTES, LazyText, SteamGame
+
+
+DESCRIPTION = '<p>' + 'Описание игры. ' * 200 + '</p>'
+
+
+def test_long_text_is_compressed_with_its_size():
+    lazy = LazyText(DESCRIPTION)
+    literal = json.dumps(DESCRIPTION, ensure_ascii=False, separators=(',', ':'))
+    assert lazy.size == len(literal.encode('utf-8'))
+    assert len(lazy) < lazy.size
+    assert lazy.text == DESCRIPTION
+
+    copy = pickle.loads(pickle.dumps(lazy))
+    assert (copy.digest, copy.size, copy.text) == (lazy.digest, lazy.size, DESCRIPTION)
+
+
+def test_short_text_stays_inline():
+    lazy = LazyText('<p>short</p>')
+    assert lazy.digest is None and lazy.size is None
+    assert len(lazy.literal()) < LAZY_MIN_BYTES
+
+
+def test_descriptions_are_stored_once_and_resolved(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs.sqlite'))
+    first, second = (SteamGame(appid=appid, success=True, long_description=DESCRIPTION, screenshots=(), movies=(),
+                               requirements=()) for appid in ('10', '20'))
+    lines = [json.loads(game.to_json(store)) for game in (first, second)]
+    store.close()
+
+    assert lines[0]['long_description'] == lines[1]['long_description']
+    assert store.stats['stored'] == 1 and store.stats['deduplicated'] == 1
+
+    store = BlobStore(str(tmp_path / 'blobs.sqlite'))
+    size = store.connection.execute('SELECT size FROM blobs').fetchone()[0]
+    assert size == first.long_description.size
+    assert store.resolve(lines[0])['long_description'] == DESCRIPTION
+    assert 'Описание игры.' in store.get_text(lines[1]['long_description']['$blob'])
+    store.close()
@@ -0,0 +1,61 @@
+import asyncio
+
+from aiohttp import web
+
+import byrutor_scraper
+import http_client
+from http_client import HttpClient, close_client
+from mock_server import create_app
+from retry import RetryPolicy
+
+
+def discover(monkeypatch, last_page: int, broken_pages=()):
+    @web.middleware
+    async def break_pages(request: web.Request, handler):
+        if request.path in broken_pages:
+            return web.Response(status=500, text='Server error')
+        return await handler(request)
+
+    async def run():
+        app = create_app(rate=0, pages=3)
+        app.middlewares.append(break_pages)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        monkeypatch.setattr(http_client, '_client', HttpClient(trust_env=False))
+        monkeypatch.setattr(byrutor_scraper, 'config', {'site_url': f'http://127.0.0.1:{port}/byrutor',
+                                                        'replay': None}, raising=False)
+        monkeypatch.setattr(byrutor_scraper, 'egress', None, raising=False)
+        monkeypatch.setattr(byrutor_scraper, 'retry_policy', RetryPolicy(1, 0.01, 0.01), raising=False)
+
+        stats = {'pages': 0, 'found': 0, 'failed_pages': 0}
+        try:
+            links = [link async for link in byrutor_scraper.discover_game_links(last_page, 3, stats)]
+        finally:
+            await close_client()
+            await runner.cleanup()
+        return links, stats
+
+    return asyncio.run(run())
+
+
+def test_listing_pages_are_discovered_without_duplicates(monkeypatch):
+    links, stats = discover(monkeypatch, 3)
+    # соседние страницы списка повторяют по две игры
+    assert stats == {'pages': 3, 'found': 72, 'failed_pages': 0}
+    assert len(links) == len(set(links)) == 68
+    assert all(link.startswith('http://127.0.0.1:') for link in links)
+    assert byrutor_scraper.removals_known(stats)
+
+
+def test_failed_listing_page_blocks_removed_games(monkeypatch):
+    links, stats = discover(monkeypatch, 3, broken_pages=('/byrutor/page/2/',))
+    # ошибка страницы не останавливает обход остальных
+    assert stats == {'pages': 3, 'found': 48, 'failed_pages': 1}
+    # без второй страницы первая и третья не пересекаются
+    assert len(links) == len(set(links)) == 48
+    # игры с неоткрывшейся страницы не должны попасть в дельту как удалённые
+    assert not byrutor_scraper.removals_known(stats)
@@ -0,0 +1,96 @@
+import glob
+import os
+
+from change_tracker import OP_ADDED, OP_CHANGED, OP_REMOVED, ChangeTracker
+from output_writer import read_records
+
+
+def run(tmp_path, run_id):
+    return ChangeTracker(str(tmp_path / 'hashes.sqlite'), 'steam', run_id, str(tmp_path / run_id))
+
+
+def delta(tmp_path, run_id):
+    records = []
+    for path in sorted(glob.glob(os.path.join(str(tmp_path / run_id), 'delta*'))):
+        records.extend(read_records(path))
+    return [(record['op'], record['key'], record['changed_fields']) for record in records]
+
+
+def test_added_changed_and_unchanged_records(tmp_path):
+    tracker = run(tmp_path, '1')
+    tracker.observe(10, {'name': 'Portal', 'price': 100})
+    tracker.observe(20, {'name': 'Dota', 'price': 0})
+    tracker.close()
+
+    tracker = run(tmp_path, '2')
+    tracker.observe(10, {'name': 'Portal', 'price': 50})
+    tracker.observe(20, {'price': 0, 'name': 'Dota'})
+    tracker.close()
+
+    assert delta(tmp_path, '1') == [(OP_ADDED, '10', []), (OP_ADDED, '20', [])]
+    assert delta(tmp_path, '2') == [(OP_CHANGED, '10', ['price'])]
+    assert tracker.counts['unchanged'] == 1
+
+
+def test_unseen_records_are_removed_after_full_crawl(tmp_path):
+    tracker = run(tmp_path, '1')
+    for key in (10, 20, 30):
+        tracker.observe(key, {'name': str(key)})
+    tracker.close()
+
+    tracker = run(tmp_path, '2')
+    tracker.observe(10, {'name': '10'})
+    # временная ошибка: запись не пропала
+    tracker.keep(20)
+    tracker.emit_removed()
+    tracker.close()
+
+    assert delta(tmp_path, '2') == [(OP_REMOVED, '30', [])]
+
+
+def test_delisted_record_is_removed_at_once(tmp_path):
+    tracker = run(tmp_path, '1')
+    tracker.observe(10, {'name': 'Portal'})
+    tracker.close()
+
+    tracker = run(tmp_path, '2')
+    tracker.remove(10)
+    # неизвестный ключ в дельту не попадает
+    tracker.remove(99)
+    tracker.close()
+    assert delta(tmp_path, '2') == [(OP_REMOVED, '10', [])]
+
+    tracker = run(tmp_path, '3')
+    tracker.observe(10, {'name': 'Portal'})
+    tracker.close()
+    assert delta(tmp_path, '3') == [(OP_ADDED, '10', [])]
+
+
+def test_fields_unknown_to_a_channel_are_not_changes(tmp_path):
+    def channel_run(run_id):
+        return ChangeTracker(str(tmp_path / 'hashes.sqlite'), 'steam', run_id, str(tmp_path / run_id),
+                             ignored_fields=('channel',))
+
+    api = {'name': 'Portal', 'price': 100, 'movies': [1], 'channel': 'appdetails'}
+    page = {'name': 'Portal', 'price': None, 'movies': [], 'channel': 'store_page'}
+
+    tracker = channel_run('1')
+    tracker.observe(10, api)
+    tracker.close()
+
+    tracker = channel_run('2')
+    tracker.observe(10, page, ('price', 'movies'))
+    tracker.close()
+    assert delta(tmp_path, '2') == []
+    assert tracker.counts['unchanged'] == 1
+
+    # прошлые цена и видео не забываются: изменение цены между запусками через api видно
+    tracker = channel_run('3')
+    tracker.observe(10, api | {'price': 50})
+    tracker.close()
+    assert delta(tmp_path, '3') == [(OP_CHANGED, '10', ['price'])]
+
+    tracker = channel_run('4')
+    tracker.observe(10, page | {'name': 'Portal 2'}, ('price', 'movies'))
+    tracker.close()
+    assert delta(tmp_path, '4') == [(OP_CHANGED, '10', ['name'])]
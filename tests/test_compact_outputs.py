@@ -0,0 +1,45 @@
+import json
+import os
+
+from compact_outputs import CompactedDataset, Compactor, find_shards
+
+
+def write_shard(path, records, mtime):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(records, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_newest_successful_record_wins(tmp_path):
+    runs = tmp_path / 'steam'
+    write_shard(str(runs / '1' / 'successful' / '0.json'),
+                {'10': {'name': 'old'}, '2': {'name': 'two'}}, 1000)
+    write_shard(str(runs / '2' / 'successful' / '0.json'),
+                {'10': {'name': 'new'}, '300': {'success': False, 'reason': 'unknown'}}, 2000)
+    write_shard(str(runs / '3' / 'failed' / '0.json'), [{'appid': '2', 'success': False}], 3000)
+    write_shard(str(runs / '3' / 'logs' / 'skip.json'), [{'appid': '99'}], 3000)
+
+    output = str(tmp_path / 'compacted.jsonl')
+    shards = find_shards([str(runs)], include_failed=True, output=output)
+    assert [os.path.basename(os.path.dirname(path)) for _, path in shards] == ['successful', 'successful', 'failed']
+
+    stats = Compactor(output, partitions=4).run(shards)
+    assert (stats['read'], stats['written']) == (5, 3)
+
+    dataset = CompactedDataset(output)
+    # appid упорядочены как числа; более поздняя неудача не вытесняет успешную запись
+    assert [record['appid'] for record in dataset] == ['2', '10', '300']
+    assert dataset.get(10)['name'] == 'new'
+    assert dataset.get('2')['name'] == 'two'
+    assert '99' not in dataset and dataset.get('99') is None
+    assert len(dataset) == 3
+    dataset.close()
+    assert not any(name.startswith('compact-') for name in os.listdir(tmp_path))
+
+
+def test_failed_shards_are_skipped_by_default(tmp_path):
+    write_shard(str(tmp_path / 'run' / 'failed' / '0.json'), [{'appid': '1'}], 1000)
+    write_shard(str(tmp_path / 'run' / 'success' / '0.json'), [{'uri': 'https://byrutor/a'}], 1000)
+    shards = find_shards([str(tmp_path / 'run')], include_failed=False, output=str(tmp_path / 'out.jsonl'))
+    assert [successful for successful, _ in shards] == [True]
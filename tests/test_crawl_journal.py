@@ -0,0 +1,62 @@
+from crawl_journal import STATE_FAILED, STATE_NOT_GAME, STATE_OK, CrawlJournal
+from records import SteamGame
+
+
+def test_results_are_recorded_and_reloaded(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = CrawlJournal(path)
+    journal.record_result(SteamGame(appid='10', success=True, name='Counter-Strike'))
+    journal.record_result({'appid': '20', 'success': False, 'reason': 'is not game'})
+    journal.record_result({'appid': '30', 'success': False, 'reason': 'timeout error', 'error': 'timeout'})
+    journal.close()
+
+    journal = CrawlJournal(path)
+    assert journal.states == {'10': STATE_OK, '20': STATE_NOT_GAME, '30': STATE_FAILED}
+    assert journal.is_completed(10) and journal.is_completed('20')
+    assert not journal.is_completed('30')
+    assert journal.completed_count() == 2
+
+
+def test_only_synced_entries_reach_the_file(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = CrawlJournal(path)
+    journal.record('10', STATE_OK)
+    assert CrawlJournal(path).states == {}
+
+    journal.sync()
+    assert CrawlJournal(path).states == {'10': STATE_OK}
+
+
+def test_merge_keeps_own_completed_states(tmp_path):
+    other = CrawlJournal(str(tmp_path / 'journal-other.jsonl'))
+    other.record('10', STATE_FAILED)
+    other.record('20', STATE_OK)
+    other.close()
+
+    journal = CrawlJournal(str(tmp_path / 'journal.jsonl'))
+    journal.record('10', STATE_OK)
+    journal.merge(str(tmp_path / 'journal-other.jsonl'))
+    assert journal.states == {'10': STATE_OK, '20': STATE_OK}
+
+
+def test_broken_last_line_is_skipped(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    path.write_text('{"appid": "10", "state": "ok"}\n{"appid": "2', encoding='utf-8')
+    assert CrawlJournal(str(path)).states == {'10': STATE_OK}
+
+
+def test_failed_appid_is_completed_by_a_later_entry(tmp_path):
+    # при возобновлении appid с неудачей запрашивается снова, последняя запись журнала побеждает
+    path = tmp_path / 'journal.jsonl'
+    journal = CrawlJournal(str(path))
+    journal.record_result({'appid': '10', 'success': False, 'reason': 'timeout error'})
+    journal.close()
+    assert not CrawlJournal(str(path)).is_completed(10)
+
+    journal = CrawlJournal(str(path))
+    journal.record_result(SteamGame(appid='10', success=True))
+    journal.close()
+
+    assert CrawlJournal(str(path)).is_completed(10)
+    assert path.read_text(encoding='utf-8').splitlines()[0] == \
+        '{"appid": "10", "state": "failed", "reason": "timeout error"}'
@@ -0,0 +1,61 @@
+from game_store import GameStore
+
+
+def steam_record(appid, **values):
+    return {'appid': appid, 'name': f'Game {appid}', 'release_date': '9 Oct, 2007', 'genres': ['Action'],
+            'categories': ['Single-player'], 'developers': ['Valve'], 'publishers': ['Valve'],
+            'screenshots': [{'path_thumbnail': 't.jpg', 'path_full': 'f.jpg'}],
+            'requirements': {'minimum': {'os': 'Windows'}}, 'website': 'https://example.com',
+            'price': {'currency': 'USD', 'initial': 999, 'final': 499, 'discount_percent': 50},
+            'channel': 'appdetails', **values}
+
+
+def test_games_are_found_by_appid_term_developer_and_year(tmp_path):
+    store = GameStore(str(tmp_path / 'games.sqlite'))
+    store.add('steam', steam_record(10))
+    store.add('steam', steam_record(20, genres=['Indie'], release_date='2020'))
+    store.add('byrutor', {'uri': 'https://byrutor/portal', 'name': 'Portal', 'release_year': -1,
+                          'release_date': '2007', 'genres': ['Action'], 'developers': 'Valve'})
+    store.flush()
+
+    game = store.get('steam', 10)
+    assert (game['appid'], game['release_year'], game['price']['final']) == (10, 2007, 499)
+    assert game['screenshots'] == [{'path_thumbnail': 't.jpg', 'path_full': 'f.jpg'}]
+    assert game['requirements'] == [{'level': 'minimum', 'property': 'os', 'value': 'Windows'}]
+
+    assert [game['key'] for game in store.find_by_genre('Action')] == ['10', 'https://byrutor/portal']
+    assert [game['key'] for game in store.find_by_genre('Action', source='steam')] == ['10']
+    assert len(store.find_by_developer('valve')) == 3
+    assert [game['key'] for game in store.find_by_year(2020)] == ['20']
+    assert store.count() == 3 and store.count('steam') == 2
+    store.close()
+
+
+def test_store_page_record_keeps_fields_it_does_not_have(tmp_path):
+    store = GameStore(str(tmp_path / 'games.sqlite'))
+    store.add('steam', steam_record(10, movies=[{'id': 1}]))
+    store.flush()
+    store.add('steam', steam_record(10, name='Portal', website=None, price=None, movies=[], channel='store_page'))
+    store.flush()
+
+    game = store.get('steam', 10)
+    assert game['name'] == 'Portal'
+    assert game['website'] == 'https://example.com'
+    assert game['price']['final'] == 499
+    assert game['movies'] == [{'id': 1}]
+    store.close()
+
+
+def test_prices_are_updated_without_touching_games(tmp_path):
+    store = GameStore(str(tmp_path / 'games.sqlite'))
+    store.add('steam', steam_record(10))
+    store.add('steam', steam_record(20))
+    store.flush()
+
+    assert store.update_prices([(10, {'currency': 'USD', 'initial': 999, 'final': 999, 'discount_percent': 0}),
+                                (20, None), (30, None)]) == 2
+    assert store.get('steam', 10)['price']['discount_percent'] == 0
+    assert store.get('steam', 20)['price'] is None
+    assert store.get('steam', 20)['name'] == 'Game 20'
+    assert store.steam_appids() == [10, 20]
+    store.close()
@@ -0,0 +1,45 @@
+import asyncio
+
+from aiohttp import web
+
+from http_client import HttpClient
+
+
+def test_requests_share_pooled_connections():
+    seen_headers = []
+
+    async def handler(request: web.Request):
+        seen_headers.append(request.headers.get('Accept-Language'))
+        return web.Response(text=f'page {request.match_info["page"]}')
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/{page}', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        client = HttpClient(trust_env=False)
+        try:
+            responses = [await client.fetch(f'http://127.0.0.1:{port}/{page}') for page in range(3)]
+            session = client.session
+            assert client.session is session
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return responses, client.stats
+
+    responses, stats = asyncio.run(run())
+    assert [response.text for response in responses] == ['page 0', 'page 1', 'page 2']
+    assert seen_headers == ['en-US'] * 3
+    assert (stats.requests, stats.connections_created, stats.connections_reused) == (3, 1, 2)
+    assert stats.connection_hit_rate() == 2 / 3
+
+
+def test_host_headers_are_merged_over_defaults():
+    headers = HttpClient.build_headers('https://thebyrut.org/page', {'Accept-Language': 'ru-RU'})
+    assert headers['Accept-Language'] == 'ru-RU'
+    assert 'Mozilla' in headers['User-Agent']
+    assert 'User-Agent' not in HttpClient.build_headers('https://store.steampowered.com/')
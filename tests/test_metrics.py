@@ -0,0 +1,39 @@
+from metrics import MetricsRegistry, status_class
+
+
+def test_counter_and_gauge_render_with_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter('requests_total', 'Requests')
+    counter.inc(host='a')
+    counter.inc(2, host='a')
+    counter.inc(host='b"c')
+    assert registry.counter('requests_total', 'other') is counter
+    registry.gauge('rate', 'Rate').set(1.5, limiter='x')
+
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{host="a"} 3' in text
+    assert 'requests_total{host="b\\"c"} 1' in text
+    assert 'rate{limiter="x"} 1.5' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency', 'Latency', (0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert 'latency_bucket{le="0.1"} 1' in lines
+    assert 'latency_bucket{le="1.0"} 3' in lines
+    assert 'latency_bucket{le="+Inf"} 4' in lines
+    assert 'latency_count 4' in lines
+    assert 'latency_sum 4.05' in lines
+
+
+def test_write_replaces_the_file(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter('x_total', 'X').inc()
+    registry.write(str(tmp_path / 'metrics.prom'))
+    assert (tmp_path / 'metrics.prom').read_text().endswith('x_total 1\n')
+    assert status_class(404) == '4xx'
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from aiohttp import web
+
+from bench_scrapers import compare, parse_benchmarks
+from http_client import HttpClient
+from mock_server import ServerThrottle, create_app
+
+
+def test_throttle_keeps_a_bucket_per_client():
+    throttle = ServerThrottle(rate=0.001, burst=2, retry_after=1)
+    assert [throttle.allow('a') for _ in range(3)] == [True, True, False]
+    assert throttle.allow('b')
+    assert (throttle.accepted, throttle.rejected) == (3, 1)
+    assert ServerThrottle(rate=0, burst=0, retry_after=1).allow('a')
+
+
+def test_mock_store_serves_details_filters_and_throttling():
+    async def run():
+        runner = web.AppRunner(create_app(rate=0.001, burst=2, retry_after=7))
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        base_url = f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}'
+
+        client = HttpClient(trust_env=False)
+        try:
+            details = await client.fetch(f'{base_url}/api/appdetails?appids=620')
+            prices = await client.fetch(f'{base_url}/api/appdetails?appids=10,12&filters=price_overview')
+            throttled = await client.fetch(f'{base_url}/api/appdetails?appids=620')
+            stats = await client.fetch(f'{base_url}/stats')
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return details, prices, throttled, stats
+
+    details, prices, throttled, stats = asyncio.run(run())
+    # записанный ответ Portal 2 из fixtures
+    assert json.loads(details.text)['620']['data']['name'] == 'Portal 2'
+    assert 'ETag' in details.headers
+
+    prices = json.loads(prices.text)
+    assert list(prices['12']['data']) == ['price_overview']
+    assert (throttled.status, throttled.headers['Retry-After']) == (429, '7')
+    assert json.loads(stats.text)['rejected'] == 1
+
+
+def test_parse_benchmarks_and_regressions():
+    results = parse_benchmarks(2)
+    assert set(results) == {'format_game_data', 'scrape_game_info', 'scrape_game_links'}
+    assert all(result['records_per_sec'] > 0 for result in results.values())
+
+    previous = {'results': {'scrape_game_links': {'records_per_sec': 100.0}}}
+    assert compare({'scrape_game_links': {'records_per_sec': 50.0}}, previous, 0.2) == ['scrape_game_links']
+    assert compare({'scrape_game_links': {'records_per_sec': 90.0}}, previous, 0.2) == []
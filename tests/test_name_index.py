@@ -0,0 +1,50 @@
+from name_index import NameIndex, normalize_name, trigrams
+
+
+APPS = [(400, 'Portal'), (620, 'Portal 2'), (50, 'Half-Life: Opposing Force'), (70, 'Half-Life'),
+        (292030, 'The Witcher® 3: Wild Hunt'), (9000, 'Portal'), (300, 'Portal'), (1, '')]
+
+
+def test_names_are_normalized():
+    assert normalize_name('The Witcher® 3: Wild Hunt') == normalize_name('the witcher iii wild hunt')
+    assert normalize_name('Café & Co') == 'cafe and co'
+
+
+def test_exact_matches_come_first_by_lowest_appid():
+    index = NameIndex.build(APPS)
+    assert len(index) == 7
+
+    result = index.lookup('portal', k=4)
+    assert [appid for appid, _, _ in result] == [300, 400, 9000, 620]
+    assert [confidence for _, _, confidence in result[:3]] == [1.0, 1.0, 1.0]
+    assert result[3][2] < 1.0
+
+
+def test_exact_matches_beyond_k_are_ordered_by_appid():
+    index = NameIndex.build(APPS)
+    assert [appid for appid, _, _ in index.lookup('Portal', k=2)] == [300, 400]
+
+
+def test_fuzzy_match_finds_closest_name():
+    index = NameIndex.build(APPS)
+    appid, name, confidence = index.lookup('Witcher 3 Wild Hunt', k=1)[0]
+    assert appid == 292030
+    assert 0.6 < confidence < 1.0
+    assert index.lookup('™', k=1) == []
+
+
+def test_index_survives_save_and_load(tmp_path):
+    index = NameIndex.build(APPS)
+    index.source = ['games.json', 1, 2]
+    index.save(str(tmp_path / 'index.pickle'))
+
+    loaded = NameIndex.load(str(tmp_path / 'index.pickle'))
+    assert loaded.source == index.source
+    assert loaded.lookup('half life', k=1)[0][0] == 70
+
+
+def test_confidence_is_dice_of_trigram_sets():
+    index = NameIndex.build(APPS)
+    query, name = trigrams(normalize_name('Half Life Opposing')), trigrams(normalize_name('Half-Life: Opposing Force'))
+    expected = round(2 * len(query & name) / (len(query) + len(name)), 4)
+    assert (50, 'Half-Life: Opposing Force', expected) in index.lookup('Half Life Opposing', k=3)
@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+import pytest
+
+from parse_executor import ParseExecutor
+
+
+@pytest.mark.parametrize('kind', ['inline', 'thread', 'process'])
+def test_results_and_failures_are_counted(kind):
+    executor = ParseExecutor(kind, workers=2)
+
+    async def run():
+        results = await asyncio.gather(*(executor.run(json.loads, f'[{value}]') for value in range(5)))
+        with pytest.raises(json.JSONDecodeError):
+            await executor.run(json.loads, '{')
+        return results
+
+    try:
+        assert asyncio.run(run()) == [[value] for value in range(5)]
+    finally:
+        executor.shutdown()
+    assert (executor.stats.completed, executor.stats.failed, executor.stats.depth) == (5, 1, 0)
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        ParseExecutor('gpu')
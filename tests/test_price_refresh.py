@@ -0,0 +1,22 @@
+import json
+
+from price_refresh import batches, parse_prices
+
+
+def test_appids_are_split_into_batches():
+    assert list(batches(list(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_batch_response_is_parsed_per_appid():
+    price = {'currency': 'USD', 'initial': 999, 'final': 499, 'discount_percent': 50,
+             'initial_formatted': '$9.99', 'final_formatted': '$4.99'}
+    text = json.dumps({'10': {'success': True, 'data': {'price_overview': price}},
+                       '20': {'success': True, 'data': []},
+                       '30': {'success': False}})
+
+    result = parse_prices([10, 20, 30, 40], text)
+    assert [(appid, ok) for appid, ok, _ in result] == [(10, True), (20, True), (30, False), (40, False)]
+    assert result[0][2]['final'] == 499
+    # бесплатная игра: цены нет
+    assert result[1][2] is None
+    assert parse_prices([10], 'null') == [(10, False, None)]
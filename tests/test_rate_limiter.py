@@ -0,0 +1,74 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+
+
+def test_parse_retry_after_seconds_and_date():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('') is None
+    assert parse_retry_after('soon') is None
+    assert 8 <= parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+
+
+def test_burst_of_throttles_decreases_once():
+    limiter = AdaptiveRateLimiter(rate=8.0, max_rate=8.0, burst=10)
+
+    async def issue():
+        return [await limiter.acquire() for _ in range(10)]
+
+    issued = asyncio.run(issue())
+    for issued_at in issued:
+        limiter.on_throttle(issued_at=issued_at)
+
+    assert limiter.rate == 4.0
+    assert limiter.total_throttled == 10
+    assert limiter.total_decreased == 1
+
+
+def test_throttle_after_decrease_decreases_again():
+    limiter = AdaptiveRateLimiter(rate=8.0, max_rate=8.0)
+    limiter.on_throttle(issued_at=time.monotonic())
+    limiter.on_throttle(issued_at=time.monotonic())
+    assert limiter.rate == 2.0
+
+
+def test_throttle_without_issued_time_always_decreases():
+    limiter = AdaptiveRateLimiter(rate=8.0, max_rate=8.0)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == 2.0
+
+
+def test_recovery_from_min_rate_is_bounded():
+    limiter = AdaptiveRateLimiter(rate=0.05, max_rate=10.0)
+    successes = 0
+    while limiter.rate < 2.0:
+        limiter.on_success()
+        successes += 1
+    # с шагом +0.05 на каждые 10 ответов понадобилось бы почти 800
+    assert successes < 150
+
+
+def test_rate_stays_within_bounds():
+    limiter = AdaptiveRateLimiter(rate=1.0, min_rate=0.5, max_rate=1.5)
+    for _ in range(10):
+        limiter.on_throttle()
+    assert limiter.rate == 0.5
+    for _ in range(1000):
+        limiter.on_success()
+    assert limiter.rate == 1.5
+
+
+def test_retry_after_blocks_acquire():
+    limiter = AdaptiveRateLimiter(rate=20.0, max_rate=20.0)
+    limiter.on_throttle(retry_after=0.2)
+
+    async def wait():
+        started_at = time.monotonic()
+        await limiter.acquire()
+        return time.monotonic() - started_at
+
+    assert asyncio.run(wait()) >= 0.19
+    assert limiter.expected_wait() > 0
@@ -0,0 +1,58 @@
+import json
+import pickle
+
+from records import LAZY_MIN_BYTES, ByrutorGame, LazyText, SteamGame
+
+
+STEAM = {'appid': 10, 'success': True, 'steamid': None, 'age': 0, 'name': 'Portal',
+         'short_description': 'Игра', 'languages': ['English', 'Русский'], 'developers': ['Valve'],
+         'publishers': ['Valve'], 'website': None, 'header_image_uri': 'h.jpg',
+         'screenshots': [{'id': 0, 'path_thumbnail': 't.jpg', 'path_full': 'f.jpg'}],
+         'long_description': '<p>"Описание"</p>' * 200, 'release_date': '9 Oct, 2007', 'genres': ['Action'],
+         'categories': ['Single-player'], 'movies': [],
+         'requirements': {'minimum': {'os': 'Windows', 'memory': '4 GB RAM'}}, 'price': None,
+         'channel': 'appdetails'}
+
+
+def plain(data):
+    # to_dict отдаёт интернированные списки кортежами
+    return json.loads(json.dumps(data, ensure_ascii=False))
+
+
+def test_steam_game_round_trips_through_json():
+    game = SteamGame.from_dict(STEAM)
+    assert isinstance(game.long_description, LazyText)
+    assert json.loads(game.to_json()) == plain(game.to_dict()) == STEAM
+    assert plain(SteamGame.from_json(game.to_json()).to_dict()) == STEAM
+    # необязательные поля без значения в JSON не пишутся
+    assert 'genre_ids' not in game.to_dict()
+
+
+def test_byrutor_game_round_trips_through_json():
+    data = {'uri': 'https://byrutor/portal', 'name': 'Portal', 'description': 'Короткое', 'screenshots': ['1.jpg'],
+            'video_webm': None, 'video_mp4': None, 'release_date': '2007', 'release_year': 2007,
+            'categories': [], 'version': '1.0', 'torrent_size': '1 GB',
+            'requirements': [{'property': 'ОС', 'value': 'Windows'}], 'success': True}
+    game = ByrutorGame.from_dict(data)
+    assert json.loads(game.to_json()) == data
+    assert 'genres' not in game.to_dict()
+
+
+def test_lazy_text_compresses_long_literals():
+    short = LazyText('коротко')
+    assert (short.text, short.digest, short.size) == ('коротко', None, None)
+
+    text = 'длинное описание ' * 100
+    lazy = LazyText(text)
+    literal = json.dumps(text, ensure_ascii=False, separators=(',', ':'))
+    assert len(literal) >= LAZY_MIN_BYTES
+    assert lazy.size == len(literal.encode('utf-8')) and len(lazy.digest) == 20
+    assert lazy.text == text and lazy.literal() == literal
+    assert len(lazy) < lazy.size
+
+
+def test_pickled_records_keep_values_and_interning():
+    game = pickle.loads(pickle.dumps(SteamGame.from_dict(STEAM)))
+    assert plain(game.to_dict()) == STEAM
+    assert game.genres[0] is SteamGame.from_dict(STEAM).genres[0]
+    assert game.long_description.size == SteamGame.from_dict(STEAM).long_description.size
@@ -0,0 +1,81 @@
+import asyncio
+
+from aiohttp import web
+
+from http_client import HttpClient
+from response_cache import ResponseCache
+
+
+def test_put_is_visible_before_flush_and_kept_after_close(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ResponseCache(path, batch_size=10)
+    key = cache.make_key('http://example/a', {'Accept-Language': 'en-US'})
+    cache.put(key, 'http://example/a', 200, {'ETag': '"v1"', 'Set-Cookie': 'x'}, 'body')
+
+    entry = cache.get(key)
+    assert entry.text == 'body'
+    assert entry.headers == {'ETag': '"v1"'}
+    assert entry.conditional_headers() == {'If-None-Match': '"v1"'}
+    cache.close()
+
+    reopened = ResponseCache(path)
+    assert reopened.get(key).text == 'body'
+    reopened.close()
+
+
+def test_vary_headers_change_the_key():
+    assert ResponseCache.make_key('http://a', {'Accept-Language': 'en'}) != ResponseCache.make_key(
+        'http://a', {'Accept-Language': 'ru'})
+    assert ResponseCache.make_key('http://a', {'User-Agent': 'x'}) == ResponseCache.make_key('http://a')
+
+
+def test_pending_writes_do_not_lock_other_processes(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    first = ResponseCache(path, batch_size=100)
+    second = ResponseCache(path, batch_size=100)
+    first.put('a', 'http://a', 200, {}, 'a')
+    first.record_hit(first.get('a'))
+
+    # пока у первого запись в памяти, второй пишет без ожидания блокировки
+    second.put('b', 'http://b', 200, {}, 'b')
+    second.flush()
+    first.flush()
+    assert first.get('b').text == 'b'
+    assert second.get('a').text == 'a'
+    first.close()
+    second.close()
+
+
+def test_stale_entry_is_revalidated_with_304(tmp_path):
+    counters = {'full': 0, 'not_modified': 0}
+
+    async def handler(request: web.Request):
+        if request.headers.get('If-None-Match') == '"v1"':
+            counters['not_modified'] += 1
+            return web.Response(status=304)
+        counters['full'] += 1
+        return web.Response(text='payload', headers={'ETag': '"v1"'})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/page', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, 'localhost', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        client = HttpClient(trust_env=False, cache=ResponseCache(str(tmp_path / 'cache.sqlite'), ttl=0))
+        try:
+            first = await client.fetch(f'http://localhost:{port}/page')
+            second = await client.fetch(f'http://localhost:{port}/page')
+        finally:
+            await client.close()
+            client.cache.close()
+            await runner.cleanup()
+        return first, second, client.cache
+
+    first, second, cache = asyncio.run(run())
+    assert first.text == second.text == 'payload'
+    assert counters == {'full': 1, 'not_modified': 1}
+    assert cache.revalidated == 1
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from retry import (ERROR_CONNECT, ERROR_PARSE, ERROR_PERMANENT, ERROR_SERVER, ERROR_THROTTLED, ERROR_TIMEOUT,
+                   DeadLetterQueue, FetchError, RetryPolicy, classify_error, error_from_status, read_dead_letters)
+
+
+def test_errors_are_classified():
+    assert classify_error(asyncio.TimeoutError()) == ERROR_TIMEOUT
+    assert classify_error(ConnectionResetError()) == ERROR_CONNECT
+    assert classify_error(ValueError()) == ERROR_PARSE
+    assert classify_error(RuntimeError()) == ERROR_PERMANENT
+    assert error_from_status(429, '').kind == ERROR_THROTTLED
+    assert error_from_status(502, '').kind == ERROR_SERVER
+    assert error_from_status(404, '').kind == ERROR_PERMANENT
+
+
+def test_retryable_errors_are_retried_until_success():
+    policy = RetryPolicy(attempts=3, base_delay=0.001)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FetchError(ERROR_SERVER, 'bad gateway')
+        return 'ok'
+
+    assert asyncio.run(policy.call(flaky)) == 'ok'
+    assert policy.stats.retries == {ERROR_SERVER: 2}
+
+
+def test_parse_errors_are_not_retried():
+    policy = RetryPolicy(attempts=5, base_delay=0.001)
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        raise ValueError('bad json')
+
+    with pytest.raises(ValueError):
+        asyncio.run(policy.call(broken))
+    assert len(calls) == 1
+    assert policy.stats.gave_up == {ERROR_PARSE: 1}
+
+
+def test_delay_respects_retry_after_and_max_delay():
+    policy = RetryPolicy(base_delay=0.001, max_delay=5.0)
+    assert policy.delay(0, retry_after=3.0) >= 3.0
+    assert policy.delay(0, retry_after=100.0) == 5.0
+    assert policy.delay(10) <= 5.0
+
+
+def test_dead_letters_sync_in_batches_and_last_entry_wins(tmp_path):
+    path = str(tmp_path / 'dead_letter.jsonl')
+    queue = DeadLetterQueue(path, sync_every=2)
+    queue.add('a', ERROR_TIMEOUT, 'first')
+    assert open(path).read() == ''
+    queue.add('b', ERROR_PARSE, 'broken')
+    assert len(open(path).readlines()) == 2
+    queue.add('a', ERROR_SERVER, 'second')
+    queue.close()
+
+    with open(path, 'a') as f:
+        f.write('{"key": "c", "err')
+    entries = read_dead_letters(path)
+    assert list(entries) == ['a', 'b']
+    assert entries['a']['reason'] == 'second'
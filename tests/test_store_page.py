@@ -0,0 +1,45 @@
+import json
+import os
+
+from game_store import GameStore
+from mock_server import fake_app_page
+from steam_scraper import CHANNEL_STORE_PAGE, format_game_data, parse_store_page
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'steam')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_store_page_is_parsed_like_appdetails():
+    page = parse_store_page('620', read_fixture('app_page.html'))
+    api = format_game_data('620', json.loads(read_fixture('appdetails_620.json')))
+
+    assert page.channel == CHANNEL_STORE_PAGE
+    assert (page.name, page.age, page.release_date) == (api.name, api.age, api.release_date)
+    assert page.genres == api.genres
+
+
+def test_age_gate_is_not_a_store_page():
+    assert parse_store_page('11', fake_app_page(11)) is None
+    assert parse_store_page('12', fake_app_page(12)).age == 0
+
+
+def test_store_page_keeps_fields_it_does_not_know(tmp_path):
+    store = GameStore(str(tmp_path / 'games.sqlite'))
+    api = format_game_data('620', json.loads(read_fixture('appdetails_620.json')))
+    store.add('steam', api.to_dict())
+    store.flush()
+    before = store.get('steam', 620)
+    assert before['website'] != '' and len(before['movies']) > 0
+
+    store.add('steam', parse_store_page('620', read_fixture('app_page.html')).to_dict())
+    store.flush()
+    after = store.get('steam', 620)
+    assert (after['website'], after['movies'], after['price']) == (before['website'], before['movies'],
+                                                                   before['price'])
+    assert after['channel'] == CHANNEL_STORE_PAGE
+    store.close()
@@ -0,0 +1,80 @@
+import json
+import multiprocessing
+
+from records import SteamGame
+from taxonomy import Taxonomy
+
+
+def test_ids_are_stable_and_decoded(tmp_path):
+    taxonomy = Taxonomy(str(tmp_path / 'taxonomy.json'))
+    ids = taxonomy.encode('genres', ['Action', 'RPG', 'Action'], 'steam')
+    assert ids == (0, 1, 0)
+    assert taxonomy.decode('genres', ids) == ['Action', 'RPG', 'Action']
+    assert taxonomy.encode('categories', ['Action'], 'byrutor') == (0,)
+    taxonomy.save()
+
+    reloaded = Taxonomy(str(tmp_path / 'taxonomy.json'))
+    assert reloaded.encode('genres', ['RPG'], 'byrutor') == (1,)
+    assert reloaded.names_of('genres', 'steam') == ['Action', 'RPG']
+
+
+def test_new_name_is_written_before_save(tmp_path):
+    path = str(tmp_path / 'taxonomy.json')
+    first = Taxonomy(path)
+    second = Taxonomy(path)
+    assert first.encode('genres', ['Action'], 'steam') == (0,)
+    # второй процесс видит id первого, хотя первый ещё не вызывал save
+    assert second.encode('genres', ['Indie', 'Action'], 'byrutor') == (1, 0)
+    assert first.encode('genres', ['Indie'], 'steam') == (1,)
+
+
+def test_save_merges_sources_of_other_processes(tmp_path):
+    path = str(tmp_path / 'taxonomy.json')
+    first = Taxonomy(path)
+    second = Taxonomy(path)
+    first.encode('genres', ['Action'], 'steam')
+    second.encode('genres', ['Action'], 'byrutor')
+    first.save()
+    second.save()
+
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['genres'] == [{'id': 0, 'name': 'Action', 'sources': ['byrutor', 'steam']}]
+
+
+def encode_in_process(path, names, queue):
+    taxonomy = Taxonomy(path)
+    queue.put({name: taxonomy.add('genres', name, 'steam') for name in names})
+    taxonomy.save()
+
+
+def test_concurrent_workers_agree_on_ids(tmp_path):
+    path = str(tmp_path / 'taxonomy.json')
+    queue = multiprocessing.Queue()
+    names = [f'Genre {number}' for number in range(30)]
+    workers = [multiprocessing.Process(target=encode_in_process, args=(path, names[offset:] + names[:offset], queue))
+               for offset in (0, 10, 20)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    assert results[0] == results[1] == results[2]
+    assert sorted(results[0].values()) == list(range(30))
+    assert Taxonomy(path).encode('genres', names, 'steam') == tuple(results[0][name] for name in names)
+
+
+def test_ids_are_written_into_records(tmp_path):
+    taxonomy = Taxonomy(str(tmp_path / 'taxonomy.json'))
+    game = SteamGame(appid='1', genres=['Action'], categories=['Single-player'], screenshots=(), movies=(),
+                     requirements=())
+    assert 'genre_ids' not in game.to_dict()
+    game.genre_ids = taxonomy.encode('genres', game.genres, 'steam')
+    game.category_ids = taxonomy.encode('categories', game.categories, 'steam')
+    record = json.loads(game.to_json())
+    assert record['genre_ids'] == [0] and record['category_ids'] == [0]
+
+    taxonomy.export_names('genres', 'steam', str(tmp_path / 'genres.json'))
+    with open(tmp_path / 'genres.json', encoding='utf-8') as f:
+        assert json.load(f) == ['Action']
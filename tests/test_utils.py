@@ -0,0 +1,20 @@
+import math
+
+from utils import format_price, peak_rss_mb
+
+
+def test_price_keeps_only_numbers():
+    data = {'price_overview': {'currency': 'EUR', 'initial': 1999, 'final': 999, 'discount_percent': 50,
+                               'initial_formatted': '19,99€', 'final_formatted': '9,99€'}}
+    assert format_price(data) == {'currency': 'EUR', 'initial': 1999, 'final': 999, 'discount_percent': 50}
+
+
+def test_free_games_have_no_price():
+    assert format_price({'is_free': True}) is None
+    # в ответе с filters у игры без цены вместо data пустой список
+    assert format_price([]) is None
+
+
+def test_peak_rss_is_positive():
+    peak = peak_rss_mb()
+    assert math.isnan(peak) or peak > 0
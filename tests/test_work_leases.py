@@ -0,0 +1,88 @@
+import time
+
+from work_leases import ChunkTracker, LeaseCoordinator
+
+
+def test_chunks_are_leased_once_and_completed(tmp_path):
+    path = str(tmp_path / 'plan.sqlite')
+    first = LeaseCoordinator(path, 'first')
+    second = LeaseCoordinator(path, 'second')
+
+    assert first.plan(25, 10, meta={'file': 'games.json', 'below': 0, 'above': None})
+    assert not second.plan(25, 10)
+    assert first.get_meta('file') == 'games.json'
+    assert first.get_meta('above') is None
+
+    leases = [first.lease(), second.lease(), first.lease()]
+    assert [(lease.start, lease.end) for lease in leases] == [(0, 10), (10, 20), (20, 25)]
+    assert first.lease() is None
+
+    assert first.complete(leases[0].chunk_id)
+    # чужой чанк этим воркером не завершается
+    assert not first.complete(leases[1].chunk_id)
+    assert second.complete(leases[1].chunk_id)
+    assert first.complete(leases[2].chunk_id)
+    assert first.unfinished() == 0
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    path = str(tmp_path / 'plan.sqlite')
+    crashed = LeaseCoordinator(path, 'crashed', lease_seconds=0.01)
+    alive = LeaseCoordinator(path, 'alive')
+    crashed.plan(10, 10)
+
+    lost_lease = crashed.lease()
+    assert alive.lease() is None
+    time.sleep(0.05)
+
+    lease = alive.lease()
+    assert lease.chunk_id == lost_lease.chunk_id
+    assert lease.attempt == 2
+    assert crashed.heartbeat([lost_lease.chunk_id]) == [lost_lease.chunk_id]
+    assert not crashed.complete(lost_lease.chunk_id)
+    assert alive.heartbeat([lease.chunk_id]) == []
+
+
+def test_released_chunk_is_leased_again(tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / 'plan.sqlite'), 'worker')
+    coordinator.plan(10, 10)
+
+    lease = coordinator.lease()
+    coordinator.release(lease.chunk_id)
+    assert coordinator.lease().chunk_id == lease.chunk_id
+
+
+def test_chunk_is_completed_after_all_results(tmp_path):
+    coordinator = LeaseCoordinator(str(tmp_path / 'plan.sqlite'), 'worker')
+    coordinator.plan(2, 2)
+    tracker = ChunkTracker(coordinator)
+
+    lease = coordinator.lease()
+    tracker.add(lease.chunk_id, '10')
+    tracker.add(lease.chunk_id, '20')
+    tracker.result('20')
+    tracker.seal(lease.chunk_id)
+    assert tracker.take_finished() == []
+    assert tracker.active() == [lease.chunk_id]
+
+    tracker.result('10')
+    assert tracker.take_finished() == [lease.chunk_id]
+    assert tracker.active() == []
+
+
+def test_taken_over_chunk_without_appids_is_completed_on_seal(tmp_path):
+    # все appid чанка уже в журнале упавшего воркера: результатов не будет, чанк завершается сразу
+    path = str(tmp_path / 'plan.sqlite')
+    crashed = LeaseCoordinator(path, 'crashed', lease_seconds=0.01)
+    alive = LeaseCoordinator(path, 'alive')
+    crashed.plan(10, 10)
+    crashed.lease()
+    time.sleep(0.05)
+
+    tracker = ChunkTracker(alive)
+    lease = alive.lease()
+    tracker.seal(lease.chunk_id)
+
+    assert tracker.active() == []
+    assert alive.unfinished() == 0
+    assert alive.lease() is None
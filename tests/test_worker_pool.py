@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from worker_pool import run_pool
+
+
+async def collect(items, worker, concurrency, **kwargs):
+    return [pair async for pair in run_pool(items, worker, concurrency, **kwargs)]
+
+
+def test_slow_item_does_not_hold_other_slots():
+    async def worker(delay):
+        await asyncio.sleep(delay)
+        return delay
+
+    result = asyncio.run(collect([0.2, 0.01, 0.01, 0.01], worker, 2))
+    assert [item for item, _ in result] == [0.01, 0.01, 0.01, 0.2]
+
+    ordered = asyncio.run(collect([0.2, 0.01, 0.01, 0.01], worker, 2, ordered=True))
+    assert [item for item, _ in ordered] == [0.2, 0.01, 0.01, 0.01]
+
+
+def test_concurrency_is_bounded_and_source_is_read_lazily():
+    state = {'running': 0, 'peak': 0, 'fed': 0}
+
+    async def source():
+        for item in range(20):
+            state['fed'] += 1
+            yield item
+
+    async def worker(item):
+        state['running'] += 1
+        state['peak'] = max(state['peak'], state['running'])
+        await asyncio.sleep(0.001)
+        state['running'] -= 1
+        return item * 2
+
+    async def run():
+        results = []
+        async for item, result in run_pool(source(), worker, 3):
+            results.append(result)
+            # источник не вычитывается наперёд: вперёд взято не больше, чем помещается в очереди и воркеры
+            assert state['fed'] - len(results) <= 4 * 3 + 1
+        return results
+
+    assert sorted(asyncio.run(run())) == [item * 2 for item in range(20)]
+    assert state['peak'] == 3
+
+
+def test_worker_errors_are_results_or_raised():
+    async def worker(item):
+        if item == 2:
+            raise ValueError(item)
+        return item
+
+    result = dict(asyncio.run(collect(range(4), worker, 2)))
+    assert isinstance(result[2], ValueError)
+    assert result[3] == 3
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect(range(4), worker, 2, return_exceptions=False))
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect([], worker, 0))
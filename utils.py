@@ -0,0 +1,26 @@
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# из price_overview берутся только числа, строки с форматированной ценой повторяют их
+PRICE_FIELDS = ('currency', 'initial', 'final', 'discount_percent')
+
+
+def format_price(game_data):
+    # у бесплатных игр и игр без цены в регионе price_overview нет, а в ответе с filters вместо data пустой список
+    overview = game_data.get('price_overview') if isinstance(game_data, dict) else None
+    if overview is None:
+        return None
+    return {field: overview.get(field) for field in PRICE_FIELDS}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return float('nan')
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
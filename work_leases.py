@@ -0,0 +1,182 @@
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+
+STATE_PENDING = 'pending'
+STATE_LEASED = 'leased'
+STATE_DONE = 'done'
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class Lease:
+    __slots__ = ('chunk_id', 'start', 'end', 'attempt')
+
+    def __init__(self, chunk_id: int, start: int, end: int, attempt: int):
+        self.chunk_id = chunk_id
+        self.start = start
+        self.end = end
+        self.attempt = attempt
+
+
+class LeaseCoordinator:
+    # Список appid делится на чанки (диапазоны индексов списка) в общем SQLite файле.
+    # Воркеры, в том числе на других машинах с общим диском, берут чанки в аренду, продлевают её
+    # и отмечают выполненными. Аренда упавшего или зависшего воркера истекает и достаётся следующему.
+    # Журнал обычный, не WAL: WAL не работает, когда файл открыт с разных машин.
+    def __init__(self, path: str, worker_id: str, lease_seconds: float = 300):
+        self.path = path
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=DELETE')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS chunks ('
+                                'id INTEGER PRIMARY KEY, start INTEGER NOT NULL, end INTEGER NOT NULL, '
+                                'state TEXT NOT NULL, owner TEXT, lease_expires REAL, attempts INTEGER NOT NULL, '
+                                'done_at REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS chunks_state ON chunks (state, id)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    def get_meta(self, key: str):
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def plan(self, total: int, chunk_size: int, meta: dict = None):
+        # чанки создаёт только первый воркер, остальные находят их уже готовыми
+        if chunk_size <= 0:
+            raise ValueError('"chunk_size" value cannot be less or equal zero')
+
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            if self.connection.execute('SELECT COUNT(*) FROM chunks').fetchone()[0] > 0:
+                self.connection.execute('COMMIT')
+                return False
+
+            self.connection.executemany(
+                'INSERT INTO chunks (start, end, state, attempts) VALUES (?, ?, ?, 0)',
+                ((start, min(start + chunk_size, total), STATE_PENDING) for start in range(0, total, chunk_size)))
+            self.connection.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                        ((key, str(value)) for key, value in (meta or {}).items()
+                                         if value is not None))
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+
+        logging.info(f'Work plan created: {total} appids in chunks of {chunk_size}')
+        return True
+
+    def lease(self):
+        now = time.time()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.connection.execute(
+                'SELECT id, start, end, attempts, owner FROM chunks '
+                'WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY id LIMIT 1',
+                (STATE_PENDING, STATE_LEASED, now)).fetchone()
+
+            if row is None:
+                self.connection.execute('COMMIT')
+                return None
+
+            chunk_id, start, end, attempts, owner = row
+            self.connection.execute('UPDATE chunks SET state = ?, owner = ?, lease_expires = ?, attempts = ? '
+                                    'WHERE id = ?',
+                                    (STATE_LEASED, self.worker_id, now + self.lease_seconds, attempts + 1, chunk_id))
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+
+        if owner is not None:
+            logging.warning(f'Chunk {chunk_id} taken over from {owner} after its lease expired')
+        return Lease(chunk_id, start, end, attempts + 1)
+
+    def heartbeat(self, chunk_ids: list):
+        # возвращает чанки, аренду которых продлить не удалось: их уже забрал другой воркер
+        if len(chunk_ids) == 0:
+            return []
+
+        expires = time.time() + self.lease_seconds
+        lost = []
+        for chunk_id in chunk_ids:
+            cursor = self.connection.execute('UPDATE chunks SET lease_expires = ? '
+                                             'WHERE id = ? AND owner = ? AND state = ?',
+                                             (expires, chunk_id, self.worker_id, STATE_LEASED))
+            if cursor.rowcount == 0:
+                lost.append(chunk_id)
+        return lost
+
+    def complete(self, chunk_id: int):
+        cursor = self.connection.execute('UPDATE chunks SET state = ?, done_at = ?, lease_expires = NULL '
+                                         'WHERE id = ? AND owner = ? AND state = ?',
+                                         (STATE_DONE, time.time(), chunk_id, self.worker_id, STATE_LEASED))
+        if cursor.rowcount == 0:
+            logging.warning(f'Chunk {chunk_id} was completed after its lease had been lost')
+        return cursor.rowcount == 1
+
+    def release(self, chunk_id: int):
+        # при штатной остановке чанк возвращается сразу, не дожидаясь истечения аренды
+        self.connection.execute('UPDATE chunks SET state = ?, owner = NULL, lease_expires = NULL '
+                                'WHERE id = ? AND owner = ? AND state = ?',
+                                (STATE_PENDING, chunk_id, self.worker_id, STATE_LEASED))
+
+    def unfinished(self):
+        return self.connection.execute('SELECT COUNT(*) FROM chunks WHERE state != ?', (STATE_DONE,)).fetchone()[0]
+
+    def summary(self):
+        counts = dict(self.connection.execute('SELECT state, COUNT(*) FROM chunks GROUP BY state').fetchall())
+        return (f'chunks done: {counts.get(STATE_DONE, 0)}, leased: {counts.get(STATE_LEASED, 0)}, '
+                f'pending: {counts.get(STATE_PENDING, 0)}')
+
+    def close(self):
+        self.connection.close()
+
+
+class ChunkTracker:
+    # Сколько результатов ещё ждёт каждый взятый чанк. Пул отдаёт результаты в любом порядке,
+    # поэтому чанк готов, только когда все его appid выданы (seal) и по всем пришёл результат.
+    # Готовые чанки отмечаются выполненными после того, как их результаты сброшены на диск.
+    # Чанк без выданных appid (все уже в журнале или пропущены) ждать нечего, он выполняется сразу в seal.
+    def __init__(self, coordinator: LeaseCoordinator):
+        self.coordinator = coordinator
+        self.remaining = {}
+        self.sealed = set()
+        self.chunk_of = {}
+        self.finished = []
+
+    def add(self, chunk_id: int, appid: str):
+        self.chunk_of[appid] = chunk_id
+        self.remaining[chunk_id] = self.remaining.get(chunk_id, 0) + 1
+
+    def seal(self, chunk_id: int):
+        if chunk_id not in self.remaining:
+            self.coordinator.complete(chunk_id)
+        elif self.remaining[chunk_id] == 0:
+            del self.remaining[chunk_id]
+            self.finished.append(chunk_id)
+        else:
+            self.sealed.add(chunk_id)
+
+    def result(self, appid: str):
+        chunk_id = self.chunk_of.pop(appid, None)
+        if chunk_id is None:
+            return
+
+        self.remaining[chunk_id] -= 1
+        if self.remaining[chunk_id] == 0 and chunk_id in self.sealed:
+            del self.remaining[chunk_id]
+            self.sealed.discard(chunk_id)
+            self.finished.append(chunk_id)
+
+    def take_finished(self):
+        finished, self.finished = self.finished, []
+        return finished
+
+    def active(self):
+        return list(self.remaining)
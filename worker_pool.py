@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+
+_DONE = object()
+
+
+async def _iterate(items):
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def run_pool(items, worker, concurrency: int, ordered: bool = False, return_exceptions: bool = True):
+    # N воркеров берут следующий элемент сразу, как только освободились,
+    # поэтому один медленный запрос не задерживает остальные слоты.
+    # Генерирует пары (item, result) по мере готовности, либо в исходном порядке при ordered=True.
+    # items может быть как обычным, так и асинхронным итератором, он читается лениво.
+    if concurrency <= 0:
+        raise ValueError('"concurrency" value cannot be less or equal zero')
+
+    input_queue = asyncio.Queue(maxsize=concurrency)
+    output_queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def feed():
+        index = 0
+        try:
+            async for item in _iterate(items):
+                await input_queue.put((index, item))
+                index += 1
+        except Exception:
+            # воркеры должны завершиться, а ошибка уйдёт через await feeder
+            for _ in range(concurrency):
+                await input_queue.put(_DONE)
+            raise
+
+        for _ in range(concurrency):
+            await input_queue.put(_DONE)
+
+    async def work():
+        while True:
+            task = await input_queue.get()
+            if task is _DONE:
+                await output_queue.put(_DONE)
+                return
+
+            index, item = task
+            try:
+                result = await worker(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not return_exceptions:
+                    await output_queue.put((index, item, e, True))
+                    continue
+                logging.error(f'Worker failed on {item}: {e!r}')
+                result = e
+            await output_queue.put((index, item, result, False))
+
+    feeder = asyncio.create_task(feed())
+    workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+
+    pending = {}
+    next_index = 0
+    finished_workers = 0
+    try:
+        while finished_workers < concurrency:
+            message = await output_queue.get()
+            if message is _DONE:
+                finished_workers += 1
+                continue
+
+            index, item, result, failed = message
+            if failed:
+                raise result
+
+            if not ordered:
+                yield item, result
+                continue
+
+            pending[index] = (item, result)
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+
+        # ошибка в источнике элементов должна дойти до вызывающего кода
+        await feeder
+    finally:
+        feeder.cancel()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(feeder, *workers, return_exceptions=True)